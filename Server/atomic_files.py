@@ -0,0 +1,134 @@
+"""
+atomic_files.py
+
+Crash- and race-safe replacement of the files the server persists
+(helper.simhash, helper.semantic.npz, cascade_model.npz).
+
+    atomic_replace(path)  yields a unique temporary path in the target
+                          directory; on success it is renamed over `path`
+                          while an exclusive lock on `<path>.lock` is held,
+                          so concurrent writers never share a temp file and
+                          never interleave their replaces.
+    WriterLease(path)     a non-blocking, process-lifetime claim on
+                          `<path>.writer`. With several processes serving
+                          from one directory (uvicorn --workers, prefork.py)
+                          only the holder rewrites the file; the others
+                          keep their state in memory. The lease is freed
+                          when the holder exits, so another process can
+                          take over.
+
+Locks use fcntl.flock; on platforms without it they are no-ops.
+"""
+
+import os
+import tempfile
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+
+@contextmanager
+def file_lock(path: str, shared: bool = False):
+    """Hold a flock on `<path>.lock` (blocking)."""
+    if fcntl is None:
+        yield
+        return
+    fd = os.open(f"{path}.lock", os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+        yield
+    finally:
+        os.close(fd)
+
+
+@contextmanager
+def atomic_replace(path: str, suffix: str = ""):
+    """
+    Write to a unique temporary file, then atomically move it to `path`.
+
+    Args:
+        path: Final file path
+        suffix: Extension the temporary file needs (e.g. ".npz", since
+            np.savez appends one to paths without it)
+
+    Yields:
+        The temporary path to write to
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    with file_lock(path):
+        fd, tmp_path = tempfile.mkstemp(prefix=f".{os.path.basename(path)}.", suffix=f".tmp{suffix}",
+                                        dir=directory)
+        os.close(fd)
+        try:
+            yield tmp_path
+            os.replace(tmp_path, path)
+        except BaseException:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+
+
+class WriterLease:
+    """Single-writer role for a file, shared by every process that serves it"""
+
+    _leases = []
+
+    def __init__(self, path: str):
+        self.path = f"{path}.writer"
+        self._fd = None
+        WriterLease._leases.append(self)
+
+    @property
+    def held(self) -> bool:
+        return self._fd is not None
+
+    def acquire(self) -> bool:
+        """Claim the writer role if no other process holds it. Returns held."""
+        if self._fd is not None:
+            return True
+        if fcntl is None:
+            self._fd = -1
+            return True
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return False
+        self._fd = fd
+        return True
+
+    def release(self):
+        if self._fd is None:
+            return
+        if self._fd >= 0:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+            os.close(self._fd)
+        self._fd = None
+
+    @classmethod
+    def release_all(cls):
+        """Give up every role this process holds (e.g. a pre-fork master that never writes)."""
+        for lease in cls._leases:
+            lease.release()
+
+    @classmethod
+    def _forget_in_child(cls):
+        # A forked child shares the parent's lock; close its copy without
+        # unlocking so the parent keeps the role and the child has none
+        for lease in cls._leases:
+            if lease._fd is not None and lease._fd >= 0:
+                try:
+                    os.close(lease._fd)
+                except OSError:
+                    pass
+            lease._fd = None
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=WriterLease._forget_in_child)
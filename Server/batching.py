@@ -0,0 +1,183 @@
+"""
+batching.py
+
+Dynamic micro-batching for the XLM-R classifiers.
+
+Concurrent requests would otherwise each run a batch-of-one forward pass.
+A MicroBatcher collects submitted texts for up to `max_wait_ms` or until
+`max_batch_size` are waiting, runs one padded forward pass for the lot on
+an executor (see executors.py) and resolves every caller's future with its
+own result.
+
+At most `max_concurrent_batches` batches are in flight; while they run, new
+requests keep accumulating, so batches grow with load and the added latency
+under light load is bounded by max_wait_ms. At most `max_pending` requests
+wait; beyond that submit() raises ExecutorSaturated, like the executors.
+"""
+
+import asyncio
+import time
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+from executors import BoundedExecutor, ExecutorSaturated
+
+# Defaults tuned for CPU hosts: small batches, short wait
+MAX_BATCH_SIZE = 16
+MAX_WAIT_MS = 5.0
+
+# Requests waiting for a batch before new ones are rejected
+MAX_PENDING = 256
+
+
+class MicroBatcher:
+    """Groups concurrent single-item requests into batched calls"""
+
+    def __init__(self, name: str, batch_fn: Callable[[List[Any]], List[Any]],
+                 executor: BoundedExecutor, max_batch_size: int = MAX_BATCH_SIZE,
+                 max_wait_ms: float = MAX_WAIT_MS, max_concurrent_batches: Optional[int] = None,
+                 max_pending: int = MAX_PENDING):
+        """
+        Args:
+            name: Used in metrics and log lines
+            batch_fn: Blocking function mapping a list of items to a list of
+                results in the same order
+            executor: Pool the batches run on
+            max_batch_size: Upper bound on items per call
+            max_wait_ms: How long the first item of a batch waits for company
+            max_concurrent_batches: Batches in flight at once (defaults to
+                the executor's worker count)
+            max_pending: Requests allowed to wait for a batch
+        """
+        self.name = name
+        self.batch_fn = batch_fn
+        self.executor = executor
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.max_concurrent_batches = max_concurrent_batches or executor.max_workers
+        self.max_pending = max_pending
+
+        self._queue: Optional[asyncio.Queue] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._collector: Optional[asyncio.Task] = None
+        # The loop only holds weak references to tasks; in-flight batches live here
+        self._batch_tasks: Set[asyncio.Task] = set()
+
+        self.rejected = 0
+        self.batches = 0
+        self.items = 0
+        self.largest_batch = 0
+        self.total_batch_time = 0.0
+
+    def _ensure_started(self):
+        if self._collector is None or self._collector.done():
+            if self._collector is not None:
+                # Requests queued for the collector that died would wait forever
+                error = None if self._collector.cancelled() else self._collector.exception()
+                self._fail_pending(RuntimeError(f"{self.name} batcher stopped: {error}"))
+            self._queue = asyncio.Queue(self.max_pending)
+            self._slots = asyncio.Semaphore(self.max_concurrent_batches)
+            self._collector = asyncio.create_task(self._collect())
+
+    def _fail_pending(self, error: Exception, batch: Optional[List[Tuple[Any, asyncio.Future]]] = None):
+        """Fail the futures of a collected batch and of everything still queued."""
+        waiting = list(batch or [])
+        while self._queue is not None and not self._queue.empty():
+            waiting.append(self._queue.get_nowait())
+        for _, future in waiting:
+            if not future.done():
+                future.set_exception(error)
+
+    async def submit(self, item: Any) -> Any:
+        """
+        Queue one item and wait for its result.
+
+        Raises:
+            ExecutorSaturated: max_pending requests are already waiting
+        """
+        self._ensure_started()
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self._queue.put_nowait((item, future))
+        except asyncio.QueueFull:
+            self.rejected += 1
+            raise ExecutorSaturated(f"{self.name} batcher is saturated "
+                                    f"({self.max_pending} requests waiting)") from None
+        return await future
+
+    async def _collect(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            # Wait for a free slot first so requests pile up while all
+            # in-flight batches are busy
+            await self._slots.acquire()
+            batch = []
+            try:
+                batch.append(await self._queue.get())
+                deadline = loop.time() + self.max_wait
+
+                while len(batch) < self.max_batch_size:
+                    if not self._queue.empty():
+                        batch.append(self._queue.get_nowait())
+                        continue
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                    except asyncio.TimeoutError:
+                        break
+
+                task = asyncio.create_task(self._run_batch(batch))
+            except BaseException:
+                self._slots.release()
+                self._fail_pending(RuntimeError(f"{self.name} batcher stopped"), batch)
+                raise
+            self._batch_tasks.add(task)
+            task.add_done_callback(self._batch_tasks.discard)
+
+    async def _run_batch(self, batch: List[Tuple[Any, asyncio.Future]]):
+        try:
+            # Callers that went away (client disconnect) are skipped
+            batch = [(item, future) for item, future in batch if not future.done()]
+            if not batch:
+                return
+
+            start = time.perf_counter()
+            try:
+                results = await self.executor.run(self.batch_fn, [item for item, _ in batch])
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                return
+
+            self.batches += 1
+            self.items += len(batch)
+            self.largest_batch = max(self.largest_batch, len(batch))
+            self.total_batch_time += time.perf_counter() - start
+
+            for (_, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+        finally:
+            self._slots.release()
+
+    def metrics(self) -> Dict:
+        return {
+            'max_batch_size': self.max_batch_size,
+            'max_wait_ms': self.max_wait * 1000.0,
+            'pending': self._queue.qsize() if self._queue is not None else 0,
+            'max_pending': self.max_pending,
+            'rejected': self.rejected,
+            'in_flight_batches': len(self._batch_tasks),
+            'batches': self.batches,
+            'items': self.items,
+            'avg_batch_size': round(self.items / self.batches, 2) if self.batches else 0.0,
+            'largest_batch': self.largest_batch,
+            'avg_batch_ms': round(1000 * self.total_batch_time / self.batches, 2) if self.batches else 0.0
+        }
+
+    async def stop(self):
+        if self._collector is not None:
+            self._collector.cancel()
+            self._collector = None
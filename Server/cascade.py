@@ -0,0 +1,442 @@
+"""
+cascade.py
+
+Cheap first-tier classifiers in front of the XLM-R models.
+
+Most tweets are rejected as category "others" or as Non-Factual, and many
+of those are easy. HashedLinearModel is a multinomial logistic regression
+over hashed word uni/bigrams and character 3-5-grams; scoring a tweet is a
+sparse dot product that takes microseconds. CascadeClassifier holds one
+such model per head (category, factuality) and answers only when its
+probability clears the head's threshold. Everything else escalates to
+ModelManager / FactualityClassifier (see classifier_pipeline.py).
+
+The models are distilled from the transformers themselves: every escalated
+prediction is appended to PREDICTION_LOG_FILE, and running this module
+trains both heads from the logs (the transformer's labels), prints coverage and
+agreement per threshold on a held-out split, and saves CASCADE_MODEL_FILE.
+
+A small random share of all tweets (AUDIT_RATE) is sent to the transformers
+whatever the cascade says, so live agreement is measured continuously.
+Escalations are biased toward the hard cases the cascade could not answer;
+those audited rows are a uniform sample of traffic and are logged separately
+to PREDICTION_SAMPLE_FILE, which the held-out evaluation is drawn from.
+Both logs rotate once they exceed PREDICTION_LOG_MAX_BYTES.
+"""
+
+import json
+import os
+import random
+import re
+import threading
+import time
+import zlib
+from collections import Counter
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from atomic_files import WriterLease, atomic_replace, file_lock
+
+CASCADE_MODEL_FILE = "cascade_model.npz"
+PREDICTION_LOG_FILE = "predictions.jsonl"
+PREDICTION_SAMPLE_FILE = "predictions.sample.jsonl"
+
+# Size at which a prediction log is rotated, and rotated files kept (.1 ... .N)
+PREDICTION_LOG_MAX_BYTES = 64 * 1024 * 1024
+PREDICTION_LOG_BACKUPS = 3
+
+# Feature hashing space (2^18 buckets x classes float32 weights)
+HASH_DIM = 1 << 18
+
+# Minimum cascade probability to answer without the transformer
+CATEGORY_THRESHOLD = 0.95
+FACTUALITY_THRESHOLD = 0.95
+
+# Share of confident cascade answers also checked by the transformer
+AUDIT_RATE = 0.02
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def hashed_features(text: str, dim: int = HASH_DIM) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Sparse L2-normalised feature vector of a text.
+
+    crc32 rather than hash(): Python's string hash is salted per process,
+    and the training and serving processes must agree on bucket ids.
+
+    Returns:
+        (indices, values) arrays
+    """
+    words = _WORD_RE.findall(text.lower())
+    grams = [f"w:{word}" for word in words]
+    grams += [f"b:{first} {second}" for first, second in zip(words, words[1:])]
+    padded = f" {' '.join(words)} "
+    grams += [f"c:{padded[i:i + n]}" for n in (3, 4, 5) for i in range(len(padded) - n + 1)]
+
+    counts = Counter(zlib.crc32(gram.encode("utf-8")) % dim for gram in grams)
+    indices = np.fromiter(counts.keys(), dtype=np.int64, count=len(counts))
+    values = np.log1p(np.fromiter(counts.values(), dtype=np.float32, count=len(counts)))
+    norm = float(np.linalg.norm(values))
+    if norm > 0:
+        values /= norm
+    return indices, values
+
+
+def _softmax(scores: np.ndarray) -> np.ndarray:
+    scores = scores - scores.max(axis=-1, keepdims=True)
+    exp = np.exp(scores)
+    return exp / exp.sum(axis=-1, keepdims=True)
+
+
+class HashedLinearModel:
+    """Multinomial logistic regression over hashed n-gram features"""
+
+    def __init__(self, num_classes: int, dim: int = HASH_DIM):
+        self.num_classes = num_classes
+        self.dim = dim
+        self.weights = np.zeros((dim, num_classes), dtype=np.float32)
+        self.bias = np.zeros(num_classes, dtype=np.float32)
+
+    def predict_proba_features(self, indices: np.ndarray, values: np.ndarray) -> np.ndarray:
+        return _softmax(values @ self.weights[indices] + self.bias)
+
+    def predict_proba(self, texts: Sequence[str]) -> np.ndarray:
+        """Class probabilities, one row per text."""
+        if not texts:
+            return np.zeros((0, self.num_classes), dtype=np.float32)
+        return np.stack([self.predict_proba_features(*hashed_features(text, self.dim)) for text in texts])
+
+    def fit(self, texts: Sequence[str], targets: np.ndarray, epochs: int = 5,
+            learning_rate: float = 0.5, l2: float = 1e-6, seed: int = 0):
+        """
+        Train with plain SGD on cross-entropy against (soft) targets.
+
+        Args:
+            texts: Training texts
+            targets: (n, num_classes) target distributions (one-hot or probs)
+        """
+        features = [hashed_features(text, self.dim) for text in texts]
+        order = list(range(len(features)))
+        rng = random.Random(seed)
+
+        for epoch in range(epochs):
+            rng.shuffle(order)
+            rate = learning_rate / (1 + epoch)
+            loss = 0.0
+            for i in order:
+                indices, values = features[i]
+                probs = self.predict_proba_features(indices, values)
+                loss -= float(np.log(np.maximum(probs, 1e-12)) @ targets[i])
+                gradient = probs - targets[i]
+                self.weights[indices] -= rate * (values[:, None] * gradient[None, :]
+                                                 + l2 * self.weights[indices])
+                self.bias -= rate * gradient
+            print(f"  epoch {epoch + 1}/{epochs}: loss {loss / max(len(order), 1):.4f}")
+
+
+def log_files(path: str, backups: int = PREDICTION_LOG_BACKUPS) -> List[str]:
+    """A log and its rotated files that exist, oldest first."""
+    paths = [f"{path}.{i}" for i in range(backups, 0, -1)] + [path]
+    return [p for p in paths if os.path.exists(p)]
+
+
+class PredictionLog:
+    """Size-capped JSONL logs of transformer predictions (cascade training data)"""
+
+    def __init__(self, path: str = PREDICTION_LOG_FILE, sample_path: str = PREDICTION_SAMPLE_FILE,
+                 max_bytes: int = PREDICTION_LOG_MAX_BYTES, backups: int = PREDICTION_LOG_BACKUPS):
+        """
+        Args:
+            path: Escalated predictions (rows the cascade could not answer)
+            sample_path: Uniform sample of all traffic (the audited rows)
+            max_bytes: Size at which a file is rotated to .1 (.1 to .2, ...)
+            backups: Rotated files kept per log; older ones are deleted
+        """
+        self.path = path
+        self.sample_path = sample_path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self._lock = threading.Lock()
+
+    def write(self, records: List[Dict], sample: Sequence[Dict] = ()):
+        """Append escalated records to the log and sampled records to the sample log."""
+        self._append(self.path, records)
+        self._append(self.sample_path, sample)
+
+    def _append(self, path: str, records: Sequence[Dict]):
+        if not records:
+            return
+        lines = "".join(json.dumps(record, ensure_ascii=False) + "\n" for record in records)
+        try:
+            # The file lock keeps other server processes from rotating meanwhile
+            with self._lock, file_lock(path):
+                if os.path.exists(path) and os.path.getsize(path) >= self.max_bytes:
+                    self._rotate(path)
+                with open(path, "a", encoding="utf-8") as f:
+                    f.write(lines)
+        except OSError as e:
+            print(f"Error writing prediction log: {e}")
+
+    def _rotate(self, path: str):
+        if self.backups < 1:
+            os.remove(path)
+            return
+        for i in range(self.backups - 1, 0, -1):
+            if os.path.exists(f"{path}.{i}"):
+                os.replace(f"{path}.{i}", f"{path}.{i + 1}")
+        os.replace(path, f"{path}.1")
+        print(f"Rotated prediction log {path}")
+
+
+class CascadeClassifier:
+    """Confidence-gated cheap classifiers for the category and factuality heads"""
+
+    def __init__(self, category_model: HashedLinearModel, factuality_model: HashedLinearModel,
+                 category_threshold: float = CATEGORY_THRESHOLD,
+                 factuality_threshold: float = FACTUALITY_THRESHOLD,
+                 audit_rate: float = AUDIT_RATE):
+        self.category_model = category_model
+        self.factuality_model = factuality_model
+        self.category_threshold = category_threshold
+        self.factuality_threshold = factuality_threshold
+        self.audit_rate = audit_rate
+
+        self._lock = threading.Lock()
+        self.counts = Counter()
+
+    def predict(self, texts: Sequence[str]) -> List[Dict]:
+        """
+        Cheap predictions for a batch.
+
+        Returns:
+            One dict per text with category / factuality class ids and
+            probability arrays, whether each clears its threshold, and
+            whether the row was picked for an audit against the transformer
+        """
+        results = []
+        for text in texts:
+            indices, values = hashed_features(text, self.category_model.dim)
+            category_probs = self.category_model.predict_proba_features(indices, values)
+            factuality_probs = self.factuality_model.predict_proba_features(indices, values)
+            category = int(category_probs.argmax())
+            factuality = int(factuality_probs.argmax())
+            results.append({
+                'category': category,
+                'category_probs': category_probs,
+                'category_confident': bool(category_probs[category] >= self.category_threshold),
+                'factuality': factuality,
+                'factuality_probs': factuality_probs,
+                'factuality_confident': bool(factuality_probs[factuality] >= self.factuality_threshold),
+                'audit': random.random() < self.audit_rate
+            })
+        return results
+
+    def record(self, head: str, answered: int = 0, escalated: int = 0):
+        """Count rows a head answered itself vs sent to the transformer."""
+        with self._lock:
+            self.counts[f"{head}_answered"] += answered
+            self.counts[f"{head}_escalated"] += escalated
+
+    def record_agreement(self, head: str, cascade_id: int, transformer_id: int):
+        """Track how often an audited confident answer matched the transformer."""
+        with self._lock:
+            self.counts[f"{head}_audited"] += 1
+            self.counts[f"{head}_agreed"] += int(cascade_id == transformer_id)
+
+    def get_statistics(self) -> Dict:
+        with self._lock:
+            counts = dict(self.counts)
+        stats = {
+            'category_threshold': self.category_threshold,
+            'factuality_threshold': self.factuality_threshold,
+            'audit_rate': self.audit_rate
+        }
+        for head in ('category', 'factuality'):
+            answered = counts.get(f"{head}_answered", 0)
+            escalated = counts.get(f"{head}_escalated", 0)
+            audited = counts.get(f"{head}_audited", 0)
+            stats[head] = {
+                'answered': answered,
+                'escalated': escalated,
+                'coverage': round(answered / (answered + escalated), 4) if answered + escalated else 0.0,
+                'audited': audited,
+                'agreement': round(counts.get(f"{head}_agreed", 0) / audited, 4) if audited else None
+            }
+        return stats
+
+    def save(self, path: str = CASCADE_MODEL_FILE):
+        """
+        Write the model, unless another process is already writing it.
+
+        The file is written under a unique temporary name and swapped in
+        under its lock (atomic_files.py), so servers reading it never see a
+        partial file.
+        """
+        lease = WriterLease(path)
+        if not lease.acquire():
+            raise RuntimeError(f"Another process is writing {path}")
+        try:
+            with atomic_replace(path, suffix=".npz") as tmp_path:
+                np.savez(
+                    tmp_path,
+                    category_weights=self.category_model.weights,
+                    category_bias=self.category_model.bias,
+                    factuality_weights=self.factuality_model.weights,
+                    factuality_bias=self.factuality_model.bias,
+                    thresholds=np.array([self.category_threshold, self.factuality_threshold])
+                )
+        finally:
+            lease.release()
+        print(f"Saved cascade model to {path}")
+
+    @classmethod
+    def load(cls, path: str = CASCADE_MODEL_FILE, **kwargs) -> Optional["CascadeClassifier"]:
+        """Load a saved cascade; None if no model has been trained yet."""
+        if not os.path.exists(path):
+            print(f"No cascade model at {path}; every tweet goes to the transformers")
+            return None
+
+        with np.load(path, allow_pickle=False) as data:
+            models = []
+            for head in ('category', 'factuality'):
+                weights = data[f"{head}_weights"]
+                model = HashedLinearModel(weights.shape[1], dim=weights.shape[0])
+                model.weights = weights.astype(np.float32)
+                model.bias = data[f"{head}_bias"].astype(np.float32)
+                models.append(model)
+            category_threshold, factuality_threshold = data['thresholds'].tolist()
+
+        kwargs.setdefault('category_threshold', category_threshold)
+        kwargs.setdefault('factuality_threshold', factuality_threshold)
+        print(f"Loaded cascade model from {path}")
+        return cls(models[0], models[1], **kwargs)
+
+
+def load_prediction_log(path: str = PREDICTION_LOG_FILE,
+                        soft_targets: bool = False) -> Dict[str, Tuple[List[str], np.ndarray]]:
+    """
+    Read logged transformer predictions as training data.
+
+    Args:
+        path: A prediction log; its rotated files are read too
+        soft_targets: Train on the transformer's probabilities instead of
+            one-hot argmax labels. Soft targets cap the cascade's confidence
+            at the transformer's, so fewer rows clear a fixed threshold.
+
+    Returns:
+        {'category': (texts, targets), 'factuality': (texts, targets)}; the
+        last prediction of a text wins
+    """
+    latest: Dict[str, Dict] = {}
+    for log_path in log_files(path):
+        with open(log_path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                if record.get("text"):
+                    latest.setdefault(record["text"], {}).update(
+                        {k: v for k, v in record.items() if v is not None}
+                    )
+
+    data = {}
+    for head in ('category', 'factuality'):
+        rows = [(text, record[f"{head}_probs"]) for text, record in latest.items()
+                if record.get(f"{head}_probs")]
+        texts = [text for text, _ in rows]
+        if not rows:
+            data[head] = ([], np.zeros((0, 0), dtype=np.float32))
+            continue
+        targets = np.array([probs for _, probs in rows], dtype=np.float32)
+        if not soft_targets:
+            targets = np.eye(targets.shape[1], dtype=np.float32)[targets.argmax(axis=1)]
+        data[head] = (texts, targets)
+    return data
+
+
+def threshold_report(model: HashedLinearModel, texts: Sequence[str], targets: np.ndarray,
+                     thresholds: Sequence[float] = (0.8, 0.85, 0.9, 0.95, 0.98, 0.99)) -> List[Dict]:
+    """Coverage and agreement with the transformer for each candidate threshold."""
+    probs = model.predict_proba(texts)
+    predicted = probs.argmax(axis=1)
+    confidence = probs.max(axis=1)
+    expected = targets.argmax(axis=1)
+
+    report = []
+    for threshold in thresholds:
+        answered = confidence >= threshold
+        report.append({
+            'threshold': threshold,
+            'coverage': round(float(answered.mean()), 4) if len(texts) else 0.0,
+            'agreement': round(float((predicted[answered] == expected[answered]).mean()), 4)
+                         if answered.any() else None
+        })
+    return report
+
+
+def train_from_log(log_path: str = PREDICTION_LOG_FILE, holdout: float = 0.1,
+                   epochs: int = 5, seed: int = 0, soft_targets: bool = False,
+                   sample_path: str = PREDICTION_SAMPLE_FILE) -> CascadeClassifier:
+    """
+    Train both cascade heads on the prediction logs and print threshold tables.
+
+    The held-out split comes from the uniform sample log when it has rows,
+    so the coverage / agreement tables describe real traffic rather than
+    the hard cases escalations over-represent; the rest of the sample is
+    trained on along with the escalations.
+    """
+    data = load_prediction_log(log_path, soft_targets=soft_targets)
+    sample = load_prediction_log(sample_path, soft_targets=soft_targets)
+    models = {}
+    for head in ('category', 'factuality'):
+        texts, targets = data[head]
+        sample_texts, sample_targets = sample[head]
+
+        rng = random.Random(seed)
+        if sample_texts:
+            order = list(range(len(sample_texts)))
+            rng.shuffle(order)
+            split = int(len(order) * (1 - holdout))
+            test_texts = [sample_texts[i] for i in order[split:]]
+            test_targets = sample_targets[order[split:]]
+            held_out = set(test_texts)
+            keep = [i for i, text in enumerate(texts) if text not in held_out]
+            train_texts = [texts[i] for i in keep] + [sample_texts[i] for i in order[:split]]
+            parts = [targets[keep], sample_targets[order[:split]]]
+            train_targets = np.concatenate([part for part in parts if len(part)] or parts[1:])
+            source = f"{sample_path} (uniform sample)"
+        else:
+            order = list(range(len(texts)))
+            rng.shuffle(order)
+            split = int(len(order) * (1 - holdout))
+            train_texts, train_targets = [texts[i] for i in order[:split]], targets[order[:split]]
+            test_texts, test_targets = [texts[i] for i in order[split:]], targets[order[split:]]
+            source = f"{log_path} (escalations only: biased toward hard cases)"
+
+        if not train_texts:
+            raise ValueError(f"No logged {head} predictions in {log_path}")
+
+        print(f"Training {head} cascade on {len(train_texts)} tweets "
+              f"({len(test_texts)} held out from {source})...")
+        start_time = time.time()
+        model = HashedLinearModel(train_targets.shape[1])
+        model.fit(train_texts, train_targets, epochs=epochs, seed=seed)
+        print(f"  trained in {time.time() - start_time:.1f} seconds")
+
+        for row in threshold_report(model, test_texts, test_targets):
+            print(f"  threshold {row['threshold']:.2f}: coverage {row['coverage']:.2%}, "
+                  f"agreement {row['agreement']}")
+        models[head] = model
+
+    return CascadeClassifier(models['category'], models['factuality'])
+
+
+if __name__ == "__main__":
+    import sys
+
+    log_path = sys.argv[1] if len(sys.argv) > 1 else PREDICTION_LOG_FILE
+    cascade = train_from_log(log_path)
+    cascade.save()
@@ -0,0 +1,248 @@
+"""
+classifier_pipeline.py
+
+One tokenization pass for the category and factuality classifiers.
+
+Both models are XLM-R fine-tunes with the same sentencepiece vocabulary, so
+a tweet is tokenized once with the fast (Rust) tokenizer and the same
+input_ids / attention_mask tensors are fed to both. Factuality is skipped
+for rows whose category ends the pipeline anyway (e.g. "others").
+
+If the two encoders turn out to have identical weights (e.g. heads trained
+on a frozen shared encoder), the encoder runs once and both classification
+heads are applied to its output.
+
+With a CascadeClassifier, cheap hashed-n-gram models answer the confident
+rows of each head and only the rest are tokenized and sent to XLM-R.
+"""
+
+import random
+from typing import Dict, Iterable, List, Optional
+
+import torch
+
+from xlmmodel import ModelManager
+from factualmodel import FactualityClassifier
+from cascade import AUDIT_RATE, CascadeClassifier, PredictionLog
+
+
+class TweetClassifierPipeline:
+    """Category + factuality classification from shared tokenized inputs"""
+
+    def __init__(self, model_manager: ModelManager, factuality_model: FactualityClassifier,
+                 skip_factuality_for: Iterable[int] = (), cascade: Optional[CascadeClassifier] = None,
+                 prediction_log: Optional[PredictionLog] = None):
+        """
+        Args:
+            model_manager: Category classifier
+            factuality_model: Factual / non-factual classifier
+            skip_factuality_for: Category ids that do not need a factuality check
+            cascade: Cheap first-tier models answering confident cases (cascade.py)
+            prediction_log: Where transformer predictions are logged for
+                training the cascade
+        """
+        self.model_manager = model_manager
+        self.factuality_model = factuality_model
+        self.skip_factuality_for = set(skip_factuality_for)
+        self.cascade = cascade
+        self.prediction_log = prediction_log
+        self.shared_tokenizer = False
+        self.shared_encoder = False
+
+    def with_models(self, model_manager: ModelManager,
+                    factuality_model: FactualityClassifier) -> "TweetClassifierPipeline":
+        """
+        A pipeline over other (loaded) models sharing this one's settings,
+        cascade and prediction log. setup() has already been run on it.
+        """
+        pipeline = TweetClassifierPipeline(
+            model_manager,
+            factuality_model,
+            skip_factuality_for=self.skip_factuality_for,
+            cascade=self.cascade,
+            prediction_log=self.prediction_log
+        )
+        pipeline.setup()
+        return pipeline
+
+    def setup(self):
+        """Check what the loaded models can share. Call after both load_model()s."""
+        self.shared_tokenizer = (
+            self.model_manager.tokenizer.get_vocab() == self.factuality_model.tokenizer.get_vocab()
+        )
+        self.shared_encoder = (
+            self.shared_tokenizer
+            and self.model_manager.backend == "torch"
+            and self.factuality_model.backend == "torch"
+            and self._encoders_identical()
+        )
+        print(f"Classifier pipeline: shared tokenizer={self.shared_tokenizer}, "
+              f"shared encoder={self.shared_encoder}")
+
+    def _encoders_identical(self) -> bool:
+        try:
+            first = self.model_manager.model.roberta.state_dict()
+            second = self.factuality_model.model.roberta.state_dict()
+            if first.keys() != second.keys():
+                return False
+            return all(
+                first[name].shape == second[name].shape
+                and first[name].dtype == second[name].dtype
+                and torch.equal(first[name].cpu(), second[name].cpu())
+                for name in first
+            )
+        except Exception as e:
+            print(f"Could not compare classifier encoders: {e}")
+            return False
+
+    def classify_batch(self, texts: List[str]) -> List[Dict]:
+        """
+        Classify a batch of tweets.
+
+        With a cascade, each head first tries the cheap model and only rows
+        it is unsure about (plus a small audit sample) reach the transformer.
+
+        Returns:
+            One dict per text: {'class_id': int, 'factuality': dict or None,
+            'source': {head: 'cascade' | 'transformer'}} where 'factuality'
+            is in FactualityClassifier.predict format (with probabilities)
+            and None for skipped categories
+        """
+        cheap = self.cascade.predict(texts) if self.cascade is not None else None
+        results = [{'class_id': None, 'factuality': None, 'source': {}} for _ in texts]
+
+        # ---- category ----
+        category_rows = []
+        for i in range(len(texts)):
+            if cheap is not None and cheap[i]['category_confident']:
+                results[i]['class_id'] = cheap[i]['category']
+                results[i]['source']['category'] = 'cascade'
+                if not cheap[i]['audit']:
+                    continue
+            category_rows.append(i)
+
+        # Rows that might need the factuality transformer, known up front
+        # only for rows whose category the cascade already settled
+        settled = set(range(len(texts))) - set(category_rows)
+        factuality_candidates = [
+            i for i in sorted(settled)
+            if results[i]['class_id'] not in self.skip_factuality_for
+            and not (cheap[i]['factuality_confident'] and not cheap[i]['audit'])
+        ]
+
+        # One tokenization for every row that reaches a transformer
+        work_rows = category_rows + factuality_candidates
+        encoded = None
+        if work_rows and self.shared_tokenizer:
+            encoded = self.model_manager.tokenize([texts[i] for i in work_rows])
+        positions = {row: p for p, row in enumerate(work_rows)}
+
+        log = {}
+        factuality_logits = {}
+        if category_rows:
+            inputs = self._inputs(category_rows, texts, encoded, positions, self.model_manager)
+            category_probs, shared_factuality = self._category_forward(inputs)
+            for k, row in enumerate(category_rows):
+                class_id = int(category_probs[k].argmax())
+                if cheap is not None and cheap[row]['category_confident']:
+                    self.cascade.record_agreement('category', cheap[row]['category'], class_id)
+                results[row]['class_id'] = class_id
+                results[row]['source']['category'] = 'transformer'
+                log[row] = {'text': texts[row], 'category': class_id,
+                            'category_probs': [round(p, 5) for p in category_probs[k].tolist()]}
+                if shared_factuality is not None:
+                    factuality_logits[row] = shared_factuality[k]
+
+        # ---- factuality ----
+        factuality_rows = []
+        for i in range(len(texts)):
+            if results[i]['class_id'] in self.skip_factuality_for:
+                continue
+            if cheap is not None and cheap[i]['factuality_confident']:
+                results[i]['factuality'] = self._cascade_factuality(cheap[i])
+                results[i]['source']['factuality'] = 'cascade'
+                if not cheap[i]['audit']:
+                    continue
+            factuality_rows.append(i)
+
+        pending = [row for row in factuality_rows if row not in factuality_logits]
+        if pending:
+            inputs = self._inputs(pending, texts, encoded, positions, self.factuality_model)
+            logits = self.factuality_model.forward_logits(inputs)
+            for k, row in enumerate(pending):
+                factuality_logits[row] = logits[k]
+
+        if factuality_rows:
+            logits = torch.stack([factuality_logits[row].float().cpu() for row in factuality_rows])
+            for row, result in zip(factuality_rows,
+                                   self.factuality_model.results_from_logits(logits, return_probs=True)):
+                if cheap is not None and cheap[row]['factuality_confident']:
+                    self.cascade.record_agreement('factuality', cheap[row]['factuality'], result['class_id'])
+                results[row]['factuality'] = result
+                results[row]['source']['factuality'] = 'transformer'
+                log.setdefault(row, {'text': texts[row]}).update({
+                    'factuality': result['class_id'],
+                    'factuality_probs': [round(p, 5) for p in result['probabilities'].values()]
+                })
+
+        if self.cascade is not None:
+            self.cascade.record('category', answered=len(texts) - len(category_rows),
+                                escalated=len(category_rows))
+            needed = sum(1 for result in results if result['class_id'] not in self.skip_factuality_for)
+            self.cascade.record('factuality', answered=needed - len(factuality_rows),
+                                escalated=len(factuality_rows))
+        if self.prediction_log is not None:
+            # Audited rows are a uniform sample of traffic, all transformer-labelled
+            if cheap is not None:
+                sampled = {row for row in log if cheap[row]['audit']}
+            else:
+                sampled = {row for row in log if random.random() < AUDIT_RATE}
+            self.prediction_log.write(
+                [log[row] for row in sorted(log) if row not in sampled],
+                sample=[log[row] for row in sorted(sampled)]
+            )
+
+        return results
+
+    def _inputs(self, rows: List[int], texts: List[str], encoded, positions: Dict[int, int], model):
+        """Tokenized inputs for some rows: a slice of the shared batch, or fresh."""
+        if encoded is not None:
+            return self._select_rows(encoded, [positions[row] for row in rows])
+        return model.tokenize([texts[row] for row in rows])
+
+    def _category_forward(self, inputs):
+        """
+        Category probabilities, plus factuality logits when the encoder is shared.
+        """
+        if not self.shared_encoder:
+            logits = self.model_manager.forward_logits(inputs)
+            return torch.softmax(logits.float(), dim=1).cpu(), None
+
+        category_model = self.model_manager.model
+        factuality_model = self.factuality_model.model
+        inputs = {k: v.to(category_model.device) for k, v in inputs.items()}
+
+        with torch.no_grad():
+            sequence_output = category_model.roberta(**inputs)[0]
+            category_logits = category_model.classifier(sequence_output)
+            factuality_logits = factuality_model.classifier(sequence_output.to(factuality_model.device))
+
+        return torch.softmax(category_logits.float(), dim=1).cpu(), factuality_logits
+
+    def _cascade_factuality(self, cheap: Dict) -> Dict:
+        """Cascade factuality answer in FactualityClassifier.predict format."""
+        label_map = self.factuality_model.label_map
+        probs = cheap['factuality_probs']
+        return {
+            "prediction": label_map[cheap['factuality']],
+            "class_id": cheap['factuality'],
+            "probabilities": {label_map[i]: float(p) for i, p in enumerate(probs)}
+        }
+
+    @staticmethod
+    def _select_rows(inputs, rows: List[int]) -> Dict[str, torch.Tensor]:
+        """Take a subset of a padded batch and trim padding it no longer needs."""
+        index = torch.tensor(rows, dtype=torch.long)
+        subset = {k: v[index] for k, v in inputs.items()}
+        length = int(subset['attention_mask'].sum(dim=1).max())
+        return {k: v[:, :length] for k, v in subset.items()}
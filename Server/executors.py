@@ -0,0 +1,160 @@
+"""
+executors.py
+
+Bounded executors for blocking work called from async endpoints.
+
+classify_tweet_endpoint is `async def`, so anything blocking it calls
+directly (XLM-R forward passes, sentence embeddings, the database work of
+cross verification) freezes the whole event loop, admin and member routes
+included. Those stages are dispatched here instead:
+
+    inference  - classifier / factuality / embedding forward passes
+    verify     - cross_verify's database and language-detection steps (its
+                 remote calls are async, see http_client.py)
+
+Each pool has a fixed number of workers and a bounded queue. When the
+queue is full new work is rejected with ExecutorSaturated rather than piling
+up behind a slow verification; the endpoint turns that into a 503. Queue
+depth, wait and run times are tracked per pool for the /metrics/executors
+endpoint.
+
+Threads rather than processes: torch releases the GIL inside forward passes,
+and worker processes would each need their own copy of the model weights.
+"""
+
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict
+
+# Worker threads and queued-task limit per pool
+INFERENCE_WORKERS = 2
+INFERENCE_QUEUE_SIZE = 32
+VERIFY_WORKERS = 8
+VERIFY_QUEUE_SIZE = 64
+
+
+class ExecutorSaturated(Exception):
+    """Raised when a pool's queue is full and the task was not accepted."""
+
+
+class BoundedExecutor:
+    """Thread pool with a bounded queue and queue-depth metrics"""
+
+    def __init__(self, name: str, max_workers: int, max_queue: int):
+        """
+        Args:
+            name: Pool name used in thread names and metrics
+            max_workers: Tasks that run concurrently
+            max_queue: Tasks allowed to wait for a worker; more are rejected
+        """
+        self.name = name
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f"{name}-worker")
+        self._lock = threading.Lock()
+
+        self.queued = 0
+        self.running = 0
+        self.peak_queued = 0
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.total_wait = 0.0
+        self.total_run = 0.0
+
+    def _track(self, fn: Callable, enqueued_at: float, args, kwargs):
+        started = time.perf_counter()
+        with self._lock:
+            self.queued -= 1
+            self.running += 1
+            self.total_wait += started - enqueued_at
+
+        try:
+            result = fn(*args, **kwargs)
+        except BaseException:
+            with self._lock:
+                self.failed += 1
+            raise
+        else:
+            with self._lock:
+                self.completed += 1
+            return result
+        finally:
+            with self._lock:
+                self.running -= 1
+                self.total_run += time.perf_counter() - started
+
+    def submit(self, fn: Callable, *args, **kwargs):
+        """
+        Queue fn(*args, **kwargs) on the pool.
+
+        Returns:
+            concurrent.futures.Future
+
+        Raises:
+            ExecutorSaturated: The queue already holds max_queue waiting tasks
+        """
+        with self._lock:
+            if self.queued + self.running >= self.max_workers + self.max_queue:
+                self.rejected += 1
+                raise ExecutorSaturated(f"{self.name} executor is saturated "
+                                        f"({self.queued} queued, {self.running} running)")
+            self.queued += 1
+            self.submitted += 1
+            self.peak_queued = max(self.peak_queued, self.queued)
+
+        try:
+            return self._pool.submit(self._track, fn, time.perf_counter(), args, kwargs)
+        except Exception:
+            with self._lock:
+                self.queued -= 1
+            raise
+
+    async def run(self, fn: Callable, *args, **kwargs):
+        """Await fn(*args, **kwargs) on the pool without blocking the event loop."""
+        return await asyncio.wrap_future(self.submit(fn, *args, **kwargs))
+
+    def metrics(self) -> Dict:
+        with self._lock:
+            finished = self.completed + self.failed
+            return {
+                'workers': self.max_workers,
+                'max_queue': self.max_queue,
+                'queue_depth': self.queued,
+                'running': self.running,
+                'peak_queue_depth': self.peak_queued,
+                'submitted': self.submitted,
+                'completed': self.completed,
+                'failed': self.failed,
+                'rejected': self.rejected,
+                'avg_wait_ms': round(1000 * self.total_wait / finished, 2) if finished else 0.0,
+                'avg_run_ms': round(1000 * self.total_run / finished, 2) if finished else 0.0
+            }
+
+    def shutdown(self, wait: bool = True):
+        self._pool.shutdown(wait=wait, cancel_futures=True)
+
+
+inference_executor = BoundedExecutor("inference", INFERENCE_WORKERS, INFERENCE_QUEUE_SIZE)
+verify_executor = BoundedExecutor("verify", VERIFY_WORKERS, VERIFY_QUEUE_SIZE)
+
+_executors = [inference_executor, verify_executor]
+
+
+def register_executor(executor: BoundedExecutor) -> BoundedExecutor:
+    """Include an extra pool in executor_metrics() and shutdown_executors()."""
+    _executors.append(executor)
+    return executor
+
+
+def executor_metrics() -> Dict[str, Dict]:
+    """Metrics of every shared pool, keyed by name."""
+    return {executor.name: executor.metrics() for executor in _executors}
+
+
+def shutdown_executors():
+    for executor in _executors:
+        executor.shutdown(wait=False)
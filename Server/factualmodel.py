@@ -1,11 +1,41 @@
 # factualmodel.py
-from transformers import XLMRobertaForSequenceClassification, XLMRobertaTokenizer, BitsAndBytesConfig
+from transformers import XLMRobertaForSequenceClassification, XLMRobertaTokenizerFast, BitsAndBytesConfig
 import torch
 
+from quantization import configure_torch_threads, quantize_dynamic_int8
+from length_bucketing import BUCKET_BATCH_SIZE, MODEL_MAX_LENGTH, bucketed_probabilities
+from model_artifacts import resolve_model_source
+
 class FactualityClassifier:
-    def __init__(self, model_name="rain12ali/factual_nonfactual-classifier-xlm-roberta"):
+    def __init__(self, model_name="rain12ali/factual_nonfactual-classifier-xlm-roberta",
+                 backend: str = "torch", quantize: bool = False,
+                 num_threads: int = None, num_interop_threads: int = None, revision: str = None,
+                 inference_pool=None):
+        """
+        backend: "torch", "onnx" for ONNX Runtime on CPU (see onnx_backend.py),
+            or "pool" for forward passes in worker processes (inference_pool.py)
+        quantize: int8 weights on CPU - the quantized ONNX model, or torch
+            dynamic quantization of the Linear layers (see quantization.py)
+        num_threads / num_interop_threads: torch CPU thread settings
+        revision: Hub branch, tag or commit to load (None = default branch;
+            see model_registry.py for hot swaps)
+        inference_pool: InferencePool serving backend="pool"
+        """
+        if backend not in ("torch", "onnx", "pool"):
+            raise ValueError(f"Unknown backend: {backend}")
+        if backend == "pool" and inference_pool is None:
+            raise ValueError("backend='pool' needs an inference_pool")
         self.model_name = model_name
+        self.revision = revision
+        self.backend = backend
+        self.quantize = quantize
+        self.num_threads = num_threads
+        self.num_interop_threads = num_interop_threads
+        self.quantization_report = None
         self.model = None
+        self.onnx_model = None
+        self.inference_pool = inference_pool
+        self.pooled_model = None
         self.tokenizer = None
 
         # ✅ FIXED: Swapped labels to match model output behavior
@@ -16,88 +46,168 @@ class FactualityClassifier:
 
     def load_model(self):
         """Load the model and tokenizer with optional quantization"""
+        if self.backend == "onnx":
+            return self._load_onnx_model()
+        if self.backend == "pool":
+            return self._load_pooled_model()
+
         print("🔄 Loading factuality classification model...")
+        configure_torch_threads(self.num_threads, self.num_interop_threads)
 
         quantization_config = BitsAndBytesConfig(
             load_in_8bit=True,
             llm_int8_threshold=6.0
         ) if torch.cuda.is_available() else None
+        source, options = self._source()
 
+        # Safetensors weights are memory-mapped rather than copied
         self.model = XLMRobertaForSequenceClassification.from_pretrained(
-            self.model_name,
+            source,
+            **options,
+            low_cpu_mem_usage=True,
             device_map="auto" if torch.cuda.is_available() else None,
             quantization_config=quantization_config,
             num_labels=2
         )
 
-        self.tokenizer = XLMRobertaTokenizer.from_pretrained(
-            self.model_name,
+        self.tokenizer = XLMRobertaTokenizerFast.from_pretrained(
+            source,
+            **options,
             model_max_length=512
         )
 
+        # bitsandbytes already quantizes on GPU; on CPU use torch dynamic int8
+        if self.quantize and not torch.cuda.is_available():
+            self.model, self.quantization_report = quantize_dynamic_int8(self.model)
+
         print("✅ Factuality classifier loaded successfully.")
 
+    def _load_onnx_model(self):
+        """Export (once) and load the ONNX Runtime model"""
+        from onnx_backend import OnnxClassifier, ensure_onnx_model
+
+        print("🔄 Loading ONNX factuality classification model...")
+        source, options = self._source()
+        self.tokenizer = XLMRobertaTokenizerFast.from_pretrained(
+            source,
+            **options,
+            model_max_length=512
+        )
+        path = ensure_onnx_model(
+            self.model_name,
+            lambda: XLMRobertaForSequenceClassification.from_pretrained(source, **options, num_labels=2),
+            self.tokenizer,
+            quantize=self.quantize,
+            revision=self.revision
+        )
+        self.onnx_model = OnnxClassifier(path)
+        print(f"✅ ONNX factuality classifier loaded successfully ({path}).")
+
+    def _load_pooled_model(self):
+        """Tokenizer here, weights in every inference pool worker"""
+        print("🔄 Loading factuality model in the inference pool workers...")
+        source, options = self._source()
+        self.tokenizer = XLMRobertaTokenizerFast.from_pretrained(
+            source,
+            **options,
+            model_max_length=512
+        )
+        self.pooled_model = self.inference_pool.load_model("factuality", self.model_name, self.revision)
+        print(f"✅ Factuality model loaded in {len(self.inference_pool.core_sets)} inference workers.")
+
+    def release(self):
+        """Free model copies held by inference pool workers"""
+        if self.pooled_model is not None:
+            self.pooled_model.release()
+            self.pooled_model = None
+
+    def _source(self):
+        """from_pretrained() path and options: the local artifact when there is one"""
+        source, local = resolve_model_source(self.model_name, self.revision)
+        if local:
+            print(f"Loading {self.model_name} from local artifact {source}")
+            return source, {"local_files_only": True}
+        return source, {"revision": self.revision}
+
     def predict(self, text: str, return_probs: bool = False):
         """Classify text as factual or non-factual"""
-        inputs = self.tokenizer(
-            text,
+        return self.predict_batch([text], return_probs=return_probs)[0]
+
+    def tokenize(self, texts: list):
+        """Padded input_ids / attention_mask tensors for a list of texts"""
+        return self.tokenizer(
+            texts,
             return_tensors="pt",
             truncation=True,
             padding=True,
-            max_length=512
+            max_length=MODEL_MAX_LENGTH
         )
 
+    def predict_batch(self, texts: list, return_probs: bool = False):
+        """predict() for several texts in one padded forward pass"""
+        return self.predict_encoded(self.tokenize(texts), return_probs=return_probs)
+
+    def predict_encoded(self, inputs, return_probs: bool = False):
+        """predict_batch() for already tokenized inputs"""
+        return self.results_from_logits(self.forward_logits(inputs), return_probs=return_probs)
+
+    def forward_logits(self, inputs):
+        """Raw logits from whichever backend is loaded"""
+        if self.onnx_model is not None:
+            return self.onnx_model.logits(inputs)
+        if self.pooled_model is not None:
+            return self.pooled_model.logits(inputs)
+
         if torch.cuda.is_available():
             inputs = {k: v.to(self.model.device) for k, v in inputs.items()}
 
         with torch.no_grad():
             outputs = self.model(**inputs)
 
-        logits = outputs.logits
-        probs = torch.softmax(logits, dim=1)
-        predicted_class_id = torch.argmax(probs, dim=1).item()
+        return outputs.logits
 
-        result = {
-            "prediction": self.label_map[predicted_class_id],
-            "class_id": predicted_class_id
-        }
+    def results_from_logits(self, logits, return_probs: bool = False):
+        """Turn a batch of logits into predict()-style result dicts"""
+        probs = torch.softmax(logits, dim=1)
+        predicted_class_ids = torch.argmax(probs, dim=1).tolist()
 
-        if return_probs:
-            result["probabilities"] = {
-                "Factual": probs[0][0].item(),
-                "Non-Factual": probs[0][1].item()
+        results = []
+        for i, predicted_class_id in enumerate(predicted_class_ids):
+            result = {
+                "prediction": self.label_map[predicted_class_id],
+                "class_id": predicted_class_id
             }
 
-        return result
+            if return_probs:
+                result["probabilities"] = {
+                    "Factual": probs[i][0].item(),
+                    "Non-Factual": probs[i][1].item()
+                }
+
+            results.append(result)
+
+        return results
+
+    def predict_proba(self, texts: list, batch_size: int = BUCKET_BATCH_SIZE, stats: dict = None):
+        """Class probabilities (n x 2) in input order, length-bucketed"""
+        return bucketed_probabilities(self.tokenizer, self.forward_logits, texts,
+                                      batch_size=batch_size, stats=stats)
 
-    def batch_predict(self, texts: list, batch_size: int = 8):
-        """Classify multiple texts in batches"""
+    def batch_predict(self, texts: list, batch_size: int = BUCKET_BATCH_SIZE):
+        """Classify multiple texts in length-bucketed batches"""
         results = []
-        for i in range(0, len(texts), batch_size):
-            batch = texts[i:i + batch_size]
-            inputs = self.tokenizer(
-                batch,
-                return_tensors="pt",
-                truncation=True,
-                padding=True,
-                max_length=512
-            )
-
-            if torch.cuda.is_available():
-                inputs = {k: v.to(self.model.device) for k, v in inputs.items()}
-
-            with torch.no_grad():
-                outputs = self.model(**inputs)
-
-            batch_probs = torch.softmax(outputs.logits, dim=1)
-            batch_preds = torch.argmax(batch_probs, dim=1)
-
-            for j, pred in enumerate(batch_preds):
-                results.append({
-                    "text": batch[j],
-                    "prediction": self.label_map[pred.item()],
-                    "class_id": pred.item(),
-                    "probability": batch_probs[j][pred].item()
-                })
+        if not texts:
+            return results
+
+        probs = self.predict_proba(texts, batch_size=batch_size)
+        preds = torch.argmax(probs, dim=1)
+
+        for j, pred in enumerate(preds):
+            results.append({
+                "text": texts[j],
+                "prediction": self.label_map[pred.item()],
+                "class_id": pred.item(),
+                "probability": probs[j][pred].item()
+            })
 
         return results
@@ -0,0 +1,111 @@
+"""
+http_client.py
+
+Shared, pooled async HTTP clients for the remote calls of crossverify.py.
+
+requests.get / requests.post without a Session open a new TCP + TLS
+connection for every call, and the NER / NLI posts had no timeout at all.
+Here each remote host gets one long-lived httpx.AsyncClient that:
+
+    - keeps connections alive between tweets (KEEPALIVE_EXPIRY)
+    - speaks HTTP/2 when the h2 package is installed and the server offers
+      it, so concurrent requests to one host share a single connection
+    - caps connections per host (HOST_LIMITS)
+
+and every call carries the timeout of its endpoint (ENDPOINT_TIMEOUTS).
+The clients are created lazily inside the running event loop (so forked
+workers each get their own) and closed on shutdown.
+"""
+
+import time
+from typing import Dict
+
+import httpx
+
+# Idle seconds before a pooled connection is closed
+KEEPALIVE_EXPIRY = 60.0
+
+# Connection pool size per remote host
+HOST_LIMITS = {
+    "nlp": httpx.Limits(max_connections=20, max_keepalive_connections=10, keepalive_expiry=KEEPALIVE_EXPIRY),
+    "search": httpx.Limits(max_connections=10, max_keepalive_connections=5, keepalive_expiry=KEEPALIVE_EXPIRY),
+}
+
+# Per-endpoint timeouts (connect stays short: a dead host should fail fast)
+ENDPOINT_TIMEOUTS = {
+    "ner": httpx.Timeout(15.0, connect=5.0),
+    "nli": httpx.Timeout(60.0, connect=5.0),
+    "search": httpx.Timeout(15.0, connect=5.0),
+}
+DEFAULT_TIMEOUT = httpx.Timeout(30.0, connect=5.0)
+
+
+def http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+class HTTPClients:
+    """One pooled AsyncClient per remote host, with per-endpoint stats"""
+
+    def __init__(self):
+        self._clients: Dict[str, httpx.AsyncClient] = {}
+        self.http2 = http2_available()
+        self.stats: Dict[str, Dict] = {}
+
+    def client(self, host: str) -> httpx.AsyncClient:
+        """The shared client of a host (created on first use)."""
+        client = self._clients.get(host)
+        if client is None or client.is_closed:
+            client = httpx.AsyncClient(
+                http2=self.http2,
+                limits=HOST_LIMITS.get(host, httpx.Limits(keepalive_expiry=KEEPALIVE_EXPIRY)),
+                follow_redirects=True
+            )
+            self._clients[host] = client
+        return client
+
+    async def request(self, host: str, endpoint: str, method: str, url: str, **kwargs) -> httpx.Response:
+        """
+        Send a request through a host's pool with the endpoint's timeout.
+
+        Raises:
+            httpx.HTTPError: Connection failures and timeouts
+        """
+        stats = self.stats.setdefault(endpoint, {'requests': 0, 'errors': 0, 'total_time': 0.0})
+        start_time = time.perf_counter()
+        try:
+            response = await self.client(host).request(
+                method, url, timeout=ENDPOINT_TIMEOUTS.get(endpoint, DEFAULT_TIMEOUT), **kwargs
+            )
+        except httpx.HTTPError:
+            stats['errors'] += 1
+            raise
+        finally:
+            stats['requests'] += 1
+            stats['total_time'] += time.perf_counter() - start_time
+        return response
+
+    def metrics(self) -> Dict:
+        return {
+            'http2': self.http2,
+            'endpoints': {
+                endpoint: {
+                    'requests': stats['requests'],
+                    'errors': stats['errors'],
+                    'avg_ms': round(1000 * stats['total_time'] / stats['requests'], 1) if stats['requests'] else 0.0
+                }
+                for endpoint, stats in self.stats.items()
+            }
+        }
+
+    async def aclose(self):
+        for client in self._clients.values():
+            await client.aclose()
+        self._clients = {}
+
+
+http_clients = HTTPClients()
@@ -0,0 +1,561 @@
+"""
+inference_pool.py
+
+Multi-process inference tier for the XLM-R classifiers.
+
+In-process inference (executors.py) runs every forward pass on one torch
+intra-op pool and holds the GIL for tensor setup and post-processing, so
+adding request threads stops helping after a couple of cores. An
+InferencePool starts N worker processes instead. Each one is pinned to its
+own set of cores (sched_setaffinity), runs torch with that many threads and
+holds its own ModelManager / FactualityClassifier.
+
+Tensors never go through pickle. Every worker owns a shared-memory ring of
+RING_SLOTS batch slots:
+
+    input_ids  int32 [slots, SLOT_MAX_BATCH, max_seq]
+    lengths    int32 [slots, SLOT_MAX_BATCH]
+    logits     float32 [slots, SLOT_MAX_BATCH, SLOT_MAX_LABELS]
+
+The caller takes a free slot, writes the token ids of its batch into it and
+sends the worker a 17-byte header (slot, model, batch, sequence length)
+over a pipe. The worker runs the forward pass, writes the logits back into
+the same slot and answers with the slot number. A full ring blocks the
+caller for up to SLOT_WAIT_TIMEOUT, then the batch is rejected with
+ExecutorSaturated, which gives natural backpressure.
+
+A slot whose forward pass timed out may still be written by its worker, so
+it is quarantined rather than reused, and returns to the ring when the
+late answer arrives. A worker that exits is restarted on the same ring
+(after RESTART_BACKOFF) and reloads every model the pool serves before it
+takes batches again.
+
+The models join a pipeline through backend="pool": the parent keeps the
+tokenizer (the fast tokenizer releases the GIL) and forward_logits() is
+served by the PooledModel handle returned by InferencePool.load_model().
+Model versions are loaded and unloaded in every worker, so ModelRegistry
+hot swaps keep working.
+"""
+
+import itertools
+import json
+import os
+import queue
+import struct
+import threading
+import time
+from concurrent.futures import Future
+from multiprocessing import get_context
+from multiprocessing.shared_memory import SharedMemory
+from typing import Dict, List, Optional, Set, Tuple
+
+import numpy as np
+import torch
+
+from executors import ExecutorSaturated
+from length_bucketing import MODEL_MAX_LENGTH
+
+# Batch slots per worker; callers block while all are in use
+RING_SLOTS = 8
+
+# Largest batch and label count one slot holds (bigger batches are split)
+SLOT_MAX_BATCH = 32
+SLOT_MAX_LABELS = 8
+
+# Seconds to wait for every worker to load a model / for one forward pass
+LOAD_TIMEOUT = 600
+FORWARD_TIMEOUT = 60
+
+# Seconds a batch waits for a free slot before it is rejected
+SLOT_WAIT_TIMEOUT = 30
+
+# Seconds before a worker that exited is restarted
+RESTART_BACKOFF = 1.0
+
+# Seconds to wait for workers to exit on shutdown
+SHUTDOWN_TIMEOUT = 10
+
+# parent -> worker: kind, slot, model key, batch size, sequence length
+_REQUEST = struct.Struct("<cIIII")
+# worker -> parent: kind, slot or model key, status (0 = ok), label count
+_RESPONSE = struct.Struct("<cIII")
+
+_MODEL_CLASSES = {
+    "category": ("xlmmodel", "ModelManager"),
+    "factuality": ("factualmodel", "FactualityClassifier")
+}
+
+
+class SlotRing:
+    """numpy views of one worker's shared-memory batch slots"""
+
+    def __init__(self, buffer, slots: int, max_batch: int, max_seq: int, max_labels: int):
+        self.shape = (slots, max_batch, max_seq, max_labels)
+        ids_bytes = slots * max_batch * max_seq * 4
+        lengths_bytes = slots * max_batch * 4
+        self.input_ids = np.ndarray((slots, max_batch, max_seq), dtype=np.int32, buffer=buffer)
+        self.lengths = np.ndarray((slots, max_batch), dtype=np.int32, buffer=buffer, offset=ids_bytes)
+        self.logits = np.ndarray((slots, max_batch, max_labels), dtype=np.float32, buffer=buffer,
+                                 offset=ids_bytes + lengths_bytes)
+
+    @staticmethod
+    def nbytes(slots: int, max_batch: int, max_seq: int, max_labels: int) -> int:
+        return slots * max_batch * (max_seq + 1 + max_labels) * 4
+
+    def release(self):
+        """Drop the views so the shared memory can be closed."""
+        self.input_ids = self.lengths = self.logits = None
+
+
+def _worker_main(index: int, shm_name: str, conn, cores: List[int], model_options: Dict,
+                 ring_shape: Tuple[int, int, int, int]):
+    """Worker process: pin cores, then serve forward passes from the ring."""
+    import importlib
+    from model_registry import warmup_model
+
+    if cores and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, cores)
+    threads = max(1, len(cores))
+    torch.set_num_threads(threads)
+
+    shm = SharedMemory(name=shm_name)
+    ring = SlotRing(shm.buf, *ring_shape)
+    positions = torch.arange(ring_shape[2])
+    models = {}
+    send_lock = threading.Lock()
+    print(f"Inference worker {index} (pid {os.getpid()}) on cores {cores}, {threads} threads")
+
+    def reply(message: bytes):
+        with send_lock:
+            conn.send_bytes(message)
+
+    def load(key: int, spec: Dict):
+        # Runs beside the forward loop, so a deploy does not stall serving
+        try:
+            module_name, class_name = _MODEL_CLASSES[spec["kind"]]
+            model_class = getattr(importlib.import_module(module_name), class_name)
+            model = model_class(model_name=spec["model_name"], revision=spec["revision"],
+                                num_threads=threads, **model_options)
+            model.load_model()
+            warmup_model(model)
+            models[key] = model
+            reply(_RESPONSE.pack(b"L", key, 0, len(model.label_map)))
+        except Exception as e:
+            reply(_RESPONSE.pack(b"L", key, 1, 0) + str(e).encode("utf-8"))
+
+    while True:
+        try:
+            message = conn.recv_bytes()
+        except (EOFError, OSError):
+            break
+        kind, slot, key, batch, seq_len = _REQUEST.unpack_from(message)
+
+        if kind == b"Q":
+            break
+
+        if kind == b"F":
+            try:
+                if key not in models:
+                    raise KeyError(f"model {key} is not loaded in this worker")
+                input_ids = torch.from_numpy(ring.input_ids[slot, :batch, :seq_len]).long()
+                lengths = torch.from_numpy(ring.lengths[slot, :batch]).long()
+                attention_mask = (positions[:seq_len][None, :] < lengths[:, None]).long()
+                logits = models[key].forward_logits(
+                    {"input_ids": input_ids, "attention_mask": attention_mask}
+                ).float().cpu().numpy()
+                if logits.shape[1] > ring_shape[3]:
+                    raise ValueError(f"{logits.shape[1]} labels exceed SLOT_MAX_LABELS")
+                ring.logits[slot, :batch, :logits.shape[1]] = logits
+                reply(_RESPONSE.pack(b"F", slot, 0, logits.shape[1]))
+            except Exception as e:
+                reply(_RESPONSE.pack(b"F", slot, 1, 0) + str(e).encode("utf-8"))
+
+        elif kind == b"L":
+            spec = json.loads(message[_REQUEST.size:].decode("utf-8"))
+            threading.Thread(target=load, args=(key, spec), name=f"load-{key}", daemon=True).start()
+
+        elif kind == b"U":
+            models.pop(key, None)
+
+    ring.release()
+    shm.close()
+
+
+class _WorkerHandle:
+    """Parent-side state of one worker: process, pipe, ring and waiters"""
+
+    def __init__(self, index: int, cores: List[int], ring_shape: Tuple[int, int, int, int]):
+        self.index = index
+        self.cores = cores
+        self.shm = SharedMemory(create=True, size=SlotRing.nbytes(*ring_shape))
+        self.ring = SlotRing(self.shm.buf, *ring_shape)
+        self.slots = ring_shape[0]
+        self.free_slots = queue.Queue()
+        # Slots of timed-out passes the worker may still write
+        self.quarantined: Set[int] = set()
+        # Bumped per worker process, so slots of a dead one are not returned
+        self.generation = 0
+
+        self.process = None
+        self.conn = None
+        self.alive = False
+        # Alive and holding every model the pool serves
+        self.ready = False
+        self.stopping = False
+        self.on_exit = None
+        self._send_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self._pending: Dict[int, Future] = {}
+        self._loads: Dict[int, Future] = {}
+        self._reader = None
+
+        self.batches = 0
+        self.rows = 0
+        self.total_time = 0.0
+        self.timeouts = 0
+        self.restarts = 0
+
+    def start(self, ctx, model_options: Dict, ring_shape):
+        """Start a worker process on this ring, with every slot free."""
+        with self._lock:
+            self.generation += 1
+            self.quarantined.clear()
+            self.free_slots = queue.Queue()
+            for slot in range(self.slots):
+                self.free_slots.put(slot)
+        if self.conn is not None:
+            self.conn.close()
+
+        self.conn, child_conn = ctx.Pipe(duplex=True)
+        self.process = ctx.Process(
+            target=_worker_main,
+            args=(self.index, self.shm.name, child_conn, self.cores, model_options, ring_shape),
+            name=f"inference-worker-{self.index}",
+            daemon=True
+        )
+        self.process.start()
+        child_conn.close()
+        self.alive = True
+        self._reader = threading.Thread(target=self._read_responses, args=(self.conn,),
+                                        name=f"inference-reader-{self.index}", daemon=True)
+        self._reader.start()
+
+    def send(self, header: bytes, waiters: Optional[Dict[int, Future]] = None, ident: int = 0) -> Optional[Future]:
+        if not self.alive:
+            raise RuntimeError(f"Inference worker {self.index} is not running")
+        future = None
+        if waiters is not None:
+            future = Future()
+            with self._lock:
+                waiters[ident] = future
+        with self._send_lock:
+            self.conn.send_bytes(header)
+        return future
+
+    def _read_responses(self, conn):
+        while True:
+            try:
+                message = conn.recv_bytes()
+            except (EOFError, OSError):
+                break
+            kind, ident, status, num_labels = _RESPONSE.unpack_from(message)
+            error = message[_RESPONSE.size:].decode("utf-8", "replace")
+            with self._lock:
+                future = (self._pending if kind == b"F" else self._loads).pop(ident, None)
+                if future is None and kind == b"F" and ident in self.quarantined:
+                    # Late answer of a timed-out pass: the worker is done with the slot
+                    self.quarantined.discard(ident)
+                    self.free_slots.put(ident)
+            if future is not None:
+                future.set_result((status, num_labels, error))
+
+        self.alive = False
+        self.ready = False
+        with self._lock:
+            waiting = list(self._pending.values()) + list(self._loads.values())
+            self._pending.clear()
+            self._loads.clear()
+        for future in waiting:
+            future.set_exception(RuntimeError(f"Inference worker {self.index} exited"))
+        if not self.stopping and self.on_exit is not None:
+            self.on_exit(self)
+
+    def _release_slot(self, slot: int, generation: int, quarantine: bool = False):
+        """Return a slot to the ring (or quarantine it) unless its worker has been replaced."""
+        with self._lock:
+            if generation != self.generation:
+                return
+            if quarantine:
+                self.quarantined.add(slot)
+            else:
+                self.free_slots.put(slot)
+
+    def forward(self, key: int, input_ids: np.ndarray, lengths: np.ndarray) -> np.ndarray:
+        """
+        One chunk (at most SLOT_MAX_BATCH rows) through this worker's ring.
+
+        Raises:
+            ExecutorSaturated: No slot freed up within SLOT_WAIT_TIMEOUT
+        """
+        batch, seq_len = input_ids.shape
+        with self._lock:
+            free_slots, generation = self.free_slots, self.generation
+        try:
+            slot = free_slots.get(timeout=SLOT_WAIT_TIMEOUT)
+        except queue.Empty:
+            raise ExecutorSaturated(f"Inference worker {self.index}: no free slot "
+                                    f"after {SLOT_WAIT_TIMEOUT}s") from None
+        started = time.perf_counter()
+        try:
+            self.ring.input_ids[slot, :batch, :seq_len] = input_ids
+            self.ring.lengths[slot, :batch] = lengths
+            future = self.send(_REQUEST.pack(b"F", slot, key, batch, seq_len), self._pending, slot)
+            status, num_labels, error = future.result(timeout=FORWARD_TIMEOUT)
+        except BaseException:
+            with self._lock:
+                sent = self._pending.pop(slot, None) is not None
+                if sent:
+                    self.timeouts += 1
+            # A pass that was sent may still write the slot: quarantine it
+            # until its answer arrives (or the worker is replaced)
+            self._release_slot(slot, generation, quarantine=sent)
+            raise
+
+        try:
+            if status:
+                raise RuntimeError(f"Inference worker {self.index}: {error}")
+            logits = self.ring.logits[slot, :batch, :num_labels].copy()
+        finally:
+            self._release_slot(slot, generation)
+
+        with self._lock:
+            self.batches += 1
+            self.rows += batch
+            self.total_time += time.perf_counter() - started
+        return logits
+
+    def metrics(self) -> Dict:
+        with self._lock:
+            return {
+                'pid': self.process.pid if self.process else None,
+                'cores': self.cores,
+                'alive': self.alive,
+                'ready': self.ready,
+                'free_slots': self.free_slots.qsize(),
+                'quarantined_slots': len(self.quarantined),
+                'timeouts': self.timeouts,
+                'restarts': self.restarts,
+                'batches': self.batches,
+                'rows': self.rows,
+                'avg_batch_ms': round(1000 * self.total_time / self.batches, 2) if self.batches else 0.0
+            }
+
+    def stop(self):
+        self.stopping = True
+        self.ready = False
+        if self.alive:
+            try:
+                with self._send_lock:
+                    self.conn.send_bytes(_REQUEST.pack(b"Q", 0, 0, 0, 0))
+            except OSError:
+                pass
+        if self.process is not None:
+            self.process.join(SHUTDOWN_TIMEOUT)
+            if self.process.is_alive():
+                self.process.terminate()
+        if self.conn is not None:
+            self.conn.close()
+        self.ring.release()
+        self.shm.close()
+        self.shm.unlink()
+
+
+class PooledModel:
+    """Handle of one model loaded in every pool worker (a model's forward backend)"""
+
+    def __init__(self, pool: "InferencePool", key: int, num_labels: int):
+        self.pool = pool
+        self.key = key
+        self.num_labels = num_labels
+
+    def logits(self, inputs) -> torch.Tensor:
+        return self.pool.forward(self.key, inputs)
+
+    def release(self):
+        self.pool.unload(self.key)
+
+
+class InferencePool:
+    """Core-pinned inference processes fed through shared-memory slot rings"""
+
+    def __init__(self, workers: int, cores_per_worker: Optional[int] = None,
+                 model_options: Optional[Dict] = None, ring_slots: int = RING_SLOTS,
+                 max_seq: int = MODEL_MAX_LENGTH):
+        """
+        Args:
+            workers: Worker processes
+            cores_per_worker: Cores pinned per worker (default: the usable
+                cores split evenly)
+            model_options: Extra ModelManager / FactualityClassifier
+                arguments used inside the workers (backend, quantize)
+            ring_slots: Batches in flight per worker
+            max_seq: Longest tokenized sequence a slot holds
+        """
+        self.workers = workers
+        self.model_options = model_options or {}
+        self.ring_shape = (ring_slots, SLOT_MAX_BATCH, max_seq, SLOT_MAX_LABELS)
+
+        available = sorted(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else \
+            list(range(os.cpu_count() or 1))
+        per_worker = cores_per_worker or max(1, len(available) // workers)
+        self.core_sets = [
+            [available[(i * per_worker + j) % len(available)] for j in range(per_worker)]
+            for i in range(workers)
+        ]
+
+        self._handles: List[_WorkerHandle] = []
+        self._keys = itertools.count(1)
+        self._next = itertools.count()
+        self._ctx = None
+        # key -> load request of every model the workers serve (replayed on restart)
+        self._models: Dict[int, bytes] = {}
+        self._models_lock = threading.Lock()
+        self.started = False
+
+    def start(self):
+        """Spawn the workers (spawn context: no inherited torch state)."""
+        self._ctx = get_context("spawn")
+        for index, cores in enumerate(self.core_sets):
+            handle = _WorkerHandle(index, cores, self.ring_shape)
+            handle.on_exit = self._restart_later
+            handle.start(self._ctx, self.model_options, self.ring_shape)
+            handle.ready = True
+            self._handles.append(handle)
+        self.started = True
+        print(f"Inference pool started: {self.workers} workers, cores {self.core_sets}")
+
+    def load_model(self, kind: str, model_name: str, revision: Optional[str] = None) -> PooledModel:
+        """
+        Load a model version in every worker (in parallel) and warm it up.
+
+        Args:
+            kind: "category" (ModelManager) or "factuality" (FactualityClassifier)
+        """
+        if kind not in _MODEL_CLASSES:
+            raise ValueError(f"Unknown model kind: {kind}")
+        key = next(self._keys)
+        spec = json.dumps({"kind": kind, "model_name": model_name, "revision": revision}).encode("utf-8")
+        header = _REQUEST.pack(b"L", 0, key, 0, 0) + spec
+
+        futures = [handle.send(header, handle._loads, key) for handle in self._handles]
+        labels = set()
+        for handle, future in zip(self._handles, futures):
+            status, num_labels, error = future.result(timeout=LOAD_TIMEOUT)
+            if status:
+                self.unload(key)
+                raise RuntimeError(f"Inference worker {handle.index} could not load {model_name}: {error}")
+            labels.add(num_labels)
+        with self._models_lock:
+            self._models[key] = header
+        return PooledModel(self, key, labels.pop())
+
+    def unload(self, key: int):
+        with self._models_lock:
+            self._models.pop(key, None)
+        for handle in self._handles:
+            if handle.alive:
+                try:
+                    handle.send(_REQUEST.pack(b"U", 0, key, 0, 0))
+                except (OSError, RuntimeError):
+                    pass
+
+    def _restart_later(self, handle: _WorkerHandle):
+        """Called by a handle's reader when its worker exits."""
+        if self.started:
+            threading.Thread(target=self._restart, args=(handle,), name=f"inference-restart-{handle.index}",
+                             daemon=True).start()
+
+    def _restart(self, handle: _WorkerHandle):
+        """Replace an exited worker and reload the pool's models before it serves."""
+        time.sleep(RESTART_BACKOFF)
+        if not self.started or handle.stopping:
+            return
+        code = handle.process.exitcode if handle.process is not None else None
+        print(f"Inference worker {handle.index} exited (code {code}), restarting...")
+        if handle.process is not None:
+            handle.process.join(SHUTDOWN_TIMEOUT)
+        handle.restarts += 1
+        handle.start(self._ctx, self.model_options, self.ring_shape)
+
+        with self._models_lock:
+            models = dict(self._models)
+        try:
+            futures = [(key, handle.send(header, handle._loads, key)) for key, header in models.items()]
+            for key, future in futures:
+                status, _, error = future.result(timeout=LOAD_TIMEOUT)
+                if status:
+                    raise RuntimeError(f"model {key}: {error}")
+        except Exception as e:
+            # Exiting triggers another restart attempt
+            print(f"Inference worker {handle.index} could not reload its models: {e}")
+            handle.process.terminate()
+            return
+        handle.ready = True
+        print(f"Inference worker {handle.index} restarted with {len(models)} models")
+
+    def forward(self, key: int, inputs) -> torch.Tensor:
+        """
+        Logits for a right-padded tokenized batch, computed by the workers.
+
+        Batches larger than a slot are split across workers.
+        """
+        input_ids = inputs["input_ids"].cpu().numpy()
+        lengths = inputs["attention_mask"].sum(dim=1).cpu().numpy()
+        if input_ids.shape[1] > self.ring_shape[2]:
+            raise ValueError(f"Sequence length {input_ids.shape[1]} exceeds the pool's {self.ring_shape[2]}")
+
+        chunks = [(start, min(start + SLOT_MAX_BATCH, len(input_ids)))
+                  for start in range(0, len(input_ids), SLOT_MAX_BATCH)]
+        if len(chunks) == 1:
+            return torch.from_numpy(self._pick().forward(key, input_ids, lengths))
+
+        results = [None] * len(chunks)
+        errors = []
+
+        def run(i, start, end):
+            try:
+                results[i] = self._pick().forward(key, input_ids[start:end], lengths[start:end])
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=run, args=(i, start, end)) for i, (start, end) in enumerate(chunks)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        if errors:
+            raise errors[0]
+        return torch.from_numpy(np.concatenate(results))
+
+    def _pick(self) -> _WorkerHandle:
+        """Live worker with the most free slots (round robin among ties)."""
+        alive = [handle for handle in self._handles if handle.ready]
+        if not alive:
+            raise RuntimeError("No inference pool workers are running")
+        offset = next(self._next)
+        rotated = alive[offset % len(alive):] + alive[:offset % len(alive)]
+        return max(rotated, key=lambda handle: handle.free_slots.qsize())
+
+    def metrics(self) -> Dict:
+        return {
+            'workers': [handle.metrics() for handle in self._handles],
+            'ring_slots': self.ring_shape[0],
+            'slot_max_batch': self.ring_shape[1]
+        }
+
+    def shutdown(self):
+        self.started = False
+        for handle in self._handles:
+            handle.stop()
+        self._handles = []
+        self.started = False
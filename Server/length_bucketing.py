@@ -0,0 +1,88 @@
+"""
+length_bucketing.py
+
+Length-bucketed batch inference for the XLM-R classifiers.
+
+Padding every batch to its longest member (and allowing up to 512 tokens)
+spends most of an offline re-classification run multiplying padding.
+Here texts are tokenized once without padding and truncated to a
+tweet-sized TWEET_MAX_LENGTH, sorted by token count and cut into batches of
+similar length, so each batch is padded only to its own longest member.
+Probabilities are written back in the callers' original order.
+
+The cap only applies to these offline runs. Live classification (the
+models' tokenize(), the inference pool's slots) keeps the models' own
+MODEL_MAX_LENGTH, so a long Urdu / English tweet is classified on all of
+its tokens exactly as before.
+"""
+
+from typing import Callable, Dict, List, Optional, Sequence
+
+import torch
+
+# A 280-character tweet is well under this many XLM-R tokens, Urdu included
+# (offline bucketed runs only)
+TWEET_MAX_LENGTH = 128
+
+# XLM-R's position limit; live single-tweet / micro-batched inference
+MODEL_MAX_LENGTH = 512
+
+# Texts per bucket for offline runs
+BUCKET_BATCH_SIZE = 32
+
+
+def length_buckets(lengths: Sequence[int], batch_size: int = BUCKET_BATCH_SIZE) -> List[List[int]]:
+    """Indices grouped into batches of similar length (shortest first)."""
+    order = sorted(range(len(lengths)), key=lengths.__getitem__)
+    return [order[i:i + batch_size] for i in range(0, len(order), batch_size)]
+
+
+def bucketed_probabilities(tokenizer, forward_logits: Callable, texts: Sequence[str],
+                           batch_size: int = BUCKET_BATCH_SIZE,
+                           max_length: int = TWEET_MAX_LENGTH,
+                           stats: Optional[Dict] = None) -> torch.Tensor:
+    """
+    Softmax probabilities for every text, computed bucket by bucket.
+
+    Args:
+        tokenizer: Fast tokenizer of the model
+        forward_logits: Model function mapping padded inputs to logits
+        texts: Texts to classify
+        batch_size: Texts per forward pass
+        max_length: Truncation length in tokens
+        stats: Optional dict that receives token / padding / truncation counts
+
+    Returns:
+        Float tensor of shape (len(texts), num_labels) in input order
+    """
+    texts = list(texts)
+    if not texts:
+        return torch.empty((0, 0))
+
+    encoded = tokenizer(texts, truncation=True, max_length=max_length)
+    input_ids = encoded["input_ids"]
+    attention_mask = encoded["attention_mask"]
+    lengths = [len(ids) for ids in input_ids]
+
+    probs = None
+    padded_tokens = 0
+    for bucket in length_buckets(lengths, batch_size):
+        inputs = tokenizer.pad(
+            [{"input_ids": input_ids[i], "attention_mask": attention_mask[i]} for i in bucket],
+            return_tensors="pt"
+        )
+        padded_tokens += inputs["input_ids"].numel()
+
+        bucket_probs = torch.softmax(forward_logits(inputs).float(), dim=1).cpu()
+        if probs is None:
+            probs = torch.empty((len(texts), bucket_probs.shape[1]))
+        probs[torch.tensor(bucket)] = bucket_probs
+
+    if stats is not None:
+        stats.update({
+            'texts': len(texts),
+            'tokens': sum(lengths),
+            'padded_tokens': padded_tokens,
+            'truncated': sum(1 for length in lengths if length >= max_length)
+        })
+    return probs
@@ -1,14 +1,16 @@
 # main.py
 import time
 import json
+import asyncio
 from fastapi import FastAPI, Request, Depends, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from sqlalchemy.orm import Session
 from sqlalchemy.exc import SQLAlchemyError
 from datetime import datetime
 from urllib.parse import urlparse
-from simhash import TweetMatchingSystem
-from database import engine, get_db, Base
+from simhash import TweetMatchingSystem, set_matching_system
+from semantic_index import SemanticMatcher, SEMANTIC_REUSE_THRESHOLD
+from database import engine, get_db, SessionLocal, Base
 from models import (
     User,
     ApprovalStatus,
@@ -21,10 +23,27 @@ from filters import validate_tweet
 from admin.admin_routes import router as admin_router
 from member.member_routes import router as member_router
 
-from normalize import normalize_tweet
+from normalize import normalize_tweet, claim_mismatch
 from xlmmodel import ModelManager
 from factualmodel import FactualityClassifier
-from crossverify import cross_verify
+from crossverify import cross_verify, search_quota
+from http_client import http_clients
+from search_cache import search_cache
+from executors import (
+    BoundedExecutor,
+    INFERENCE_QUEUE_SIZE,
+    inference_executor,
+    verify_executor,
+    executor_metrics,
+    register_executor,
+    shutdown_executors,
+    ExecutorSaturated
+)
+from batching import MicroBatcher
+from classifier_pipeline import TweetClassifierPipeline
+from cascade import CascadeClassifier, PredictionLog
+from model_registry import ModelRegistry
+from inference_pool import InferencePool
 
 
 # -------------------------------------------------------------------
@@ -32,6 +51,9 @@ from crossverify import cross_verify
 # -------------------------------------------------------------------
 Base.metadata.create_all(bind=engine)
 
+# create_all() does not add columns to existing tables; columns the SimHash
+# index sync relies on are added by `python migrations.py` at deploy time
+
 app = FastAPI(title="TweetPlug Verification Backend", version="2.1")
 
 # -------------------------------------------------------------------
@@ -47,8 +69,83 @@ app.add_middleware(
 # -------------------------------------------------------------------
 # MODEL INITIALIZATION
 # -------------------------------------------------------------------
-model_manager = ModelManager()
-factuality_model = FactualityClassifier()
+# "onnx" serves both classifiers through ONNX Runtime on CPU (exported on
+# first start, see onnx_backend.py). MODEL_QUANTIZE selects int8 weights on
+# CPU for either backend (torch: quantization.py). None = torch defaults.
+MODEL_BACKEND = "torch"
+MODEL_QUANTIZE = False
+TORCH_THREADS = None
+TORCH_INTEROP_THREADS = None
+
+MODEL_OPTIONS = {
+    "backend": MODEL_BACKEND,
+    "quantize": MODEL_QUANTIZE,
+    "num_threads": TORCH_THREADS,
+    "num_interop_threads": TORCH_INTEROP_THREADS
+}
+
+# Forward passes in this many core-pinned worker processes, each with its
+# own copy of both models (see inference_pool.py). 0 = in-process threads.
+INFERENCE_POOL_WORKERS = 0
+
+inference_pool = None
+if INFERENCE_POOL_WORKERS:
+    inference_pool = InferencePool(
+        INFERENCE_POOL_WORKERS,
+        model_options={"backend": MODEL_BACKEND, "quantize": MODEL_QUANTIZE}
+    )
+    MODEL_OPTIONS = {"backend": "pool", "inference_pool": inference_pool}
+
+model_manager = ModelManager(**MODEL_OPTIONS)
+factuality_model = FactualityClassifier(**MODEL_OPTIONS)
+
+# Both models read one tokenization of the tweet; "others" is rejected
+# before the factuality check, so that model skips it. Confident easy cases
+# are answered by the cheap cascade (train it with `python cascade.py` once
+# predictions.jsonl has data; thresholds are in cascade.py). The registry
+# below serves copies of this pipeline built around its active models.
+classifier_pipeline = TweetClassifierPipeline(
+    model_manager,
+    factuality_model,
+    skip_factuality_for=[class_id for class_id, label in model_manager.label_map.items() if label == 'others'],
+    cascade=CascadeClassifier.load(),
+    prediction_log=PredictionLog()
+)
+
+# Versioned models behind the pipeline. Editing model_versions.json loads,
+# warms up and swaps in new versions without a restart (see model_registry.py).
+model_registry = ModelRegistry(
+    factories={
+        "category": lambda **kwargs: ModelManager(**MODEL_OPTIONS, **kwargs),
+        "factuality": lambda **kwargs: FactualityClassifier(**MODEL_OPTIONS, **kwargs)
+    },
+    build_pipeline=lambda models: classifier_pipeline.with_models(models["category"], models["factuality"])
+)
+
+# Seconds between checks of the model manifest
+MODEL_MANIFEST_INTERVAL = 30
+
+# Concurrent requests share padded forward passes (see batching.py). With the
+# process pool, enough batches are kept in flight to keep every worker busy.
+if inference_pool is not None:
+    classifier_executor = register_executor(
+        BoundedExecutor("classifier", 2 * INFERENCE_POOL_WORKERS, INFERENCE_QUEUE_SIZE)
+    )
+else:
+    classifier_executor = inference_executor
+classifier_batcher = MicroBatcher("classifier", model_registry.classify_batch, classifier_executor)
+
+# SimHash matcher over verified tweets - built once here and then kept
+# current incrementally (see VotingSystem.update_verification_result).
+# Full builds hash in-process: a process pool per server worker would
+# multiply interpreters by cores (`python simhash.py --build` builds the
+# snapshot offline on every core). Tweets SimHash misses are checked for
+# paraphrases of verified claims with sentence embeddings.
+semantic_matcher = SemanticMatcher()
+matching_system = TweetMatchingSystem(
+    session_factory=SessionLocal,
+    semantic_matcher=semantic_matcher
+)
 
 # Print to verify crossverify module loaded
 
@@ -56,14 +153,211 @@ factuality_model = FactualityClassifier()
 @app.on_event("startup")
 async def load_models_on_startup():
     print("="*60)
-    print("Loading classification and factuality models...")
-    model_manager.load_model()
-    factuality_model.load_model()
+    if inference_pool is not None and not inference_pool.started:
+        await asyncio.to_thread(inference_pool.start)
+    if model_registry.loaded:
+        # Forked from a prefork.py master: the weights are shared, but the
+        # warmup allocations belong to each worker
+        print("Models preloaded by the master process, warming up...")
+        await asyncio.to_thread(model_registry.warmup)
+    else:
+        print("Loading classification and factuality models...")
+        # Both models load (from model_artifacts/ when present) and warm up in
+        # parallel; the server reports ready only after the warmup passes
+        await asyncio.to_thread(model_registry.load, {"category": model_manager, "factuality": factuality_model})
     print("Classification and factuality models loaded.\n")
     print("="*60)
+    # A prefork.py master applies the manifest itself and restarts its
+    # workers, so they share the new weights instead of loading N copies
+    if not getattr(app.state, "prefork_worker", False):
+        app.state.model_manifest_task = asyncio.create_task(watch_model_manifest())
     # Load cross-verification models
   
 
+# Seconds between incremental index syncs from the database
+INDEX_SYNC_INTERVAL = 60
+
+
+@app.on_event("startup")
+async def load_matcher_on_startup():
+    print("="*60)
+    print("Loading SimHash index of verified tweets...")
+    # Loads the last snapshot and catches up from its watermark, or builds
+    # from the database if there is no snapshot yet (skipped when preloaded)
+    if not matching_system.initialized:
+        await asyncio.to_thread(matching_system.initialize, False)
+    app.state.matching_system = matching_system
+    set_matching_system(matching_system)
+    app.state.index_sync_task = asyncio.create_task(sync_index_periodically())
+    # Embedding the corpus the first time takes a while; serve meanwhile
+    if semantic_matcher.model is None:
+        app.state.semantic_load_task = asyncio.create_task(load_semantic_index())
+    print("="*60)
+
+
+def preload_for_fork():
+    """
+    Load everything workers can share, in a pre-fork master (prefork.py).
+
+    Model warmup is left to the workers (their allocator state is not
+    shared anyway); prefork.py keeps torch single-threaded while this runs.
+    """
+    if inference_pool is not None:
+        raise RuntimeError("Pre-fork serving shares in-process models; set INFERENCE_POOL_WORKERS = 0")
+    model_registry.load({"category": model_manager, "factuality": factuality_model}, warmup=False)
+    matching_system.initialize(force_reload=False)
+    try:
+        semantic_matcher.load_model()
+        matching_system.sync_semantic_index()
+    except Exception as e:
+        print(f"Semantic index load error: {e}")
+
+
+async def load_semantic_index():
+    """Load the embedding model and embed tweets the saved vectors lack."""
+    try:
+        await asyncio.to_thread(semantic_matcher.load_model)
+        await asyncio.to_thread(matching_system.sync_semantic_index)
+    except Exception as e:
+        print(f"Semantic index load error: {e}")
+
+
+async def watch_model_manifest():
+    """Deploy model versions named in the manifest, off the event loop."""
+    while True:
+        await asyncio.sleep(MODEL_MANIFEST_INTERVAL)
+        try:
+            await asyncio.to_thread(model_registry.apply_manifest)
+        except Exception as e:
+            print(f"Model manifest error: {e}")
+
+
+async def sync_index_periodically():
+    """Pull verification changes into the matcher without blocking requests."""
+    while True:
+        await asyncio.sleep(INDEX_SYNC_INTERVAL)
+        try:
+            await asyncio.to_thread(matching_system.refresh_index)
+        except Exception as e:
+            print(f"Index sync error: {e}")
+
+
+@app.on_event("shutdown")
+async def stop_index_sync():
+    for name in ("index_sync_task", "semantic_load_task", "model_manifest_task"):
+        task = getattr(app.state, name, None)
+        if task:
+            task.cancel()
+    await classifier_batcher.stop()
+    await http_clients.aclose()
+    search_cache.close()
+    shutdown_executors()
+    if inference_pool is not None:
+        inference_pool.shutdown()
+
+
+@app.get("/metrics/executors")
+async def get_executor_metrics():
+    """Queue depth, throughput and latency of the blocking-work pools."""
+    return executor_metrics()
+
+
+@app.get("/metrics/http")
+async def get_http_metrics():
+    """Request counts, errors and latency of the remote NER / NLI / search calls, search quota and cache."""
+    return {
+        **http_clients.metrics(),
+        "search_quota": search_quota.get_statistics(),
+        "search_cache": search_cache.get_statistics()
+    }
+
+
+@app.get("/metrics/batching")
+async def get_batching_metrics():
+    """Batch sizes and forward-pass times of the model micro-batchers."""
+    return {
+        "classifier": classifier_batcher.metrics()
+    }
+
+
+@app.get("/metrics/inference-pool")
+async def get_inference_pool_metrics():
+    """Per-worker load of the multi-process inference tier."""
+    if inference_pool is None:
+        return {"enabled": False}
+    return {"enabled": True, **inference_pool.metrics()}
+
+
+@app.get("/metrics/models")
+async def get_model_versions():
+    """Active, deploying and draining version of each classifier model."""
+    return model_registry.status()
+
+
+@app.get("/metrics/cascade")
+async def get_cascade_metrics():
+    """Share of tweets the cheap cascade answered and its audited agreement."""
+    if classifier_pipeline.cascade is None:
+        return {"enabled": False}
+    return {"enabled": True, **classifier_pipeline.cascade.get_statistics()}
+
+
+
+# -------------------------------------------------------------------
+# DATABASE WRITES (blocking; run on the verify executor)
+# -------------------------------------------------------------------
+def save_pending_tweet(db: Session, normalized_tweet: str) -> int:
+    """Store an incoming tweet before verification. Returns its tweet_id."""
+    new_tweet = Tweet(
+        user_id=1,
+        tweet_text=normalized_tweet,
+        verification_status=VerificationStatus.pending
+    )
+    db.add(new_tweet)
+    db.commit()
+    db.refresh(new_tweet)
+    return new_tweet.tweet_id
+
+
+def save_verification_result(db: Session, tweet_id: int, verification_report: dict, factual_label: str):
+    """Store a cross-verification report and its evidence sources."""
+    verif_result = VerificationResult(
+        tweet_id=tweet_id,
+        status="completed",
+        confidence=str(verification_report.get("confidence_score", "")),
+        verdict=verification_report.get("verdict", "Unverified"),
+        factuality=factual_label
+    )
+    db.add(verif_result)
+    db.commit()
+    db.refresh(verif_result)
+
+    # Save sources from verification report
+    for src in verification_report.get("sources", []):
+        # Extract domain (new simplified pipeline returns 'domain')
+        source_name = src.get("domain", "")
+        url = src.get("url", "")
+
+        # The simplified pipeline returns 'evidence_sentence' instead of 'snippet'
+        snippet = src.get("evidence_sentence", "")
+
+        # Similarity is directly available
+        similarity = str(src.get("similarity", ""))
+
+        src_entry = VerificationSource(
+            verification_id=verif_result.id,
+            source=source_name,
+            url=url,
+            snippet=snippet,
+            similarity=similarity
+        )
+        db.add(src_entry)
+    db.commit()
+
+    # Update tweet status
+    # new_tweet.verification_status = VerificationStatus.verified
+    db.commit()
+
 
 # -------------------------------------------------------------------
 # MAIN ENDPOINT — RECEIVE & VERIFY TWEET
@@ -115,17 +409,12 @@ async def classify_tweet_endpoint(request: Request, db: Session = Depends(get_db
 
         # ------------------- CATEGORY CLASSIFICATION -------------------
         print("Running classifier...")
-        predicted_class_id = model_manager.predict(normalized_tweet)
-        label_map = {
-            0: 'cricket',
-            1: 'economy',
-            2: 'international_relations',
-            3: 'others',
-            4: 'politics'
-        }
-        predicted_label = label_map.get(predicted_class_id, "unknown")
+        classification = await classifier_batcher.submit(normalized_tweet)
+        predicted_class_id = classification["class_id"]
+        predicted_label = model_registry.model("category").label_map.get(predicted_class_id, "unknown")
 
-        print(f"Predicted Category: {predicted_label.upper()} (ID: {predicted_class_id})")
+        print(f"Predicted Category: {predicted_label.upper()} (ID: {predicted_class_id}, "
+              f"by {classification['source'].get('category')})")
         print("=" * 80 + "\n")
 
         if predicted_label == "others":
@@ -138,7 +427,8 @@ async def classify_tweet_endpoint(request: Request, db: Session = Depends(get_db
 
         # ------------------- FACTUALITY CHECK -------------------
         print("Running factuality check...")
-        factuality_result = factuality_model.predict(normalized_tweet, return_probs=True)
+        # Computed in the same batch as the category, from the same tokens
+        factuality_result = classification["factuality"]
 
         factual_label = str(factuality_result.get("prediction", "")).strip()
         probs = factuality_result.get("probabilities", {}) or {}
@@ -166,25 +456,28 @@ async def classify_tweet_endpoint(request: Request, db: Session = Depends(get_db
             }
 
 
-            # Initialize system
-        matching_system = TweetMatchingSystem(db_session=db)
-        matching_system.initialize()
-
-        # Perform matching
-        results = matching_system.match_tweet(normalized_tweet)
+        # ------------------- SIMHASH MATCHING -------------------
+        # Off the event loop: the matcher lock is held while index updates apply
+        results = await inference_executor.run(request.app.state.matching_system.match_tweet, normalized_tweet)
         print(f"Matching results: {results}")
 
         # Check if there are any matches
         if results and results.get("matches") and len(results["matches"]) > 0:
-            # Get the best match (first match)
+            # Get the best match (first match); scores are 0-1, reported in %
             matched = results["matches"][0]
-            similarity = float(matched.get("similarity_score", 0))
+            similarity = float(matched.get("similarity_score", 0)) * 100
+            matched_text = await inference_executor.run(
+                request.app.state.matching_system.get_tweet_text, matched.get("matched_tweet_id")
+            ) or matched.get("matched_tweet_text", "")
+            # SimHash drops stopwords such as "not"; never reuse a verdict across them
+            mismatch = claim_mismatch(normalized_tweet, matched_text)
             
             # Check if similarity is greater than or equal to 90%
-            if similarity >= 90.0:
+            if mismatch:
+                print(f"SimHash match {matched.get('matched_tweet_id')} rejected: {mismatch}. Continuing...")
+            elif similarity >= 90.0:
                 # ✅ Similarity >= 90% - Return matched result
                 verdict = (matched.get("verdict", "unverified")).strip().lower()
-                matched_text = matched.get("matched_tweet_text", "")
                 
                 return {
                     "status": "ok",
@@ -205,6 +498,45 @@ async def classify_tweet_endpoint(request: Request, db: Session = Depends(get_db
         else:
             print("No matches found. Continuing...")
 
+        # ------------------- SEMANTIC (PARAPHRASE) MATCHING -------------------
+        semantic_results = await inference_executor.run(
+            request.app.state.matching_system.match_tweet_semantic, normalized_tweet
+        )
+        if semantic_results.get("matches"):
+            matched = semantic_results["matches"][0]
+            similarity = float(matched.get("similarity_score", 0))
+            verdict = (matched.get("verdict") or "unverified").strip().lower()
+            # Embeddings barely separate "X happened" from "X did not happen"
+            mismatch = claim_mismatch(normalized_tweet, matched.get("matched_tweet_text", ""))
+
+            if mismatch:
+                print(f"Paraphrase candidate {matched.get('matched_tweet_id')} (cosine {similarity:.3f}) "
+                      f"rejected: {mismatch}. Continuing...")
+            elif similarity < SEMANTIC_REUSE_THRESHOLD:
+                print(f"Paraphrase candidate {matched.get('matched_tweet_id')} (cosine {similarity:.3f}) "
+                      f"is borderline, verifying in full. Continuing...")
+            else:
+                print(f"Paraphrase of verified tweet {matched.get('matched_tweet_id')} "
+                      f"(cosine {similarity:.3f}) → {verdict}")
+
+                return {
+                    "status": "ok",
+                    "verification": {
+                        "verdict": verdict,
+                        "confidence_score": round(similarity * 100, 2),
+                        "sources": [
+                            {
+                                "tweet_id": matched.get("matched_tweet_id"),
+                                "matched_text": matched.get("matched_tweet_text", ""),
+                                "similarity": similarity,
+                                "match_type": "semantic"
+                            }
+                        ]
+                    }
+                }
+        else:
+            print("No paraphrase of a verified tweet found. Continuing...")
+
         # Continue with other code
         print("Proceeding to other verification methods...")
         # YOUR OTHER CODE GOES HERE
@@ -214,15 +546,7 @@ async def classify_tweet_endpoint(request: Request, db: Session = Depends(get_db
         # ------------------- SAVE TWEET TO DB -------------------
         print("Storing tweet in database before verification...")
         print("=" * 80 + "\n")
-        new_tweet = Tweet(
-            user_id=1,
-            tweet_text=normalized_tweet,
-            verification_status=VerificationStatus.pending
-        )
-        db.add(new_tweet)
-        db.commit()
-        db.refresh(new_tweet)
-        tweet_id = new_tweet.tweet_id
+        tweet_id = await verify_executor.run(save_pending_tweet, db, normalized_tweet)
         print(f"Tweet saved (tweet_id = {tweet_id})")
         print("=" * 80 + "\n")
         
@@ -231,7 +555,9 @@ async def classify_tweet_endpoint(request: Request, db: Session = Depends(get_db
         # ------------------- CROSS VERIFICATION -------------------
 
         print("Running Cross Verification...")
-        verification_report = cross_verify(
+        # Async: remote calls share pooled connections, database steps run on
+        # the verify executor
+        verification_report = await cross_verify(
             tweet_text,
             db,
             author_handle,
@@ -246,42 +572,7 @@ async def classify_tweet_endpoint(request: Request, db: Session = Depends(get_db
 
 
         print("Saving verification results to database...")
-        verif_result = VerificationResult(
-            tweet_id=tweet_id,
-            status="completed",
-            confidence=str(verification_report.get("confidence_score", "")),
-            verdict=verification_report.get("verdict", "Unverified"),
-            factuality=factual_label
-        )
-        db.add(verif_result)
-        db.commit()
-        db.refresh(verif_result)
-
-        # Save sources from verification report
-        for src in verification_report.get("sources", []):
-            # Extract domain (new simplified pipeline returns 'domain')
-            source_name = src.get("domain", "")
-            url = src.get("url", "")
-            
-            # The simplified pipeline returns 'evidence_sentence' instead of 'snippet'
-            snippet = src.get("evidence_sentence", "")
-            
-            # Similarity is directly available
-            similarity = str(src.get("similarity", ""))
-
-            src_entry = VerificationSource(
-                verification_id=verif_result.id,
-                source=source_name,
-                url=url,
-                snippet=snippet,
-                similarity=similarity
-            )
-            db.add(src_entry)
-        db.commit()
-
-        # Update tweet status
-        # new_tweet.verification_status = VerificationStatus.verified
-        db.commit()
+        await verify_executor.run(save_verification_result, db, tweet_id, verification_report, factual_label)
 
         print(f"Verification Complete | {verification_report.get('verdict', '').upper()} | Confidence Score: {verification_report.get('confidence_score', 0)}")
         print("=" * 80 + "\n")
@@ -363,6 +654,9 @@ async def classify_tweet_endpoint(request: Request, db: Session = Depends(get_db
 
         return final_response
     
+    except ExecutorSaturated as e:
+        print(f"Server busy: {e}")
+        raise HTTPException(status_code=503, detail="Server is busy, please retry shortly.")
     except SQLAlchemyError as e:
         print(f"Database Error: {e}")
         db.rollback()
@@ -3,6 +3,7 @@ from sqlalchemy.orm import Session
 from .m_schema import UserCreate, UserResponse, VoteRequest, VoteResponse , VoteSourceRequest ,VoteSourceResponse
 from .member_controller import MemberController
 from database import get_db
+from simhash import get_matching_system
 from pydantic import BaseModel
 from models import Tweet , VerificationStatus , Vote , VerificationResult , VoteSource , User, UserSocialLink
 from typing import Dict ,List
@@ -164,6 +165,17 @@ class VotingSystem:
         
         db.commit()
         
+        # Keep the in-memory SimHash index in step with the new verdict
+        matching_system = get_matching_system()
+        if matching_system is not None:
+            matching_system.apply_verification_update(
+                db,
+                tweet_id,
+                verification_result.status,
+                verification_result.verdict,
+                verification_result.votes_in_favor_percentage
+            )
+        
         return vote_data
 
 
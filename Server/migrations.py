@@ -0,0 +1,42 @@
+# migrations.py
+"""
+Schema changes that create_all() cannot make on an existing database.
+
+Base.metadata.create_all() only creates missing tables, so columns added to
+models.py after a table exists have to be added here. Run once per deploy,
+before starting the server:
+
+    python migrations.py
+"""
+from sqlalchemy import text
+
+from database import engine
+
+
+# Applied in order; every statement must be safe to run again
+MIGRATIONS = [
+    # verification_results.updated_at is the SimHash index sync watermark
+    "ALTER TABLE verification_results ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP DEFAULT now()",
+    "CREATE INDEX IF NOT EXISTS ix_verification_results_updated_at ON verification_results (updated_at)",
+]
+
+
+def run_migrations(bind=engine) -> int:
+    """
+    Apply MIGRATIONS in a single transaction.
+
+    Args:
+        bind: Engine to migrate (defaults to the application database)
+
+    Returns:
+        Number of statements executed
+    """
+    with bind.begin() as conn:
+        for statement in MIGRATIONS:
+            conn.execute(text(statement))
+    return len(MIGRATIONS)
+
+
+if __name__ == "__main__":
+    count = run_migrations()
+    print(f"Applied {count} migration statements")
@@ -0,0 +1,130 @@
+"""
+model_artifacts.py
+
+Local model snapshots, so servers start without touching the Hugging Face hub.
+
+from_pretrained("<hub name>") resolves every file against the hub (or its
+cache) at startup, and older repos ship pytorch_model.bin, which is
+unpickled into freshly allocated memory. An artifact directory holds a
+self-contained copy of one model revision, with weights re-saved as
+model.safetensors:
+
+    MODEL_ARTIFACT_DIR/<model name>[@<revision>]/
+        config.json, model.safetensors, tokenizer files
+
+ModelManager / FactualityClassifier load from it when it exists, with
+local_files_only=True (no network lookups), and transformers memory-maps
+safetensors weights instead of copying them. The sentence-embedding model
+of semantic_index.py is saved the same way, in sentence-transformers'
+layout (modules.json plus the transformer files).
+
+Run this module (on a machine with hub access) to create the artifacts of
+both classifiers and the embedding model, then ship the directory with the
+server:
+
+    python model_artifacts.py [<model name>[@<revision>] ...]
+"""
+
+import os
+import sys
+import time
+from typing import Optional, Sequence, Tuple
+
+MODEL_ARTIFACT_DIR = "model_artifacts"
+WEIGHTS_FILE = "model.safetensors"
+
+# Files that make an artifact directory complete
+CLASSIFIER_FILES = (WEIGHTS_FILE, "config.json")
+SENTENCE_MODEL_FILES = ("modules.json", "config_sentence_transformers.json")
+
+
+def artifact_path(model_name: str, revision: Optional[str] = None,
+                  artifact_dir: str = MODEL_ARTIFACT_DIR) -> str:
+    """Directory of the local snapshot of a hub model (revision)."""
+    key = model_name if revision is None else f"{model_name}@{revision}"
+    return os.path.join(artifact_dir, key.replace("/", "__"))
+
+
+def resolve_model_source(model_name: str, revision: Optional[str] = None,
+                         artifact_dir: str = MODEL_ARTIFACT_DIR,
+                         required_files: Sequence[str] = CLASSIFIER_FILES) -> Tuple[str, bool]:
+    """
+    Where to load a model from.
+
+    Args:
+        required_files: Files a complete snapshot of this kind of model holds
+
+    Returns:
+        (local artifact directory, True) when a complete snapshot exists,
+        otherwise (hub model name, False)
+    """
+    path = artifact_path(model_name, revision, artifact_dir)
+    if all(os.path.exists(os.path.join(path, name)) for name in required_files):
+        return path, True
+    return model_name, False
+
+
+def export_artifacts(model_name: str, revision: Optional[str] = None, num_labels: Optional[int] = None,
+                     artifact_dir: str = MODEL_ARTIFACT_DIR) -> str:
+    """
+    Download a model revision and save it as a local safetensors snapshot.
+
+    Returns:
+        The artifact directory
+    """
+    from transformers import XLMRobertaForSequenceClassification, XLMRobertaTokenizerFast
+
+    path = artifact_path(model_name, revision, artifact_dir)
+    start_time = time.time()
+
+    kwargs = {"num_labels": num_labels} if num_labels else {}
+    model = XLMRobertaForSequenceClassification.from_pretrained(model_name, revision=revision, **kwargs)
+    tokenizer = XLMRobertaTokenizerFast.from_pretrained(model_name, revision=revision)
+
+    os.makedirs(path, exist_ok=True)
+    model.save_pretrained(path, safe_serialization=True)
+    tokenizer.save_pretrained(path)
+
+    size_mb = os.path.getsize(os.path.join(path, WEIGHTS_FILE)) / 1e6
+    print(f"Saved {model_name}@{revision or 'main'} to {path} ({size_mb:.0f} MB) "
+          f"in {time.time() - start_time:.1f} seconds")
+    return path
+
+
+def export_sentence_artifacts(model_name: str, revision: Optional[str] = None,
+                              artifact_dir: str = MODEL_ARTIFACT_DIR) -> str:
+    """
+    Download a sentence-transformers model and save it as a local snapshot.
+
+    Returns:
+        The artifact directory
+    """
+    from sentence_transformers import SentenceTransformer
+
+    path = artifact_path(model_name, revision, artifact_dir)
+    start_time = time.time()
+
+    model = SentenceTransformer(model_name, revision=revision, device="cpu")
+    os.makedirs(path, exist_ok=True)
+    model.save(path, safe_serialization=True)
+
+    print(f"Saved {model_name}@{revision or 'main'} to {path} in {time.time() - start_time:.1f} seconds")
+    return path
+
+
+if __name__ == "__main__":
+    from xlmmodel import ModelManager
+    from factualmodel import FactualityClassifier
+    from semantic_index import SEMANTIC_MODEL_NAME
+
+    if len(sys.argv) > 1:
+        for spec in sys.argv[1:]:
+            name, _, rev = spec.partition("@")
+            if name == SEMANTIC_MODEL_NAME:
+                export_sentence_artifacts(name, rev or None)
+            else:
+                export_artifacts(name, rev or None)
+    else:
+        export_artifacts(ModelManager().model_name)
+        export_artifacts(FactualityClassifier().model_name, num_labels=2)
+        export_sentence_artifacts(SEMANTIC_MODEL_NAME)
@@ -0,0 +1,407 @@
+"""
+model_registry.py
+
+Versioned, hot-swappable classifier models.
+
+ModelManager and FactualityClassifier used to be loaded once in the
+startup event, so changing either Hugging Face model meant a restart and a
+cold load. ModelRegistry keeps one active ModelVersion per slot
+("category", "factuality") and serves the classifier pipeline built from
+them. A deployment:
+
+    1. loads the new model in a background thread (serving continues)
+    2. warms it up on WARMUP_TEXTS at the common padded shapes, so the
+       first real batches do not pay one-off allocation / kernel setup
+    3. builds a new pipeline around it and swaps it in under a lock
+    4. drains the old version: batches that leased it before the swap
+       finish on it, then it is retired and its weights released. If
+       the drain times out, the version is retired anyway and its weights
+       are released when the last of those batches ends.
+
+Deployments are driven by MODEL_MANIFEST_FILE, which main.py polls:
+
+    {
+        "category": {"model_name": "rain12ali/tweet-classifier-xlm-roberta",
+                     "revision": "<hub commit or tag>", "version": "v2"},
+        "factuality": {...}
+    }
+
+Missing slots keep their current model. "version" is a free-form label
+(defaults to the revision, or "main").
+"""
+
+import gc
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from length_bucketing import TWEET_MAX_LENGTH
+
+MODEL_MANIFEST_FILE = "model_versions.json"
+
+# Seconds to wait for batches still using a replaced version
+DRAIN_TIMEOUT = 60
+
+# Retired versions kept in the status history
+HISTORY_SIZE = 5
+
+# Short mixed-language tweets run through a new model before it serves
+WARMUP_TEXTS = [
+    "Pakistan won the match against India by 5 wickets",
+    "State Bank raises policy rate to 22 percent",
+    "وزیر اعظم نے نئے بجٹ کا اعلان کر دیا",
+    "Petrol ki qeemat mein 10 rupay izafa",
+    "Foreign office summons ambassador over border incident",
+    "Good morning everyone, have a nice day",
+]
+
+# Padded shapes warmed up per model: single requests and full micro-batches
+# (batching.py) at the sequence lengths tweets usually pad to
+WARMUP_SEQUENCE_LENGTHS = (16, 32, 64, TWEET_MAX_LENGTH)
+WARMUP_BATCH_SIZES = (1, 16)
+
+
+def warmup_model(model: Any, texts: Sequence[str] = WARMUP_TEXTS,
+                 lengths: Sequence[int] = WARMUP_SEQUENCE_LENGTHS,
+                 batch_sizes: Sequence[int] = WARMUP_BATCH_SIZES):
+    """
+    Run forward passes at every (batch size, sequence length) shape, so
+    the allocator and kernel caches are primed before the first request.
+    """
+    for batch_size in batch_sizes:
+        batch = [texts[i % len(texts)] for i in range(batch_size)]
+        for length in lengths:
+            inputs = model.tokenizer(batch, return_tensors="pt", truncation=True,
+                                     padding="max_length", max_length=length)
+            model.forward_logits(inputs)
+
+
+class ModelVersion:
+    """One loaded model and its lifecycle: loading -> active -> draining -> retired"""
+
+    def __init__(self, slot: str, model: Any, version: Optional[str] = None):
+        self.slot = slot
+        self.model = model
+        self.model_name = model.model_name
+        self.revision = model.revision
+        self.version = version or self.revision or "main"
+        self.state = "loading"
+        self.in_flight = 0
+        self.served = 0
+        self.load_seconds = None
+        self.warmup_seconds = None
+        self.activated_at = None
+        self.retired_at = None
+        # Model of a retired version still leased by in-flight batches
+        self.pending_release = None
+
+    def same_source(self, model_name: str, revision: Optional[str]) -> bool:
+        return self.model_name == model_name and self.revision == revision
+
+    def describe(self) -> Dict:
+        return {
+            'version': self.version,
+            'model_name': self.model_name,
+            'revision': self.revision,
+            'state': self.state,
+            'in_flight': self.in_flight,
+            'batches_served': self.served,
+            'load_seconds': self.load_seconds,
+            'warmup_seconds': self.warmup_seconds,
+            'activated_at': self.activated_at,
+            'retired_at': self.retired_at
+        }
+
+
+class ModelRegistry:
+    """Active model version per slot, with background load, warmup and swap"""
+
+    def __init__(self, factories: Dict[str, Callable[..., Any]],
+                 build_pipeline: Callable[[Dict[str, Any]], Any],
+                 manifest_path: str = MODEL_MANIFEST_FILE,
+                 warmup_texts: List[str] = WARMUP_TEXTS,
+                 drain_timeout: float = DRAIN_TIMEOUT):
+        """
+        Args:
+            factories: Slot name -> callable(model_name=..., revision=...)
+                returning an unloaded model (ModelManager / FactualityClassifier)
+            build_pipeline: Builds a ready pipeline (with classify_batch) from
+                {slot: loaded model}
+            manifest_path: Deployment manifest, see module docstring
+            warmup_texts: Texts every new version classifies before serving
+            drain_timeout: Seconds to wait for old-version batches on a swap
+        """
+        self.factories = factories
+        self.build_pipeline = build_pipeline
+        self.manifest_path = manifest_path
+        self.warmup_texts = warmup_texts
+        self.drain_timeout = drain_timeout
+
+        self._lock = threading.Lock()
+        self._drained = threading.Condition(self._lock)
+        self._deploy_lock = threading.Lock()
+        self._active: Dict[str, ModelVersion] = {}
+        self._pipeline = None
+        self._draining: List[ModelVersion] = []
+        self._history: List[ModelVersion] = []
+        self._deploying: Dict[str, Dict] = {}
+        self._manifest_mtime = None
+        self.deploy_errors = 0
+
+    # ------------------------------------------------------------------
+    # SERVING
+    # ------------------------------------------------------------------
+    @contextmanager
+    def lease(self):
+        """
+        The current pipeline, pinned for the duration of the block.
+
+        Versions swapped out while a lease is held are not retired until it
+        is released.
+        """
+        with self._lock:
+            if self._pipeline is None:
+                raise RuntimeError("Models are not loaded yet")
+            pipeline = self._pipeline
+            versions = list(self._active.values())
+            for version in versions:
+                version.in_flight += 1
+                version.served += 1
+        try:
+            yield pipeline
+        finally:
+            with self._drained:
+                released = []
+                for version in versions:
+                    version.in_flight -= 1
+                    if version.in_flight == 0 and version.pending_release is not None:
+                        released.append((version, version.pending_release))
+                        version.pending_release = None
+                self._drained.notify_all()
+            for version, model in released:
+                self._release(version, model)
+
+    def classify_batch(self, texts: List[str]) -> List[Dict]:
+        """TweetClassifierPipeline.classify_batch on the active versions."""
+        with self.lease() as pipeline:
+            return pipeline.classify_batch(texts)
+
+    def model(self, slot: str) -> Any:
+        """The active model of a slot (for label maps and the like)."""
+        with self._lock:
+            return self._active[slot].model
+
+    # ------------------------------------------------------------------
+    # LOADING AND DEPLOYMENT
+    # ------------------------------------------------------------------
+    @property
+    def loaded(self) -> bool:
+        return self._pipeline is not None
+
+    def load(self, defaults: Dict[str, Any], parallel: bool = True, warmup: bool = True):
+        """
+        Initial load at startup: the manifest's versions where it names one,
+        otherwise the given default (unloaded) models. Models are loaded
+        and warmed up concurrently unless parallel=False.
+
+        warmup=False is for a pre-fork master (prefork.py): each worker
+        warms up its own process with warmup() instead.
+        """
+        manifest = self._read_manifest() or {}
+        start_time = time.time()
+        with self._deploy_lock:
+            plans = {}
+            for slot, model in defaults.items():
+                entry = manifest.get(slot) or {}
+                model_name = entry.get('model_name', model.model_name)
+                revision = entry.get('revision', model.revision)
+                if (model_name, revision) != (model.model_name, model.revision):
+                    model = self.factories[slot](model_name=model_name, revision=revision)
+                plans[slot] = (model, entry.get('version'))
+
+            with ThreadPoolExecutor(max_workers=len(plans) if parallel else 1,
+                                    thread_name_prefix="model-load") as pool:
+                futures = {slot: pool.submit(self._prepare, slot, model, version, warmup)
+                           for slot, (model, version) in plans.items()}
+                versions = {slot: future.result() for slot, future in futures.items()}
+
+            pipeline = self.build_pipeline({slot: version.model for slot, version in versions.items()})
+            with self._lock:
+                for version in versions.values():
+                    self._activate(version)
+                self._pipeline = pipeline
+        print(f"Models ready in {time.time() - start_time:.1f} seconds")
+
+    def deploy(self, slot: str, model_name: str, revision: Optional[str] = None,
+               version: Optional[str] = None) -> Dict:
+        """
+        Load, warm up and swap in a new version of one slot. Blocking - run
+        it off the event loop. Serving continues on the old version until
+        the swap.
+
+        Returns:
+            Description of the now active version
+        """
+        if slot not in self.factories:
+            raise ValueError(f"Unknown model slot: {slot}")
+
+        with self._deploy_lock:
+            with self._lock:
+                if self._active.get(slot) and self._active[slot].same_source(model_name, revision):
+                    return self._active[slot].describe()
+                self._deploying[slot] = {'model_name': model_name, 'revision': revision,
+                                         'version': version, 'started_at': time.time()}
+            try:
+                new = self._prepare(slot, self.factories[slot](model_name=model_name, revision=revision), version)
+                with self._lock:
+                    models = {name: active.model for name, active in self._active.items()}
+                models[slot] = new.model
+                pipeline = self.build_pipeline(models)
+
+                with self._lock:
+                    old = self._active.get(slot)
+                    self._activate(new)
+                    self._pipeline = pipeline
+                    if old is not None:
+                        old.state = "draining"
+                        self._draining.append(old)
+                print(f"Model {slot}: {old.version if old else None} -> {new.version} is now active")
+            except Exception:
+                self.deploy_errors += 1
+                raise
+            finally:
+                with self._lock:
+                    self._deploying.pop(slot, None)
+
+        if old is not None:
+            self._drain(old)
+        return new.describe()
+
+    def apply_manifest(self) -> List[Dict]:
+        """
+        Deploy every slot whose manifest entry differs from the active
+        version. Cheap when the manifest file has not changed.
+
+        Returns:
+            Descriptions of the versions swapped in (empty if none were)
+        """
+        try:
+            mtime = os.path.getmtime(self.manifest_path)
+        except OSError:
+            return []
+        if mtime == self._manifest_mtime:
+            return []
+
+        manifest = self._read_manifest() or {}
+        deployed = []
+        for slot, entry in manifest.items():
+            if slot not in self.factories:
+                print(f"Model manifest: unknown slot {slot}, ignored")
+                continue
+            with self._lock:
+                current = self._active.get(slot)
+            if current is not None and current.same_source(entry.get('model_name'), entry.get('revision')):
+                continue
+            try:
+                deployed.append(self.deploy(slot, entry['model_name'], entry.get('revision'), entry.get('version')))
+            except Exception as e:
+                print(f"Model deploy error ({slot} -> {entry.get('model_name')}): {e}")
+                # Retry on the next poll only after the manifest changes again
+        self._manifest_mtime = mtime
+        return deployed
+
+    def _read_manifest(self) -> Optional[Dict]:
+        if not os.path.exists(self.manifest_path):
+            return None
+        try:
+            with open(self.manifest_path, encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Could not read model manifest {self.manifest_path}: {e}")
+            return None
+
+    def warmup(self):
+        """Warm up the active models in this process (e.g. a forked worker)."""
+        start_time = time.time()
+        with self._lock:
+            models = [version.model for version in self._active.values()]
+        for model in models:
+            warmup_model(model, self.warmup_texts)
+        print(f"Models warmed up in {time.time() - start_time:.1f} seconds")
+
+    def _prepare(self, slot: str, model: Any, version: Optional[str], warmup: bool = True) -> ModelVersion:
+        """Load and warm up a model outside the lock."""
+        candidate = ModelVersion(slot, model, version)
+        print(f"Model {slot}: loading {candidate.model_name} ({candidate.version})...")
+
+        start_time = time.time()
+        model.load_model()
+        candidate.load_seconds = round(time.time() - start_time, 2)
+
+        start_time = time.time()
+        if warmup and self.warmup_texts:
+            warmup_model(model, self.warmup_texts)
+        candidate.warmup_seconds = round(time.time() - start_time, 2)
+
+        print(f"Model {slot}: {candidate.version} loaded in {candidate.load_seconds}s, "
+              f"warmed up in {candidate.warmup_seconds}s")
+        return candidate
+
+    def _activate(self, version: ModelVersion):
+        """Make a prepared version active. Caller holds the lock."""
+        version.state = "active"
+        version.activated_at = time.time()
+        self._active[version.slot] = version
+
+    def _drain(self, old: ModelVersion):
+        """
+        Wait for batches leased before the swap, then retire the old version.
+
+        Its model is released here if they finished, otherwise by the lease
+        that ends last.
+        """
+        with self._drained:
+            finished = self._drained.wait_for(lambda: old.in_flight == 0, timeout=self.drain_timeout)
+            old.state = "retired"
+            old.retired_at = time.time()
+            model, old.model = old.model, None
+            if not finished:
+                old.pending_release = model
+            self._draining.remove(old)
+            self._history = (self._history + [old])[-HISTORY_SIZE:]
+
+        if finished:
+            self._release(old, model)
+        else:
+            print(f"Model {old.slot}: {old.in_flight} batches still on {old.version} "
+                  f"after {self.drain_timeout}s, retiring anyway; released when they end")
+        print(f"Model {old.slot}: {old.version} retired")
+
+    def _release(self, version: ModelVersion, model: Any):
+        """Free a retired model. Copies outside this process (backend="pool") are freed explicitly."""
+        try:
+            model.release()
+        except Exception as e:
+            print(f"Model {version.slot}: error releasing {version.version}: {e}")
+        gc.collect()
+        print(f"Model {version.slot}: {version.version} released")
+
+    # ------------------------------------------------------------------
+    # STATUS
+    # ------------------------------------------------------------------
+    def status(self) -> Dict:
+        """Active, draining and recently retired versions per slot."""
+        with self._lock:
+            return {
+                slot: {
+                    'active': self._active[slot].describe() if slot in self._active else None,
+                    'deploying': self._deploying.get(slot),
+                    'draining': [v.describe() for v in self._draining if v.slot == slot],
+                    'history': [v.describe() for v in self._history if v.slot == slot]
+                }
+                for slot in self.factories
+            }
@@ -113,6 +113,7 @@ class VerificationResult(Base):
     reason = Column(Text)
     votes_in_favor_percentage = Column(Numeric(5, 2))  # New column added here
     created_at = Column(TIMESTAMP, server_default=func.now())
+    updated_at = Column(TIMESTAMP, server_default=func.now(), onupdate=func.now(), index=True)  # SimHash index sync watermark
 
     sources = relationship(
         "VerificationSource",
@@ -22,7 +22,7 @@ db = SessionLocal()  # Create actual database session
 try:
     # Initialize system
     matching_system = TweetMatchingSystem(db_session=db)
-    matching_system.initialize()  # Loads from helper.txt or processes DB
+    matching_system.initialize()  # Loads from helper.simhash or processes DB
     
     # Test matching
     results = matching_system.match_tweet("BREAKING: Chinese scientists developing a drug to extend human life to 150 years NYT The breakthrough hinges on a grapeseed compound, PCC1, which in tests destroyed aged cells in mice, extending their lifespan by over 9% This 'holy grail' technology is now being adapted for humans.")
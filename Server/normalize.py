@@ -106,4 +106,50 @@ def validate_normalization(original: str, normalized: str) -> dict:
         validation = validate_normalization(test, normalized)
         print(f"\nValidation: {'✓ PASS' if validation['is_valid'] else '✗ FAIL'}")
         if validation['issues']:
-            print(f"Issues: {', '.join(validation['issues'])}")
\ No newline at end of file
+            print(f"Issues: {', '.join(validation['issues'])}")
+
+# Words that flip a claim (English, Urdu, Roman Urdu)
+NEGATION_WORDS = {
+    'not', 'no', 'never', 'none', 'nothing', 'nobody', 'neither', 'nor', 'cannot',
+    'denied', 'denies', 'deny', 'fake', 'false', 'hoax', 'rumor', 'rumour',
+    'نہیں', 'نہ', 'مت', 'جھوٹ', 'جعلی', 'تردید',
+    'nahi', 'nahin', 'nai', 'mat', 'jhoot', 'jhooti', 'jaali'
+}
+
+_DIGITS = str.maketrans('۰۱۲۳۴۵۶۷۸۹٠١٢٣٤٥٦٧٨٩', '01234567890123456789')
+
+
+def _claim_features(text: str):
+    """Negation flag, numbers and capitalised names of a claim."""
+    text = (text or "").replace("’", "'").translate(_DIGITS)
+    words = re.findall(r"[\w']+", text.lower())
+    negated = any(word in NEGATION_WORDS or word.endswith("n't") for word in words)
+    numbers = {number.replace(",", "") for number in re.findall(r"\d+(?:[.,]\d+)*", text)}
+    # Capitalised words that do not start a sentence
+    names = {match.group(1).lower()
+             for match in re.finditer(r"(?<![.!?:\n]\s)(?<!^)\b([A-Z][A-Za-z]+)\b", text)}
+    return negated, numbers, names, set(words)
+
+
+def claim_mismatch(claim: str, matched: str):
+    """
+    Reasons a near-duplicate of a verified tweet may still say something else.
+
+    Embedding and SimHash similarity both barely register "did not", a
+    changed number or a different name, so a matched verdict is only reused
+    when the two texts agree on negation, numbers and capitalised names.
+
+    Returns:
+        A short reason string, or None if no mismatch was found
+    """
+    claim_negated, claim_numbers, claim_names, claim_words = _claim_features(claim)
+    matched_negated, matched_numbers, matched_names, matched_words = _claim_features(matched)
+
+    if claim_negated != matched_negated:
+        return "negation differs"
+    if claim_numbers != matched_numbers:
+        return f"numbers differ ({sorted(claim_numbers ^ matched_numbers)})"
+    missing = (claim_names - matched_words) | (matched_names - claim_words)
+    if missing:
+        return f"names differ ({sorted(missing)})"
+    return None
@@ -0,0 +1,178 @@
+"""
+onnx_backend.py
+
+ONNX Runtime CPU backend for the XLM-R sequence classifiers.
+
+The servers have no GPU, so the torch path runs eager fp32. With
+backend="onnx", ModelManager / FactualityClassifier export their model to
+ONNX once (dynamic batch and sequence axes), optionally quantize the
+weights to int8 (dynamic quantization of the MatMul/Gemm ops) and serve it
+through an InferenceSession with all graph optimisations enabled.
+
+Exported files are cached under ONNX_MODEL_DIR/<model name>[@<revision>]/:
+
+    model.onnx         fp32 export
+    model.int8.onnx    dynamically quantized weights
+    *.opt.onnx         graph ORT optimised on first load (faster startup)
+
+Every file is written under a unique temporary name and renamed into place
+(atomic_files.atomic_replace), so no process ever loads a half-written or
+interrupted export. Exports hold a lock on the cache directory: with several
+server or inference-pool processes starting at once, one exports and the
+others wait for it and reuse the result.
+
+Run this module directly to export both classifiers and check that the
+ONNX variants predict the same labels as torch.
+"""
+
+import os
+import time
+
+import numpy as np
+import torch
+import onnxruntime as ort
+from onnxruntime.quantization import QuantType, quantize_dynamic
+
+from atomic_files import atomic_replace, file_lock
+from quantization import check_parity
+
+ONNX_MODEL_DIR = "onnx_models"
+ONNX_OPSET = 17
+
+
+class _LogitsOnly(torch.nn.Module):
+    """Export wrapper: (input_ids, attention_mask) -> logits tensor"""
+
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+
+    def forward(self, input_ids, attention_mask):
+        return self.model(input_ids=input_ids, attention_mask=attention_mask).logits
+
+
+def onnx_model_path(model_name: str, quantized: bool = False, onnx_dir: str = ONNX_MODEL_DIR,
+                    revision: str = None) -> str:
+    """Cache path of the exported (or quantized) model for a hub model name."""
+    key = model_name if revision is None else f"{model_name}@{revision}"
+    directory = os.path.join(onnx_dir, key.replace("/", "__"))
+    return os.path.join(directory, "model.int8.onnx" if quantized else "model.onnx")
+
+
+def export_to_onnx(model, tokenizer, path: str):
+    """Export a sequence classifier with dynamic batch / sequence axes."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    model = model.float().eval()
+    sample = tokenizer(["ONNX export sample", "نمونہ"], return_tensors="pt", padding=True)
+
+    start_time = time.time()
+    with atomic_replace(path, suffix=".onnx") as tmp_path:
+        torch.onnx.export(
+            _LogitsOnly(model),
+            (sample["input_ids"], sample["attention_mask"]),
+            tmp_path,
+            input_names=["input_ids", "attention_mask"],
+            output_names=["logits"],
+            dynamic_axes={
+                "input_ids": {0: "batch", 1: "sequence"},
+                "attention_mask": {0: "batch", 1: "sequence"},
+                "logits": {0: "batch"}
+            },
+            opset_version=ONNX_OPSET,
+            do_constant_folding=True
+        )
+    print(f"Exported {path} in {time.time() - start_time:.1f} seconds")
+
+
+def quantize_onnx(source_path: str, target_path: str):
+    """int8 dynamic quantization of an exported model's weights."""
+    with atomic_replace(target_path, suffix=".onnx") as tmp_path:
+        quantize_dynamic(source_path, tmp_path, weight_type=QuantType.QInt8)
+    source_mb = os.path.getsize(source_path) / 1e6
+    target_mb = os.path.getsize(target_path) / 1e6
+    print(f"Quantized {source_path} ({source_mb:.0f} MB) -> {target_path} ({target_mb:.0f} MB)")
+
+
+def ensure_onnx_model(model_name: str, load_torch_model, tokenizer, quantize: bool = False,
+                      onnx_dir: str = ONNX_MODEL_DIR, revision: str = None) -> str:
+    """
+    Return the path of the ONNX model to serve, exporting it first if needed.
+
+    Args:
+        model_name: Hub name (also the cache key)
+        load_torch_model: Callable returning the fp32 torch model; only
+            called when no export exists yet
+        tokenizer: Tokenizer used for the export sample
+        quantize: Serve the int8 variant
+        revision: Hub revision; each revision gets its own cache directory
+    """
+    fp32_path = onnx_model_path(model_name, quantized=False, onnx_dir=onnx_dir, revision=revision)
+    int8_path = onnx_model_path(model_name, quantized=True, onnx_dir=onnx_dir, revision=revision)
+
+    path = int8_path if quantize else fp32_path
+    if os.path.exists(path):
+        return path
+
+    # One process exports; the others wait here, then find the files
+    os.makedirs(os.path.dirname(fp32_path), exist_ok=True)
+    with file_lock(os.path.join(os.path.dirname(fp32_path), "export")):
+        if not os.path.exists(fp32_path):
+            export_to_onnx(load_torch_model(), tokenizer, fp32_path)
+        if quantize and not os.path.exists(int8_path):
+            quantize_onnx(fp32_path, int8_path)
+    return path
+
+
+class OnnxClassifier:
+    """InferenceSession wrapper returning logits as a torch tensor"""
+
+    def __init__(self, path: str, num_threads: int = 0):
+        """
+        Args:
+            path: Exported .onnx file
+            num_threads: Intra-op threads (0 = one per physical core)
+        """
+        self.path = path
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.intra_op_num_threads = num_threads
+
+        optimized_path = path.replace(".onnx", ".opt.onnx")
+        if (os.path.exists(optimized_path) and os.path.getsize(optimized_path)
+                and os.path.getmtime(optimized_path) >= os.path.getmtime(path)):
+            self.session = ort.InferenceSession(optimized_path, options, providers=["CPUExecutionProvider"])
+        else:
+            # ORT writes the optimised graph while the session is created
+            with atomic_replace(optimized_path, suffix=".onnx") as tmp_path:
+                options.optimized_model_filepath = tmp_path
+                self.session = ort.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+
+    def logits(self, inputs) -> torch.Tensor:
+        feeds = {
+            "input_ids": inputs["input_ids"].cpu().numpy().astype(np.int64),
+            "attention_mask": inputs["attention_mask"].cpu().numpy().astype(np.int64)
+        }
+        return torch.from_numpy(self.session.run(["logits"], feeds)[0])
+
+
+if __name__ == "__main__":
+    from xlmmodel import ModelManager
+    from factualmodel import FactualityClassifier
+
+    samples = [
+        "Pakistan won the match against India by 5 wickets",
+        "State Bank raises policy rate to 22 percent",
+        "وزیر اعظم نے نئے بجٹ کا اعلان کر دیا",
+        "Petrol ki qeemat mein 10 rupay izafa",
+        "Foreign office summons ambassador over border incident",
+        "Good morning everyone, have a nice day",
+    ]
+
+    for cls in (ModelManager, FactualityClassifier):
+        reference = cls(backend="torch")
+        reference.load_model()
+        for quantize in (False, True):
+            candidate = cls(backend="onnx", quantize=quantize)
+            candidate.load_model()
+            report = check_parity(reference, candidate, samples)
+            print(f"{cls.__name__} onnx{' int8' if quantize else ''}: {report}")
@@ -0,0 +1,250 @@
+"""
+prefork.py
+
+Pre-fork serving: load the models and indexes once, then fork workers.
+
+`uvicorn main:app --workers N` starts N interpreters that each import
+main.py and load their own XLM-R models, SimHash corpus and embedding index,
+so RAM grows N-fold. Here the master process imports main, loads
+everything once (main.preload_for_fork), binds the listening socket and
+forks N uvicorn workers that inherit the loaded state copy-on-write.
+
+What stays shared is the large data held outside per-object Python memory:
+model weights in torch storages (memory-mapped safetensors where
+available, see model_artifacts.py), hashes in PackedHashArray numpy
+buffers, tweet texts in the mmap'd snapshot (simhash_store.py) and
+embeddings in IVFIndex arrays. Touching an array only writes the refcount
+on its small header page, never the data pages.
+
+What is not: the per-tweet ProcessedTweet records and the LSH band tables
+(dicts of sets) are ordinary Python objects, and every lookup that touches
+one writes its refcount, so the pages holding them are gradually copied
+into each worker. gc.freeze() after loading keeps the workers' collections
+from writing GC headers on top of that, but it does not prevent this.
+
+Other measures:
+
+  - Torch runs single-threaded in the master, so no OpenMP thread pool
+    exists at fork(); each worker sets its own thread count and warms up.
+  - Workers drop the database connections inherited from the master
+    (engine.dispose(close=False)) and open their own.
+  - The master gives up the snapshot / embedding-index writer leases
+    (atomic_files.WriterLease) before forking. Each worker keeps its own
+    index current with an incremental sync, but only the one worker that
+    claims a lease rewrites that file and re-attaches its records to it;
+    the others keep synced records in memory. If that worker exits, the
+    next one to sync takes over.
+  - Workers do not watch model_versions.json. The master polls it, deploys
+    the new versions itself and then restarts the workers one at a time,
+    so they fork from (and share) the new weights; the old ones are freed
+    as the last worker holding them exits.
+
+Usage:
+    python prefork.py --workers 4 [--host 127.0.0.1] [--port 8000] [--threads 2]
+"""
+
+import argparse
+import gc
+import os
+import signal
+import socket
+import sys
+import time
+from typing import Dict, List, Optional
+
+# Seconds to wait for workers to exit after SIGTERM before killing them
+SHUTDOWN_TIMEOUT = 30
+
+# Minimum seconds between restarts of crashed workers
+RESTART_BACKOFF = 1.0
+
+# Seconds between the master's checks of the model manifest
+MANIFEST_INTERVAL = 30
+
+# Seconds a restarted worker gets to load before the next one is replaced
+ROLLING_RESTART_INTERVAL = 15
+
+# Signals that stop the master and its workers
+STOP_SIGNALS = {signal.SIGTERM, signal.SIGINT}
+
+
+def bind_socket(host: str, port: int, backlog: int = 2048) -> socket.socket:
+    """Listening socket created in the master and inherited by every worker."""
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+def preload():
+    """Import main and load the shared state, then freeze it for the GC."""
+    import torch
+
+    torch.set_num_threads(1)
+
+    start_time = time.time()
+    import main
+    main.preload_for_fork()
+
+    # The master never writes the snapshot or embedding index; a worker will
+    from atomic_files import WriterLease
+    WriterLease.release_all()
+
+    gc.collect()
+    gc.freeze()
+    print(f"Preloaded in {time.time() - start_time:.1f} seconds "
+          f"({gc.get_freeze_count()} objects frozen)")
+    return main
+
+
+def run_worker(main, sock: socket.socket, threads: int):
+    """Body of a forked worker: serve main.app on the inherited socket."""
+    import torch
+    import uvicorn
+    from database import engine
+
+    torch.set_num_threads(threads)
+    engine.dispose(close=False)
+    main.app.state.prefork_worker = True
+
+    config = uvicorn.Config(main.app, log_level="info")
+    uvicorn.Server(config).run(sockets=[sock])
+
+
+class PreforkServer:
+    """Forks and supervises workers sharing one preloaded master"""
+
+    def __init__(self, main, sock: socket.socket, workers: int, threads: int):
+        self.main = main
+        self.sock = sock
+        self.workers = workers
+        self.threads = threads
+        self.children: Dict[int, int] = {}  # pid -> worker number
+        self.stopping = False
+
+        # Rolling restart after a model deploy: workers still to replace,
+        # the one being replaced and when the next may be
+        self.restart_queue: List[int] = []
+        self.restarting: Optional[int] = None
+        self.next_restart = 0.0
+        self.next_manifest_check = time.time() + MANIFEST_INTERVAL
+
+    def spawn(self, number: int):
+        # Until the child has reset them, the master's handlers would only
+        # set its stopping flag, so a SIGTERM sent right after fork() is held
+        signal.pthread_sigmask(signal.SIG_BLOCK, STOP_SIGNALS)
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                for signum in STOP_SIGNALS:
+                    signal.signal(signum, signal.SIG_DFL)
+                signal.pthread_sigmask(signal.SIG_UNBLOCK, STOP_SIGNALS)
+                run_worker(self.main, self.sock, self.threads)
+            except BaseException as e:
+                print(f"Worker {number} failed: {e}")
+                code = 1
+            finally:
+                os._exit(code)
+        signal.pthread_sigmask(signal.SIG_UNBLOCK, STOP_SIGNALS)
+        self.children[pid] = number
+        print(f"Started worker {number} (pid {pid})")
+
+    def apply_manifest(self):
+        """Deploy changed model versions in the master, then roll them out."""
+        registry = self.main.model_registry
+        # Let the replaced models' objects be collected, then freeze the new ones
+        gc.unfreeze()
+        try:
+            deployed = registry.apply_manifest()
+        except Exception as e:
+            print(f"Model manifest error: {e}")
+            deployed = []
+        gc.collect()
+        gc.freeze()
+
+        if deployed:
+            print(f"Deployed {len(deployed)} model version(s), restarting workers one at a time")
+            self.restart_queue = sorted(self.children.values())
+
+    def restart_next(self):
+        """Replace the next worker of a rolling restart (the loop respawns it)."""
+        if self.restarting is not None or not self.restart_queue or time.time() < self.next_restart:
+            return
+        number = self.restart_queue.pop(0)
+        for pid, child in self.children.items():
+            if child == number:
+                self.restarting = number
+                os.kill(pid, signal.SIGTERM)
+                return
+
+    def stop(self, signum=None, frame=None):
+        self.stopping = True
+        for pid in list(self.children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    def run(self):
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+
+        for number in range(self.workers):
+            self.spawn(number)
+
+        deadline = None
+        while self.children:
+            if self.stopping and deadline is None:
+                deadline = time.time() + SHUTDOWN_TIMEOUT
+            if deadline is not None and time.time() > deadline:
+                for pid in list(self.children):
+                    os.kill(pid, signal.SIGKILL)
+
+            if not self.stopping:
+                if time.time() >= self.next_manifest_check and not self.restart_queue and self.restarting is None:
+                    self.apply_manifest()
+                    self.next_manifest_check = time.time() + MANIFEST_INTERVAL
+                self.restart_next()
+
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                break
+            if pid == 0:
+                time.sleep(0.2)
+                continue
+
+            number = self.children.pop(pid, None)
+            if number is None:
+                continue
+            print(f"Worker {number} (pid {pid}) exited with status {os.waitstatus_to_exitcode(status)}")
+            if not self.stopping:
+                if number == self.restarting:
+                    self.restarting = None
+                    self.next_restart = time.time() + ROLLING_RESTART_INTERVAL
+                else:
+                    time.sleep(RESTART_BACKOFF)
+                self.spawn(number)
+
+        self.sock.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve main:app from pre-forked workers")
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--threads", type=int, default=None,
+                        help="torch threads per worker (default: cores / workers)")
+    args = parser.parse_args()
+
+    if not hasattr(os, "fork"):
+        sys.exit("prefork.py needs fork(); use uvicorn directly on this platform")
+
+    threads = args.threads or max(1, (os.cpu_count() or 1) // args.workers)
+    listen_socket = bind_socket(args.host, args.port)
+    PreforkServer(preload(), listen_socket, args.workers, threads).run()
@@ -0,0 +1,152 @@
+"""
+quantization.py
+
+CPU int8 dynamic quantization for the PyTorch XLM-R classifiers.
+
+A dependency-light alternative to the ONNX backend: with quantize=True on a
+CPU host, ModelManager / FactualityClassifier replace every nn.Linear with
+a dynamically quantized int8 version (weights stored as int8, activations
+quantized on the fly). The embedding matrix stays fp32, so memory drops
+by roughly half for XLM-R base rather than 4x.
+
+Also holds the torch thread settings and the parity check used to compare
+two classifier variants on the same texts.
+
+Run this module directly to report memory saved and label agreement of the
+quantized models on a held-out set: a text file with one tweet per line,
+or the most recent tweets in the database when no file is given.
+"""
+
+import io
+import sys
+import time
+from typing import Dict, List, Optional
+
+import torch
+
+_threads_configured = False
+
+
+def configure_torch_threads(num_threads: Optional[int] = None,
+                            num_interop_threads: Optional[int] = None):
+    """
+    Set torch intra-op / inter-op thread counts (None leaves the default).
+
+    The inter-op pool can only be sized before torch first uses it, so this
+    is applied once per process.
+    """
+    global _threads_configured
+    if _threads_configured:
+        return
+    if num_threads:
+        torch.set_num_threads(num_threads)
+    if num_interop_threads:
+        try:
+            torch.set_num_interop_threads(num_interop_threads)
+        except RuntimeError as e:
+            print(f"Could not set inter-op threads: {e}")
+    _threads_configured = True
+
+
+def model_size_bytes(model) -> int:
+    """Serialized size of a model's state dict (counts packed int8 weights)."""
+    buffer = io.BytesIO()
+    torch.save(model.state_dict(), buffer)
+    return buffer.tell()
+
+
+def quantize_dynamic_int8(model):
+    """
+    Dynamically quantize a model's Linear layers to int8.
+
+    Returns:
+        (quantized model, report dict with fp32 / int8 sizes in MB)
+    """
+    model.eval()
+    fp32_bytes = model_size_bytes(model)
+    quantized = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    int8_bytes = model_size_bytes(quantized)
+
+    report = {
+        'fp32_mb': round(fp32_bytes / 1e6, 1),
+        'int8_mb': round(int8_bytes / 1e6, 1),
+        'saved_mb': round((fp32_bytes - int8_bytes) / 1e6, 1),
+        'ratio': round(fp32_bytes / int8_bytes, 2) if int8_bytes else None
+    }
+    print(f"Quantized Linear layers to int8: {report['fp32_mb']} MB -> {report['int8_mb']} MB "
+          f"(saved {report['saved_mb']} MB)")
+    return quantized, report
+
+
+def check_parity(reference, candidate, texts: List[str], batch_size: int = 8) -> Dict:
+    """
+    Compare two classifiers (e.g. torch fp32 vs int8, or torch vs ONNX).
+
+    Both must provide tokenize() and forward_logits().
+
+    Returns:
+        Dictionary with label agreement, max |logit difference| and timings
+    """
+    agree = 0
+    max_diff = 0.0
+    reference_time = candidate_time = 0.0
+
+    for start in range(0, len(texts), batch_size):
+        inputs = reference.tokenize(texts[start:start + batch_size])
+
+        t0 = time.perf_counter()
+        expected = reference.forward_logits(inputs).float().cpu()
+        t1 = time.perf_counter()
+        actual = candidate.forward_logits(inputs).float().cpu()
+        t2 = time.perf_counter()
+
+        reference_time += t1 - t0
+        candidate_time += t2 - t1
+        agree += int((expected.argmax(dim=1) == actual.argmax(dim=1)).sum())
+        max_diff = max(max_diff, float((expected - actual).abs().max()))
+
+    return {
+        'texts': len(texts),
+        'label_agreement': agree / len(texts) if texts else 1.0,
+        'max_logit_diff': max_diff,
+        'reference_ms': round(1000 * reference_time, 1),
+        'candidate_ms': round(1000 * candidate_time, 1),
+        'speedup': round(reference_time / candidate_time, 2) if candidate_time else None
+    }
+
+
+def load_held_out_texts(path: Optional[str] = None, limit: int = 500) -> List[str]:
+    """Tweets for the parity check: from a file (one per line) or the database."""
+    if path:
+        with open(path, encoding="utf-8") as f:
+            return [line.strip() for line in f if line.strip()][:limit]
+
+    from sqlalchemy import text
+    from database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        rows = db.execute(
+            text("SELECT tweet_text FROM tweets ORDER BY tweet_id DESC LIMIT :limit"),
+            {"limit": limit}
+        ).fetchall()
+        return [row[0] for row in rows if row[0]]
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    from xlmmodel import ModelManager
+    from factualmodel import FactualityClassifier
+
+    texts = load_held_out_texts(sys.argv[1] if len(sys.argv) > 1 else None)
+    print(f"Held-out set: {len(texts)} tweets")
+
+    for cls in (ModelManager, FactualityClassifier):
+        reference = cls(backend="torch")
+        reference.load_model()
+        candidate = cls(backend="torch", quantize=True)
+        candidate.load_model()
+        report = check_parity(reference, candidate, texts)
+        report.update(candidate.quantization_report)
+        print(f"{cls.__name__} int8: {report}")
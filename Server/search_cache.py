@@ -0,0 +1,214 @@
+"""
+search_cache.py
+
+Persistent TTL cache of Google Custom Search results.
+
+Identical or near-identical claims produce the same search queries, and
+each call costs API quota and 0.5-2 s. SearchCache keeps the raw result
+items of every successful call in a local SQLite file, keyed on
+
+    (canonical q, lr, dateRestrict, num)
+
+canonical_query() casefolds and NFKC-normalises the query, collapses
+whitespace and drops the -site: exclusions build_search_query appends for
+blocked domains, so a change to the blocked-domain list does not empty the
+cache. The cached items are unfiltered; crossverify.py filters them against
+the blocked domains current at read time, exactly as it does fresh results.
+
+Entries expire after SEARCH_CACHE_TTL (empty result sets after the shorter
+SEARCH_CACHE_EMPTY_TTL, as new articles appear). When the stored items
+exceed SEARCH_CACHE_MAX_BYTES the least recently used entries are evicted.
+Hit / miss / eviction counters are kept per process.
+"""
+
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from typing import Dict, List, Optional
+
+SEARCH_CACHE_FILE = "search_cache.sqlite3"
+
+# Seconds a cached result set stays valid
+SEARCH_CACHE_TTL = 6 * 3600
+SEARCH_CACHE_EMPTY_TTL = 15 * 60
+
+# Total size of stored items before least recently used entries are evicted
+SEARCH_CACHE_MAX_BYTES = 64 * 1024 * 1024
+
+_SITE_EXCLUSION_RE = re.compile(r"(?<!\S)-site:\S+")
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def canonical_query(query: str) -> str:
+    """Query text with case, Unicode form, spacing and -site: exclusions normalised away."""
+    query = unicodedata.normalize("NFKC", query or "").casefold()
+    query = _SITE_EXCLUSION_RE.sub(" ", query)
+    return _WHITESPACE_RE.sub(" ", query).strip()
+
+
+def cache_key(params: Dict) -> str:
+    """Cache key of a search request's parameters."""
+    parts = [canonical_query(params.get("q", "")), params.get("lr"), params.get("dateRestrict"), params.get("num")]
+    return hashlib.sha256(json.dumps(parts, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+class SearchCache:
+    """SQLite-backed TTL + LRU cache of raw search result items"""
+
+    def __init__(self, path: str = SEARCH_CACHE_FILE, ttl: float = SEARCH_CACHE_TTL,
+                 empty_ttl: float = SEARCH_CACHE_EMPTY_TTL, max_bytes: int = SEARCH_CACHE_MAX_BYTES):
+        self.path = path
+        self.ttl = ttl
+        self.empty_ttl = empty_ttl
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._conn = None
+
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.stores = 0
+        self.evictions = 0
+        self.errors = 0
+
+    def _connection(self) -> sqlite3.Connection:
+        """Open the database on first use (per process: not before a fork)."""
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, check_same_thread=False, timeout=5.0)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS search_cache (
+                    key TEXT PRIMARY KEY,
+                    items TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    created_at REAL NOT NULL,
+                    expires_at REAL NOT NULL,
+                    last_hit REAL NOT NULL,
+                    hits INTEGER NOT NULL DEFAULT 0
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_search_cache_last_hit ON search_cache (last_hit)")
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def get(self, params: Dict) -> Optional[List[Dict]]:
+        """
+        Cached raw items for a search request.
+
+        Returns:
+            The items list (possibly empty), or None on a miss
+        """
+        key = cache_key(params)
+        now = time.time()
+        try:
+            with self._lock:
+                conn = self._connection()
+                row = conn.execute("SELECT items, expires_at FROM search_cache WHERE key = ?", (key,)).fetchone()
+                if row is None:
+                    self.misses += 1
+                    return None
+                if row[1] <= now:
+                    conn.execute("DELETE FROM search_cache WHERE key = ?", (key,))
+                    conn.commit()
+                    self.expired += 1
+                    self.misses += 1
+                    return None
+                conn.execute("UPDATE search_cache SET last_hit = ?, hits = hits + 1 WHERE key = ?", (now, key))
+                conn.commit()
+                self.hits += 1
+            return json.loads(row[0])
+        except (sqlite3.Error, ValueError) as e:
+            print(f"Search cache read error: {e}")
+            self.errors += 1
+            return None
+
+    def contains(self, params: Dict) -> bool:
+        """Whether get() would hit, without counting a lookup or refreshing the entry."""
+        try:
+            with self._lock:
+                row = self._connection().execute(
+                    "SELECT 1 FROM search_cache WHERE key = ? AND expires_at > ?", (cache_key(params), time.time())
+                ).fetchone()
+            return row is not None
+        except sqlite3.Error as e:
+            print(f"Search cache read error: {e}")
+            self.errors += 1
+            return False
+
+    def put(self, params: Dict, items: List[Dict]):
+        """Store the raw items of a successful search request."""
+        key = cache_key(params)
+        payload = json.dumps(items, ensure_ascii=False)
+        now = time.time()
+        expires_at = now + (self.ttl if items else self.empty_ttl)
+        try:
+            with self._lock:
+                conn = self._connection()
+                conn.execute(
+                    "INSERT OR REPLACE INTO search_cache (key, items, size, created_at, expires_at, last_hit, hits) "
+                    "VALUES (?, ?, ?, ?, ?, ?, 0)",
+                    (key, payload, len(payload.encode("utf-8")), now, expires_at, now)
+                )
+                self.stores += 1
+                self._evict(conn, now)
+                conn.commit()
+        except sqlite3.Error as e:
+            print(f"Search cache write error: {e}")
+            self.errors += 1
+
+    def _evict(self, conn: sqlite3.Connection, now: float):
+        """Drop expired entries, then LRU entries down to 90% of max_bytes. Caller holds the lock."""
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM search_cache").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+
+        evicted = conn.execute("DELETE FROM search_cache WHERE expires_at <= ?", (now,)).rowcount
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM search_cache").fetchone()[0]
+
+        target = int(self.max_bytes * 0.9)
+        if total > target:
+            doomed = []
+            for key, size in conn.execute("SELECT key, size FROM search_cache ORDER BY last_hit"):
+                if total <= target:
+                    break
+                doomed.append((key,))
+                total -= size
+            conn.executemany("DELETE FROM search_cache WHERE key = ?", doomed)
+            evicted += len(doomed)
+        self.evictions += evicted
+
+    def get_statistics(self) -> Dict:
+        lookups = self.hits + self.misses
+        stats = {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else None,
+            'expired': self.expired,
+            'stores': self.stores,
+            'evictions': self.evictions,
+            'errors': self.errors
+        }
+        try:
+            with self._lock:
+                entries, size = self._connection().execute(
+                    "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM search_cache"
+                ).fetchone()
+            stats.update({'entries': entries, 'size_bytes': size, 'max_bytes': self.max_bytes})
+        except sqlite3.Error as e:
+            stats['error'] = str(e)
+        return stats
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+search_cache = SearchCache()
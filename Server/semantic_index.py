@@ -0,0 +1,503 @@
+"""
+semantic_index.py
+
+Dense-embedding paraphrase matching for verified tweets.
+
+SimHash only finds near-verbatim copies. This module embeds verified tweets
+with a sentence-transformers model (loaded from model_artifacts/ when a
+local snapshot exists, see model_artifacts.py) and answers "which verified claim
+says the same thing?" by cosine similarity, so paraphrases can reuse an
+existing verdict instead of going through NER + search + NLI again.
+
+Vectors are L2-normalised and stored quantised (int8 with a per-vector
+scale, or float16) in one contiguous matrix. IVFIndex partitions them with
+spherical k-means into `nlist` inverted lists; a query scores the centroids,
+then only the rows in the `nprobe` closest lists. Rows added after the last
+training pass sit in a small pending block that every query scans exactly,
+and the lists are re-trained once that block grows too large.
+"""
+
+import os
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from atomic_files import WriterLease, atomic_replace
+from model_artifacts import SENTENCE_MODEL_FILES, resolve_model_source
+
+# Multilingual (Urdu / English / Roman Urdu) paraphrase model
+SEMANTIC_MODEL_NAME = "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2"
+
+# Cosine similarity at which a verified tweet counts as the same claim
+SEMANTIC_MATCH_THRESHOLD = 0.85
+
+# Matches below this are borderline: reported, but the tweet still goes
+# through full verification instead of reusing the matched verdict
+SEMANTIC_REUSE_THRESHOLD = 0.92
+
+# Below this many vectors a flat scan is as fast as IVF and needs no training
+IVF_MIN_TRAIN_SIZE = 4096
+
+# Re-train the inverted lists once unclustered rows exceed this share
+IVF_RETRAIN_FRACTION = 0.2
+
+KMEANS_ITERATIONS = 10
+KMEANS_SAMPLE_PER_LIST = 256
+
+# Rows scored per matrix product when assigning rows to lists
+ASSIGN_BLOCK = 8192
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+class IVFIndex:
+    """Inverted-file ANN index over quantised unit vectors (inner product)"""
+
+    def __init__(self, dim: int, dtype: str = "int8", nlist: Optional[int] = None,
+                 nprobe: int = 8, min_train_size: int = IVF_MIN_TRAIN_SIZE):
+        """
+        Args:
+            dim: Embedding dimension
+            dtype: 'int8' (4x smaller than float32) or 'float16' (2x)
+            nlist: Number of inverted lists; ~sqrt(n) if None
+            nprobe: Lists scanned per query (more = better recall, slower)
+            min_train_size: Use an exact flat scan below this many vectors
+        """
+        if dtype not in ("int8", "float16"):
+            raise ValueError(f"Unsupported vector dtype: {dtype}")
+
+        self.dim = dim
+        self.dtype = dtype
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.min_train_size = min_train_size
+
+        self._codes = np.zeros((0, dim), dtype=np.int8 if dtype == "int8" else np.float16)
+        self._scales = np.zeros(0, dtype=np.float32)
+        self._ids = np.zeros(0, dtype=np.int64)
+        self._valid = np.zeros(0, dtype=bool)
+        self._size = 0
+        self._positions: Dict[int, int] = {}  # id -> row
+
+        # Inverted lists over rows [0, _clustered): rows grouped by list
+        self.centroids: Optional[np.ndarray] = None
+        self._list_rows = np.zeros(0, dtype=np.int64)
+        self._list_offsets = np.zeros(1, dtype=np.int64)
+        self._clustered = 0
+
+    def __len__(self) -> int:
+        return len(self._positions)
+
+    def __contains__(self, item_id: int) -> bool:
+        return item_id in self._positions
+
+    @property
+    def ids(self) -> np.ndarray:
+        """Ids of every live vector."""
+        return self._ids[:self._size][self._valid[:self._size]]
+
+    # ---------- storage ----------
+
+    def _quantize(self, vectors: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        if self.dtype == "float16":
+            return vectors.astype(np.float16), np.ones(len(vectors), dtype=np.float32)
+        scales = np.abs(vectors).max(axis=1) / 127.0
+        scales = np.maximum(scales, 1e-12).astype(np.float32)
+        codes = np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype(np.int8)
+        return codes, scales
+
+    def _reserve(self, capacity: int):
+        if capacity <= len(self._ids):
+            return
+        capacity = max(capacity, 2 * len(self._ids), 1024)
+        for name in ('_codes', '_scales', '_ids', '_valid'):
+            old = getattr(self, name)
+            grown = np.zeros((capacity,) + old.shape[1:], dtype=old.dtype)
+            grown[:self._size] = old[:self._size]
+            setattr(self, name, grown)
+
+    def add(self, ids: Iterable[int], vectors: np.ndarray):
+        """Insert (or replace) vectors; they are normalised first."""
+        ids = [int(item_id) for item_id in ids]
+        if not ids:
+            return
+        vectors = _normalize(vectors).reshape(len(ids), self.dim)
+
+        # Replaced ids get a fresh row; the old one is tombstoned
+        for item_id in ids:
+            self.remove(item_id)
+
+        codes, scales = self._quantize(vectors)
+        start = self._size
+        self._reserve(start + len(ids))
+        self._codes[start:start + len(ids)] = codes
+        self._scales[start:start + len(ids)] = scales
+        self._ids[start:start + len(ids)] = ids
+        self._valid[start:start + len(ids)] = True
+        self._size += len(ids)
+        self._positions.update(zip(ids, range(start, self._size)))
+
+        if self._needs_training():
+            self.train()
+
+    def remove(self, item_id: int) -> bool:
+        """Tombstone a vector; the row is reclaimed on the next train()."""
+        row = self._positions.pop(item_id, None)
+        if row is None:
+            return False
+        self._valid[row] = False
+        return True
+
+    def clear(self):
+        self._size = 0
+        self._positions.clear()
+        self.centroids = None
+        self._list_rows = np.zeros(0, dtype=np.int64)
+        self._list_offsets = np.zeros(1, dtype=np.int64)
+        self._clustered = 0
+
+    def vectors(self, rows: np.ndarray) -> np.ndarray:
+        """Dequantised float32 vectors for the given rows."""
+        return self._codes[rows].astype(np.float32) * self._scales[rows, None]
+
+    # ---------- training ----------
+
+    def _needs_training(self) -> bool:
+        live = len(self._positions)
+        if live < self.min_train_size:
+            return False
+        pending = self._size - self._clustered
+        return self.centroids is None or pending > IVF_RETRAIN_FRACTION * max(self._clustered, 1)
+
+    def _assign(self, rows: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+        lists = np.empty(len(rows), dtype=np.int64)
+        for start in range(0, len(rows), ASSIGN_BLOCK):
+            block = rows[start:start + ASSIGN_BLOCK]
+            lists[start:start + len(block)] = np.argmax(self.vectors(block) @ centroids.T, axis=1)
+        return lists
+
+    def train(self, seed: int = 0):
+        """
+        Compact away tombstones, run spherical k-means and rebuild the lists.
+
+        Cost is O(iterations x sample x nlist x dim) for training plus one
+        assignment pass over every vector.
+        """
+        live_rows = np.flatnonzero(self._valid[:self._size])
+
+        # Compact: live rows first, in their current order
+        for name in ('_codes', '_scales', '_ids', '_valid'):
+            array = getattr(self, name)
+            array[:len(live_rows)] = array[live_rows]
+        self._size = len(live_rows)
+        self._positions = dict(zip(self._ids[:self._size].tolist(), range(self._size)))
+
+        if self._size < self.min_train_size:
+            self.centroids = None
+            self._list_rows = np.zeros(0, dtype=np.int64)
+            self._list_offsets = np.zeros(1, dtype=np.int64)
+            self._clustered = 0
+            return
+
+        nlist = self.nlist or max(1, int(np.sqrt(self._size)))
+        rng = np.random.default_rng(seed)
+        rows = np.arange(self._size)
+        sample = rows if self._size <= nlist * KMEANS_SAMPLE_PER_LIST else \
+            rng.choice(rows, nlist * KMEANS_SAMPLE_PER_LIST, replace=False)
+        sample_vectors = self.vectors(sample)
+
+        centroids = sample_vectors[rng.choice(len(sample), nlist, replace=False)]
+        for _ in range(KMEANS_ITERATIONS):
+            assignment = np.argmax(sample_vectors @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignment, sample_vectors)
+            empty = np.bincount(assignment, minlength=nlist) == 0
+            # Re-seed empty lists with random sample points
+            sums[empty] = sample_vectors[rng.choice(len(sample), int(empty.sum()))]
+            centroids = _normalize(sums)
+
+        lists = self._assign(rows, centroids)
+        order = np.argsort(lists, kind="stable")
+        self.centroids = centroids.astype(np.float32)
+        self._list_rows = order.astype(np.int64)
+        self._list_offsets = np.concatenate(([0], np.cumsum(np.bincount(lists, minlength=nlist))))
+        self._clustered = self._size
+
+    # ---------- search ----------
+
+    def _candidate_rows(self, query: np.ndarray, nprobe: int) -> np.ndarray:
+        pending = np.arange(self._clustered, self._size)
+        if self.centroids is None:
+            return np.arange(self._size)
+
+        probe = np.argsort(-(self.centroids @ query))[:nprobe]
+        blocks = [self._list_rows[self._list_offsets[i]:self._list_offsets[i + 1]] for i in probe]
+        return np.concatenate(blocks + [pending])
+
+    def search(self, query: np.ndarray, k: int = 5, nprobe: Optional[int] = None,
+               min_score: Optional[float] = None) -> List[Tuple[int, float]]:
+        """
+        Approximate top-k by cosine similarity.
+
+        Args:
+            query: Query embedding (normalised here)
+            k: Number of results
+            nprobe: Lists to scan (defaults to self.nprobe)
+            min_score: Drop results below this similarity
+
+        Returns:
+            List of (id, score), best first
+        """
+        if not self._positions:
+            return []
+
+        query = _normalize(query).reshape(self.dim)
+        rows = self._candidate_rows(query, nprobe or self.nprobe)
+        rows = rows[self._valid[rows]]
+        if not len(rows):
+            return []
+
+        scores = (self._codes[rows].astype(np.float32) @ query) * self._scales[rows]
+        if len(rows) > k:
+            top = np.argpartition(-scores, k - 1)[:k]
+        else:
+            top = np.arange(len(rows))
+        top = top[np.argsort(-scores[top], kind="stable")]
+
+        results = [(int(self._ids[rows[i]]), float(scores[i])) for i in top]
+        if min_score is not None:
+            results = [(item_id, score) for item_id, score in results if score >= min_score]
+        return results
+
+    def get_statistics(self) -> Dict:
+        return {
+            'vectors': len(self._positions),
+            'dtype': self.dtype,
+            'dim': self.dim,
+            'nlist': 0 if self.centroids is None else len(self.centroids),
+            'nprobe': self.nprobe,
+            'pending_rows': self._size - self._clustered,
+            'matrix_bytes': int(self._codes[:self._size].nbytes + self._scales[:self._size].nbytes)
+        }
+
+    # ---------- persistence ----------
+
+    def save(self, path: str, metadata: Optional[Dict[str, np.ndarray]] = None):
+        """Write the live vectors (and extra per-file arrays) to an .npz file."""
+        rows = np.flatnonzero(self._valid[:self._size])
+        arrays = {
+            'ids': self._ids[rows],
+            'codes': self._codes[rows],
+            'scales': self._scales[rows],
+        }
+        if self.centroids is not None:
+            arrays['centroids'] = self.centroids
+        arrays.update(metadata or {})
+
+        with atomic_replace(path, suffix=".npz") as tmp_path:
+            np.savez(tmp_path, **arrays)
+
+    def load(self, path: str) -> Dict[str, np.ndarray]:
+        """Replace the contents with a file written by save(). Returns all arrays."""
+        with np.load(path, allow_pickle=False) as data:
+            arrays = {name: data[name] for name in data.files}
+
+        codes = arrays['codes']
+        if codes.shape[1:] != (self.dim,) or codes.dtype != self._codes.dtype:
+            raise ValueError(f"{path} holds {codes.dtype} vectors of shape {codes.shape[1:]}")
+
+        self.clear()
+        self._codes = codes.copy()
+        self._scales = arrays['scales'].astype(np.float32)
+        self._ids = arrays['ids'].astype(np.int64)
+        self._valid = np.ones(len(self._ids), dtype=bool)
+        self._size = len(self._ids)
+        self._positions = dict(zip(self._ids.tolist(), range(self._size)))
+
+        if 'centroids' in arrays and self._size >= self.min_train_size:
+            centroids = arrays['centroids'].astype(np.float32)
+            lists = self._assign(np.arange(self._size), centroids)
+            self.centroids = centroids
+            self._list_rows = np.argsort(lists, kind="stable").astype(np.int64)
+            self._list_offsets = np.concatenate(([0], np.cumsum(np.bincount(lists, minlength=len(centroids)))))
+            self._clustered = self._size
+        elif self._needs_training():
+            self.train()
+        return arrays
+
+
+class SemanticMatcher:
+    """Embeds verified tweets and finds paraphrases of incoming ones"""
+
+    def __init__(self, model_name: str = SEMANTIC_MODEL_NAME,
+                 similarity_threshold: float = SEMANTIC_MATCH_THRESHOLD,
+                 dtype: str = "int8", nprobe: int = 8, batch_size: int = 64,
+                 device: Optional[str] = None):
+        """
+        Args:
+            model_name: sentence-transformers model name or local path
+            similarity_threshold: Minimum cosine similarity for a match
+            dtype: Stored vector precision ('int8' or 'float16')
+            nprobe: IVF lists scanned per query
+            batch_size: Texts embedded per forward pass
+            device: Torch device for the model (auto-detected if None)
+        """
+        self.model_name = model_name
+        self.similarity_threshold = similarity_threshold
+        self.dtype = dtype
+        self.nprobe = nprobe
+        self.batch_size = batch_size
+        self.device = device
+        self.model = None  # SentenceTransformer, see load_model
+        self.index: Optional[IVFIndex] = None
+        self.index_file = "helper.semantic.npz"
+        # Only one of the processes serving from this directory saves it
+        self.index_lease = WriterLease(self.index_file)
+
+        # tweet_id -> simhash the vector was computed for (detects text edits)
+        self.embedded_hashes: Dict[int, int] = {}
+        self._lock = threading.RLock()
+
+    @property
+    def ready(self) -> bool:
+        return self.model is not None and self.index is not None and len(self.index) > 0
+
+    def load_model(self):
+        """Load the embedding model and an empty (or saved) index."""
+        from sentence_transformers import SentenceTransformer
+
+        print(f"Loading sentence embedding model {self.model_name}...")
+        # A local artifact needs no hub access at startup
+        source, local = resolve_model_source(self.model_name, required_files=SENTENCE_MODEL_FILES)
+        if local:
+            print(f"Loading {self.model_name} from local artifact {source}")
+        self.model = SentenceTransformer(source, device=self.device)
+        dim = self.model.get_sentence_embedding_dimension()
+        self.index = IVFIndex(dim, dtype=self.dtype, nprobe=self.nprobe)
+        self.load_index()
+        print(f"Sentence embedding model loaded (dim={dim}, {len(self.index)} vectors)")
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        """Unit-length float32 embeddings, one row per text."""
+        if not texts:
+            return np.zeros((0, self.index.dim), dtype=np.float32)
+        return self.model.encode(
+            texts,
+            batch_size=self.batch_size,
+            convert_to_numpy=True,
+            normalize_embeddings=True,
+            show_progress_bar=False
+        ).astype(np.float32)
+
+    def sync(self, processed_tweets: Dict) -> Tuple[int, int]:
+        """
+        Bring the vectors in line with the SimHash matcher's records.
+
+        Tweets that are new, or whose hash (i.e. text) changed, are embedded;
+        tweets no longer in `processed_tweets` are dropped. Embedding runs
+        outside the lock, so searches continue meanwhile.
+
+        Args:
+            processed_tweets: SimHashMatcher.processed_tweets (tweet_id -> record)
+
+        Returns:
+            (embedded, removed) counts
+        """
+        if self.model is None:
+            return 0, 0
+
+        with self._lock:
+            snapshot = {tweet_id: (tweet.simhash, tweet) for tweet_id, tweet in list(processed_tweets.items())}
+            stale = [tweet_id for tweet_id in self.embedded_hashes if tweet_id not in snapshot]
+            todo = [(tweet_id, simhash, tweet) for tweet_id, (simhash, tweet) in snapshot.items()
+                    if self.embedded_hashes.get(tweet_id) != simhash]
+
+        start_time = time.time()
+        embedded = 0
+        for start in range(0, len(todo), self.batch_size * 16):
+            chunk = todo[start:start + self.batch_size * 16]
+            vectors = self.embed([tweet.tweet_text for _, _, tweet in chunk])
+            with self._lock:
+                self.index.add([tweet_id for tweet_id, _, _ in chunk], vectors)
+                for tweet_id, simhash, _ in chunk:
+                    self.embedded_hashes[tweet_id] = simhash
+            embedded += len(chunk)
+            if len(todo) > self.batch_size * 16:
+                print(f"Embedded {embedded}/{len(todo)} tweets...")
+
+        with self._lock:
+            for tweet_id in stale:
+                self.index.remove(tweet_id)
+                self.embedded_hashes.pop(tweet_id, None)
+
+        if embedded or stale:
+            print(f"Semantic index sync: {embedded} embedded, {len(stale)} removed "
+                  f"in {time.time() - start_time:.2f} seconds ({len(self.index)} vectors)")
+            self.save_index()
+        return embedded, len(stale)
+
+    def search(self, text: str, k: int = 5, min_score: Optional[float] = None) -> List[Tuple[int, float]]:
+        """
+        Top-k verified tweets by cosine similarity to `text`.
+
+        Returns:
+            List of (tweet_id, score), best first, all >= min_score
+            (defaults to the similarity threshold)
+        """
+        if not self.ready:
+            return []
+
+        query = self.embed([text])[0]
+        with self._lock:
+            return self.index.search(
+                query, k=k,
+                min_score=self.similarity_threshold if min_score is None else min_score
+            )
+
+    def save_index(self):
+        """Persist vectors so a restart only embeds tweets added since (writer process only)."""
+        if not self.index_lease.acquire():
+            return
+        try:
+            with self._lock:
+                ids = np.fromiter(self.embedded_hashes.keys(), dtype=np.int64, count=len(self.embedded_hashes))
+                hashes = np.fromiter(self.embedded_hashes.values(), dtype=np.uint64, count=len(self.embedded_hashes))
+                self.index.save(self.index_file, {
+                    'hash_ids': ids,
+                    'hashes': hashes,
+                    'model_name': np.array(self.model_name)
+                })
+        except Exception as e:
+            print(f"Error saving semantic index: {e}")
+
+    def load_index(self) -> bool:
+        """Load saved vectors if they were produced by the same model."""
+        if not os.path.exists(self.index_file):
+            return False
+        try:
+            with self._lock:
+                arrays = self.index.load(self.index_file)
+                if str(arrays.get('model_name', '')) != self.model_name:
+                    print(f"Semantic index {self.index_file} was built with another model, ignoring it")
+                    self.index.clear()
+                    return False
+                self.embedded_hashes = dict(zip(arrays['hash_ids'].tolist(), arrays['hashes'].tolist()))
+            return True
+        except Exception as e:
+            print(f"Error loading semantic index: {e}")
+            self.index.clear()
+            self.embedded_hashes = {}
+            return False
+
+    def get_statistics(self) -> Dict:
+        if self.index is None:
+            return {'loaded': False}
+        stats = self.index.get_statistics()
+        stats.update({'model': self.model_name, 'similarity_threshold': self.similarity_threshold})
+        return stats
@@ -1,14 +1,19 @@
 import re
 import hashlib
 import json
-import pickle
 import numpy as np
 from typing import List, Tuple, Dict, Set, Optional
 from collections import Counter
-from dataclasses import dataclass, asdict
+from dataclasses import dataclass
+from functools import lru_cache
 import math
 import time
-from datetime import datetime
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from collections import deque
+from contextlib import contextmanager, nullcontext
+from datetime import datetime, timedelta
 import os
 
 # Database imports
@@ -17,7 +22,17 @@ from sqlalchemy.exc import SQLAlchemyError
 from urllib.parse import urlparse
 from sqlalchemy import text 
 
-from database import engine, get_db, Base
+from database import engine, get_db, SessionLocal, Base
+from simhash_index import SimHashIndex, PackedHashArray
+from atomic_files import WriterLease
+from simhash_store import (
+    SimHashSnapshot,
+    SnapshotError,
+    SnapshotWriter,
+    write_snapshot,
+    to_timestamp,
+    from_timestamp
+)
 from models import (
     User,
     ApprovalStatus,
@@ -27,22 +42,258 @@ from models import (
     VerificationStatus
 )
 
-@dataclass
+# Columns every index row is built from, in build_processed_tweet's order
+TWEET_ROWS_SQL = """
+    SELECT 
+        t.tweet_id,
+        t.tweet_text,
+        vr.status,
+        vr.verdict,
+        vr.votes_in_favor_percentage,
+        vr.confidence,
+        vr.factuality,
+        vr.reason,
+        vr.created_at as verification_date,
+        t.submit_date as tweet_date
+    FROM 
+        tweets t
+    INNER JOIN 
+        verification_results vr ON t.tweet_id = vr.tweet_id
+"""
+
+# Rows pulled from the server-side cursor and hashed per batch while building
+INDEX_BUILD_CHUNK_SIZE = 2000
+
+# Worker processes used to hash tweets during full index builds (1 = in-process).
+# The server builds in-process; `python simhash.py --build` builds the
+# snapshot offline with OFFLINE_BUILD_WORKERS processes.
+INDEX_BUILD_WORKERS = 1
+OFFLINE_BUILD_WORKERS = 0  # 0 = every core
+
+# Seconds between throughput reports while building the index
+BUILD_PROGRESS_INTERVAL = 5.0
+
+# Incremental sync re-reads changes from this far before the last watermark,
+# so transactions that committed late (but stamped updated_at earlier) are
+# not missed. Re-applying an unchanged row is a no-op.
+SYNC_OVERLAP_SECONDS = 120
+
+# Every Nth incremental sync also reconciles hard-deleted tweets
+SYNC_RECONCILE_EVERY = 30
+
+# Changed syncs are only written back to the snapshot file on reconcile
+# syncs, or sooner once this many records changed since the last write.
+# Unsaved changes are re-read from the snapshot's watermark after a restart.
+SNAPSHOT_MAX_UNSAVED = 5000
+
+# Number of distinct tokens whose MD5 bit vectors are kept in memory.
+# Frequent Urdu/English tokens are hashed once instead of on every tweet.
+TOKEN_CACHE_SIZE = 50000
+
+# Bit sums within this of zero are treated as ties (bit unset), so the
+# result does not depend on floating-point summation order
+SIMHASH_TIE_EPSILON = 1e-9
+
+
+@lru_cache(maxsize=TOKEN_CACHE_SIZE)
+def token_bit_vector(token: str, hash_bits: int = 64) -> np.ndarray:
+    """
+    Return a read-only +1/-1 vector of the token's MD5 bits.
+    
+    Element i is +1 when bit i of the token hash is set, -1 otherwise - the
+    same bits the original per-bit loop in calculate_simhash used.
+    """
+    hash_bytes = hashlib.md5(token.encode('utf-8')).digest()
+    
+    # Up to 64 bits come from the first 8 bytes; wider hashes reuse the low
+    # 64 bits of the full 128-bit digest (bit i -> i % 64)
+    chunk = hash_bytes[:8] if hash_bits <= 64 else hash_bytes[8:16]
+    
+    # Little-endian bytes + little bit order puts bit i at index i
+    bits = np.unpackbits(np.frombuffer(chunk[::-1], dtype=np.uint8), bitorder='little')
+    if hash_bits != 64:
+        bits = np.resize(bits, hash_bits)
+    
+    vector = bits.astype(np.int8) * 2 - 1
+    vector.setflags(write=False)
+    return vector
+
+
+# Per-process matcher used by parallel index build workers
+_worker_matcher: Optional["SimHashMatcher"] = None
+
+
+def _init_hash_worker(hash_bits: int, stopwords: List[str]):
+    """Process pool initializer: build a matcher with the parent's settings."""
+    global _worker_matcher
+    _worker_matcher = SimHashMatcher(hash_bits=hash_bits)
+    _worker_matcher.stopwords = set(stopwords)
+
+
+def _hash_texts_in_worker(texts: List[str]) -> List[Tuple[int, List[str], str]]:
+    """Preprocess and hash one shard of tweet texts in a pool worker."""
+    # Tokens are not kept by the index, so don't ship them back
+    return [(simhash, [], language)
+            for simhash, _, language in _worker_matcher.calculate_simhash_batch(texts)]
+
+
+class BuildProgress:
+    """Periodic throughput report for long index builds"""
+    
+    def __init__(self, workers: int, interval: float = BUILD_PROGRESS_INTERVAL):
+        self.workers = workers
+        self.interval = interval
+        self.rows = 0
+        self.start_time = time.time()
+        self._last_report = self.start_time
+    
+    def update(self, rows: int):
+        """Count indexed rows and print a report if the interval has passed."""
+        self.rows += rows
+        now = time.time()
+        if now - self._last_report >= self.interval:
+            self._last_report = now
+            print(f"Indexed {self.rows} tweets | {self.rate():,.0f} tweets/s | "
+                  f"{now - self.start_time:.1f}s elapsed | {self.workers} worker(s)")
+    
+    def rate(self) -> float:
+        elapsed = time.time() - self.start_time
+        return self.rows / elapsed if elapsed > 0 else 0.0
+    
+    def summary(self) -> Dict:
+        return {
+            'tweets': self.rows,
+            'seconds': round(time.time() - self.start_time, 3),
+            'tweets_per_second': round(self.rate(), 1),
+            'workers': self.workers
+        }
+
+
+class CodeTable:
+    """Interns a small vocabulary of strings as integer codes (thread-safe)"""
+    
+    def __init__(self):
+        self.values: List[str] = []
+        self.codes: Dict[str, int] = {}
+        self._lock = threading.Lock()
+    
+    def encode(self, value: Optional[str]) -> int:
+        value = value or ""
+        code = self.codes.get(value)
+        if code is None:
+            # Records are built from several threads; new values need one code each
+            with self._lock:
+                code = self.codes.get(value)
+                if code is None:
+                    self.values.append(value)
+                    code = self.codes[value] = len(self.values) - 1
+        return code
+    
+    def decode(self, code: int) -> str:
+        return self.values[code]
+
+
+# Low-cardinality columns are stored on each record as codes into these tables
+STATUS_CODES = CodeTable()
+VERDICT_CODES = CodeTable()
+FACTUALITY_CODES = CodeTable()
+LANGUAGE_CODES = CodeTable()
+
+
 class ProcessedTweet:
-    """Data class for processed tweet data"""
-    tweet_id: int
-    tweet_text: str
-    status: str
-    verdict: str
-    votes_in_favor_percentage: float
-    confidence: float
-    factuality: float
-    reason: str
-    verification_date: datetime
-    tweet_date: datetime
-    simhash: int
-    tokens: List[str]
-    language: str
+    """
+    Compact record for one indexed tweet.
+    
+    Slotted, with status/verdict/factuality/language held as CodeTable codes
+    and dates as epoch microseconds. Tokens are not kept once the tweet is
+    hashed. Text and reason are read lazily from the memory-mapped snapshot
+    when the record was loaded from one (see attach), so the bulk of the
+    corpus lives in shared page cache rather than in each worker's heap.
+    """
+    
+    __slots__ = ('tweet_id', 'simhash', 'votes_in_favor_percentage', 'confidence',
+                 '_status', '_verdict', '_factuality', '_language',
+                 '_verified_at', '_tweet_date', '_text', '_reason', '_snapshot', '_row')
+    
+    def __init__(self, tweet_id: int, tweet_text: Optional[str], status: str, verdict: str,
+                 votes_in_favor_percentage: float, confidence: float, factuality: str,
+                 reason: Optional[str], verification_date: Optional[datetime],
+                 tweet_date: Optional[datetime], simhash: int, language: str):
+        self.tweet_id = tweet_id
+        self.simhash = simhash
+        self.votes_in_favor_percentage = votes_in_favor_percentage
+        self.confidence = confidence
+        self._status = STATUS_CODES.encode(status)
+        self._verdict = VERDICT_CODES.encode(verdict)
+        self._factuality = FACTUALITY_CODES.encode(factuality)
+        self._language = LANGUAGE_CODES.encode(language)
+        self._verified_at = to_timestamp(verification_date)
+        self._tweet_date = to_timestamp(tweet_date)
+        self._text = tweet_text
+        self._reason = reason
+        self._snapshot = None
+        self._row = -1
+    
+    @classmethod
+    def from_snapshot(cls, snapshot: SimHashSnapshot, row: int) -> "ProcessedTweet":
+        """Record for one snapshot row; text and reason stay in the file."""
+        columns = snapshot.columns
+        tweet = cls.__new__(cls)
+        tweet.tweet_id = int(columns['tweet_id'][row])
+        tweet.simhash = int(columns['simhash'][row])
+        tweet.votes_in_favor_percentage = float(columns['votes'][row])
+        tweet.confidence = float(columns['confidence'][row])
+        tweet._status = STATUS_CODES.encode(snapshot.string('status', row))
+        tweet._verdict = VERDICT_CODES.encode(snapshot.string('verdict', row))
+        tweet._factuality = FACTUALITY_CODES.encode(snapshot.string('factuality', row))
+        tweet._language = LANGUAGE_CODES.encode(snapshot.string('language', row))
+        tweet._verified_at = int(columns['verified_at'][row])
+        tweet._tweet_date = int(columns['tweet_date'][row])
+        tweet.attach(snapshot, row)
+        return tweet
+    
+    def attach(self, snapshot: SimHashSnapshot, row: int):
+        """Drop the in-memory text and read it from `row` of the snapshot instead."""
+        self._snapshot = snapshot
+        self._row = row
+        self._text = None
+        self._reason = None
+    
+    @property
+    def tweet_text(self) -> str:
+        if self._text is None and self._snapshot is not None:
+            return self._snapshot.string('text', self._row)
+        return self._text or ""
+    
+    @property
+    def reason(self) -> str:
+        if self._reason is None and self._snapshot is not None:
+            return self._snapshot.string('reason', self._row)
+        return self._reason or ""
+    
+    @property
+    def status(self) -> str:
+        return STATUS_CODES.decode(self._status)
+    
+    @property
+    def verdict(self) -> str:
+        return VERDICT_CODES.decode(self._verdict)
+    
+    @property
+    def factuality(self) -> str:
+        return FACTUALITY_CODES.decode(self._factuality)
+    
+    @property
+    def language(self) -> str:
+        return LANGUAGE_CODES.decode(self._language)
+    
+    @property
+    def verification_date(self) -> Optional[datetime]:
+        return from_timestamp(self._verified_at)
+    
+    @property
+    def tweet_date(self) -> Optional[datetime]:
+        return from_timestamp(self._tweet_date)
 
 @dataclass
 class MatchResult:
@@ -61,25 +312,42 @@ class MatchResult:
 class SimHashMatcher:
     """SimHash-based tweet matching system with database integration"""
     
-    def __init__(self, hash_bits: int = 64, similarity_threshold: float = 0.85):
+    def __init__(self, hash_bits: int = 64, similarity_threshold: float = 0.85,
+                 lsh_probe_radius: int = 1, lsh_bands: Optional[int] = None):
         """
         Initialize SimHash matcher.
         
         Args:
             hash_bits: Number of bits in SimHash (64 recommended)
             similarity_threshold: Threshold for similarity matching (0.85 = 85%)
+            lsh_probe_radius: Bit flips probed per LSH band (see SimHashIndex)
+            lsh_bands: Number of LSH bands; derived from the threshold if None
         """
         self.hash_bits = hash_bits
         self.similarity_threshold = similarity_threshold
         
         # Storage for processed tweets
         self.processed_tweets: Dict[int, ProcessedTweet] = {}
-        self.simhash_index: Dict[int, Set[int]] = {}  # bucket -> set of tweet_ids
+        
+        # Open snapshot that loaded records read their text from
+        self.snapshot: Optional[SimHashSnapshot] = None
         
         # Configuration
-        self.bucket_size = 4  # Use first 4 bits for bucketing (16 buckets)
-        self.helper_file = "helper.txt"
-        self.backup_file = "helper_backup.pkl"
+        self.lsh_probe_radius = lsh_probe_radius
+        self.lsh_bands = lsh_bands
+        self.simhash_index = self._build_index()
+        
+        # Every hash in one contiguous uint64 array for exact brute-force scans
+        self.hash_array = PackedHashArray()
+        
+        # Database time the index is known to be current up to
+        self.sync_watermark: Optional[datetime] = None
+        
+        # Full builds: hashing processes and the last build's throughput
+        self.build_workers = INDEX_BUILD_WORKERS
+        self.last_build: Dict = {}
+        self.helper_file = "helper.simhash"  # binary snapshot (see simhash_store.py)
+        self.legacy_helper_file = "helper.txt"  # old JSON format, read-only
         
         # Language detection patterns
         self.urdu_regex = re.compile(r'[\u0600-\u06FF\u0750-\u077F\u08A0-\u08FF]+')
@@ -177,6 +445,26 @@ class SimHashMatcher:
         
         return tf_weights
     
+    def _token_matrix(self, tokens: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Build the (distinct tokens x hash_bits) +1/-1 bit matrix for a token list
+        together with each token's total weight (occurrences x TF weight).
+        """
+        tf_weights = self.calculate_tf_weight(tokens)
+        token_counts = Counter(tokens)
+        
+        matrix = np.stack([token_bit_vector(token, self.hash_bits) for token in token_counts])
+        weights = np.fromiter(
+            (count * tf_weights[token] for token, count in token_counts.items()),
+            dtype=np.float64,
+            count=len(token_counts)
+        )
+        return matrix, weights
+    
+    def _pack_bits(self, bits: np.ndarray) -> int:
+        """Turn a boolean vector (bit i at index i) into an integer hash."""
+        return int.from_bytes(np.packbits(bits, bitorder='little').tobytes(), 'little')
+    
     def calculate_simhash(self, text: str) -> Tuple[int, List[str], str]:
         """Calculate SimHash for a given text."""
         # Preprocess text
@@ -185,54 +473,107 @@ class SimHashMatcher:
         if not tokens:
             return 0, [], language
         
-        # Calculate TF weights
-        tf_weights = self.calculate_tf_weight(tokens)
+        # Weighted sum of the token bit vectors in one matrix product
+        matrix, weights = self._token_matrix(tokens)
+        vector = weights @ matrix
+        
+        # Generate SimHash from feature vector
+        return self._pack_bits(vector > SIMHASH_TIE_EPSILON), tokens, language
+    
+    def calculate_simhash_batch(self, texts: List[str]) -> List[Tuple[int, List[str], str]]:
+        """
+        Calculate SimHashes for many texts at once.
         
-        # Initialize feature vector
-        vector = np.zeros(self.hash_bits, dtype=np.float64)
+        All token rows are stacked into one matrix and reduced per text with a
+        single np.add.reduceat, which is much faster than hashing one by one.
         
-        for token in tokens:
-            # Get weight for this token
-            weight = tf_weights.get(token, 1.0)
-            
-            # Create MD5 hash for token
-            hash_bytes = hashlib.md5(token.encode('utf-8')).digest()
+        Returns:
+            List of (simhash, tokens, language) in the same order as texts
+        """
+        results: List[Tuple[int, List[str], str]] = []
+        matrices = []
+        weights = []
+        offsets = []
+        positions = []
+        row = 0
+        
+        for position, text in enumerate(texts):
+            tokens, language = self.preprocess_text(text)
+            results.append((0, tokens, language))
             
-            # Convert to integer
-            if self.hash_bits <= 64:
-                hash_int = int.from_bytes(hash_bytes[:8], 'big')
-            else:
-                hash_int = int.from_bytes(hash_bytes[:16], 'big')
+            if not tokens:
+                continue
             
-            # Update feature vector
-            for i in range(self.hash_bits):
-                # Check if i-th bit is set in hash
-                if hash_int & (1 << (i % 64)):
-                    vector[i] += weight
-                else:
-                    vector[i] -= weight
+            matrix, token_weights = self._token_matrix(tokens)
+            matrices.append(matrix)
+            weights.append(token_weights)
+            offsets.append(row)
+            positions.append(position)
+            row += len(token_weights)
         
-        # Generate SimHash from feature vector
-        simhash = 0
-        for i in range(self.hash_bits):
-            if vector[i] > 0:
-                simhash |= 1 << i
+        if not matrices:
+            return results
+        
+        weighted = np.concatenate(matrices) * np.concatenate(weights)[:, None]
+        vectors = np.add.reduceat(weighted, offsets, axis=0)
+        packed = np.packbits(vectors > SIMHASH_TIE_EPSILON, axis=1, bitorder='little')
         
-        return simhash, tokens, language
+        for position, hash_bytes in zip(positions, packed):
+            _, tokens, language = results[position]
+            results[position] = (int.from_bytes(hash_bytes.tobytes(), 'little'), tokens, language)
+        
+        return results
+    
+    def max_hamming_distance(self) -> int:
+        """Largest Hamming distance that still meets the similarity threshold."""
+        return int(math.floor((1.0 - self.similarity_threshold) * self.hash_bits + 1e-9))
     
-    def get_bucket_key(self, simhash: int) -> int:
-        """Get bucket key for indexing (using first few bits)."""
-        return simhash >> (self.hash_bits - self.bucket_size)
+    def _build_index(self) -> SimHashIndex:
+        """Create an empty LSH index sized for the current threshold."""
+        return SimHashIndex(
+            hash_bits=self.hash_bits,
+            max_distance=self.max_hamming_distance(),
+            probe_radius=self.lsh_probe_radius,
+            num_bands=self.lsh_bands
+        )
     
     def hamming_distance(self, hash1: int, hash2: int) -> int:
         """Calculate Hamming distance between two SimHashes."""
-        return bin(hash1 ^ hash2).count('1')
+        return (hash1 ^ hash2).bit_count()
     
     def similarity_score(self, hash1: int, hash2: int) -> float:
         """Calculate similarity score from 0 to 1."""
         distance = self.hamming_distance(hash1, hash2)
         return 1.0 - (distance / self.hash_bits)
     
+    def fetch_tweet_from_db(self, db: Session, tweet_id: int) -> Optional[Tuple]:
+        """
+        Fetch the newest verified row for a single tweet.
+        
+        Same rule as full builds and fetch_changes_since: a tweet belongs in
+        the index while it has any verified result, and the newest verified
+        result supplies its verdict.
+        
+        Returns:
+            Row tuple in the same column order as fetch_tweets_from_db, or
+            None if the tweet has no verified result
+        """
+        try:
+            query = text(TWEET_ROWS_SQL + """
+                WHERE 
+                    t.tweet_id = :tweet_id
+                    AND vr.status = 'verified'
+                ORDER BY 
+                    vr.created_at DESC
+                LIMIT 1;
+            """)
+            
+            return db.execute(query, {"tweet_id": tweet_id}).fetchone()
+            
+        except SQLAlchemyError as e:
+            print(f"Error fetching tweet {tweet_id} from database: {e}")
+            return None
+    
     def fetch_tweets_from_db(self, db: Session) -> List[Tuple]:
         """
         Fetch verified tweets from database using the specified query.
@@ -242,22 +583,7 @@ class SimHashMatcher:
         """
         try:
             # Execute the SQL query - WRAP WITH text()
-            query = text("""
-                SELECT 
-                    t.tweet_id,
-                    t.tweet_text,
-                    vr.status,
-                    vr.verdict,
-                    vr.votes_in_favor_percentage,
-                    vr.confidence,
-                    vr.factuality,
-                    vr.reason,
-                    vr.created_at as verification_date,
-                    t.submit_date as tweet_date
-                FROM 
-                    tweets t
-                INNER JOIN 
-                    verification_results vr ON t.tweet_id = vr.tweet_id
+            query = text(TWEET_ROWS_SQL + """
                 WHERE 
                     vr.status = 'verified'
                 ORDER BY 
@@ -277,10 +603,124 @@ class SimHashMatcher:
             traceback.print_exc()
             return []
     
-    def process_and_index_tweets(self, db: Session) -> int:
+    def fetch_db_time(self, db: Session) -> datetime:
+        """Current database time, used as the sync watermark."""
+        return db.execute(text("SELECT LOCALTIMESTAMP")).scalar()
+    
+    def fetch_changes_since(self, db: Session, since: datetime) -> Tuple[List[Tuple], Set[int]]:
+        """
+        Fetch tweets whose verification results changed after a watermark.
+        
+        Returns:
+            (rows, changed_ids) - rows holds the newest verified row of every
+            changed tweet that is still verified; changed tweets missing from
+            rows are no longer verified (tombstones)
+        """
+        changed_ids = set(db.execute(text("""
+            SELECT DISTINCT tweet_id
+            FROM verification_results
+            WHERE updated_at > :since;
+        """), {"since": since}).scalars().all())
+        
+        if not changed_ids:
+            return [], changed_ids
+        
+        rows = db.execute(text(TWEET_ROWS_SQL + """
+            WHERE 
+                vr.status = 'verified'
+                AND t.tweet_id IN (
+                    SELECT tweet_id
+                    FROM verification_results
+                    WHERE updated_at > :since
+                )
+            ORDER BY 
+                t.tweet_id,
+                vr.created_at;
+        """), {"since": since}).fetchall()
+        
+        return rows, changed_ids
+    
+    def fetch_verified_ids(self, db: Session) -> Set[int]:
+        """Ids of every tweet that currently has a verified result."""
+        return set(db.execute(text("""
+            SELECT DISTINCT tweet_id
+            FROM verification_results
+            WHERE status = 'verified';
+        """)).scalars().all())
+    
+    def iter_tweets_from_db(self, db: Session, chunk_size: int = INDEX_BUILD_CHUNK_SIZE):
+        """
+        Stream verified tweets from the database in chunks.
+        
+        Uses a server-side cursor, so only one chunk of rows is held in
+        memory at a time no matter how large the verified corpus is.
+        
+        Yields:
+            Lists of up to chunk_size row tuples (fetch_tweets_from_db order)
+        """
+        # Newest verification last per tweet, so it is the one that survives
+        query = text(TWEET_ROWS_SQL + """
+            WHERE 
+                vr.status = 'verified'
+            ORDER BY 
+                t.tweet_id,
+                vr.created_at;
+        """).execution_options(stream_results=True)
+        
+        result = db.execute(query)
+        try:
+            for partition in result.partitions(chunk_size):
+                yield partition
+        finally:
+            result.close()
+    
+    def _hash_chunks(self, chunks, workers: int):
+        """
+        Yield (chunk, hashed) pairs for a stream of row chunks, in order.
+        
+        With more than one worker the chunks are sharded across a process
+        pool; at most 2 x workers shards are in flight so memory stays bounded.
+        """
+        if workers <= 1:
+            for chunk in chunks:
+                yield chunk, self.calculate_simhash_batch([row[1] for row in chunk])
+            return
+        
+        # spawn: forking a server process that already runs threads (uvicorn,
+        # torch) is not safe
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_hash_worker,
+            initargs=(self.hash_bits, sorted(self.stopwords))
+        ) as pool:
+            pending = deque()
+            for chunk in chunks:
+                pending.append((chunk, pool.submit(_hash_texts_in_worker, [row[1] for row in chunk])))
+                if len(pending) >= 2 * workers:
+                    chunk, future = pending.popleft()
+                    yield chunk, future.result()
+            
+            while pending:
+                chunk, future = pending.popleft()
+                yield chunk, future.result()
+    
+    def process_and_index_tweets(self, db: Session, chunk_size: int = INDEX_BUILD_CHUNK_SIZE,
+                                 workers: Optional[int] = None, save_snapshot: bool = True) -> int:
         """
         Process tweets from database, calculate SimHashes, and build index.
         
+        Rows are streamed and hashed chunk by chunk (calculate_simhash_batch),
+        and each chunk is appended to the snapshot file as soon as it is
+        indexed, so memory use does not grow with a fetched result set.
+        
+        Args:
+            db: Database session
+            chunk_size: Rows per streamed chunk / hashing shard
+            workers: Hashing processes (defaults to self.build_workers)
+            save_snapshot: Write the snapshot file; processes that are not
+                its writer keep the records' text in memory instead
+        
         Returns:
             Number of tweets processed
         """
@@ -289,126 +729,309 @@ class SimHashMatcher:
         # Clear existing data
         self.processed_tweets.clear()
         self.simhash_index.clear()
+        self.hash_array.clear()
         
-        # Fetch tweets from database
-        tweets_data = self.fetch_tweets_from_db(db)
-        
-        if not tweets_data:
-            print("No tweets found in database")
+        # Anything that changes while we scan is picked up by the next sync
+        try:
+            self.sync_watermark = self.fetch_db_time(db)
+        except SQLAlchemyError as e:
+            print(f"Error fetching tweets from database: {e}")
             return 0
         
+        workers = self.build_workers if workers is None else workers
+        workers = max(1, workers or os.cpu_count() or 1)
+        
+        writer = SnapshotWriter(self.helper_file, self.hash_bits, self._snapshot_config()) if save_snapshot else None
         processed_count = 0
+        progress = BuildProgress(workers)
         
-        for row in tweets_data:
-            try:
-                # Unpack row data
-                (tweet_id, tweet_text, status, verdict, votes_in_favor_percentage,
-                 confidence, factuality, reason, verification_date, tweet_date) = row
-                
-                # Calculate SimHash
-                simhash, tokens, language = self.calculate_simhash(tweet_text)
-                
-                # Create ProcessedTweet object
-                processed_tweet = ProcessedTweet(
-                    tweet_id=tweet_id,
-                    tweet_text=tweet_text,
-                    status=status,
-                    verdict=verdict,
-                    votes_in_favor_percentage=float(votes_in_favor_percentage or 0),
-                    confidence=float(confidence or 0),
-                    factuality= factuality,
-                    reason=reason or "",
-                    verification_date=verification_date,
-                    tweet_date=tweet_date,
-                    simhash=simhash,
-                    tokens=tokens,
-                    language=language
-                )
-                
-                # Store in memory
-                self.processed_tweets[tweet_id] = processed_tweet
-                
-                # Add to bucket index
-                bucket_key = self.get_bucket_key(simhash)
-                if bucket_key not in self.simhash_index:
-                    self.simhash_index[bucket_key] = set()
-                self.simhash_index[bucket_key].add(tweet_id)
+        try:
+            chunks = self.iter_tweets_from_db(db, chunk_size)
+            for chunk, hashed in self._hash_chunks(chunks, workers):
+                indexed = []
                 
-                processed_count += 1
+                for row, row_hash in zip(chunk, hashed):
+                    try:
+                        processed_tweet = self.build_processed_tweet(row, row_hash)
+                        self.add_tweet(processed_tweet)
+                        indexed.append(processed_tweet)
+                    except Exception as e:
+                        print(f"Error processing tweet {row[0]}: {e}")
+                        continue
                 
-                # Progress indicator
-                if processed_count % 100 == 0:
-                    print(f"Processed {processed_count} tweets...")
-                    
-            except Exception as e:
-                print(f"Error processing tweet {tweet_id}: {e}")
-                continue
+                if writer is not None:
+                    writer.append(indexed)
+                processed_count += len(indexed)
+                progress.update(len(indexed))
+            
+        except SQLAlchemyError as e:
+            print(f"Error fetching tweets from database: {e}")
+            if writer is not None:
+                writer.abort()
+            return 0
         
-        print(f"Successfully processed {processed_count} tweets")
+        except Exception:
+            if writer is not None:
+                writer.abort()
+            raise
         
-        # Save to helper file
-        self.save_to_helper_file()
+        if not processed_count:
+            print("No tweets found in database")
+            if writer is not None:
+                writer.abort()
+            return 0
+        
+        # Save to helper file, then serve text from it instead of the heap
+        if writer is not None:
+            writer.close()
+            self._attach_snapshot()
+        
+        self.last_build = progress.summary()
+        print(f"Successfully processed {processed_count} tweets in {self.last_build['seconds']:.2f} seconds "
+              f"({self.last_build['tweets_per_second']:,.0f} tweets/s, {workers} worker(s))")
+        if writer is not None:
+            print(f"Saved {processed_count} processed tweets to {self.helper_file}")
         
         return processed_count
     
-    def save_to_helper_file(self):
-        """Save processed tweets to helper file."""
-        try:
-            # Prepare data for serialization
-            data_to_save = {
-                'processed_tweets': {},
-                'simhash_index': {},
-                'config': {
-                    'hash_bits': self.hash_bits,
-                    'similarity_threshold': self.similarity_threshold,
-                    'bucket_size': self.bucket_size
-                }
-            }
+    def build_processed_tweet(self, row: Tuple,
+                              hashed: Optional[Tuple[int, List[str], str]] = None) -> ProcessedTweet:
+        """
+        Hash a database row and wrap it in a ProcessedTweet.
+        
+        Args:
+            row: Row tuple in fetch_tweets_from_db order
+            hashed: Precomputed (simhash, tokens, language), e.g. from a batch
+        """
+        # Unpack row data
+        (tweet_id, tweet_text, status, verdict, votes_in_favor_percentage,
+         confidence, factuality, reason, verification_date, tweet_date) = row
+        
+        # Calculate SimHash (tokens are only needed for hashing)
+        simhash, _, language = hashed or self.calculate_simhash(tweet_text)
+        
+        return ProcessedTweet(
+            tweet_id=tweet_id,
+            tweet_text=tweet_text,
+            status=status,
+            verdict=verdict,
+            votes_in_favor_percentage=float(votes_in_favor_percentage or 0),
+            confidence=float(confidence or 0),
+            factuality=factuality,
+            reason=reason or "",
+            verification_date=verification_date,
+            tweet_date=tweet_date,
+            simhash=simhash,
+            language=language
+        )
+    
+    def add_tweet(self, processed_tweet: ProcessedTweet):
+        """Insert or replace a single tweet in memory and in the LSH index."""
+        tweet_id = processed_tweet.tweet_id
+        
+        # Drop the old index entry first in case the text (and hash) changed
+        if tweet_id in self.processed_tweets:
+            self.remove_tweet(tweet_id)
+        
+        # Store in memory
+        self.processed_tweets[tweet_id] = processed_tweet
+        
+        # Add to LSH index and packed scan array
+        self.simhash_index.add(tweet_id, processed_tweet.simhash)
+        self.hash_array.add(tweet_id, processed_tweet.simhash)
+    
+    def remove_tweet(self, tweet_id: int) -> bool:
+        """
+        Remove a single tweet from memory and from the LSH index.
+        
+        Returns:
+            True if the tweet was indexed, False otherwise
+        """
+        processed_tweet = self.processed_tweets.pop(tweet_id, None)
+        if processed_tweet is None:
+            return False
+        
+        self.simhash_index.remove(tweet_id)
+        self.hash_array.remove(tweet_id)
+        return True
+    
+    def apply_changes(self, rows: List[Tuple], hashed: List[Tuple[int, List[str], str]],
+                      changed_ids: Set[int]) -> Tuple[int, int]:
+        """
+        Merge rows from fetch_changes_since into the live index.
+        
+        Args:
+            rows: Still-verified rows of changed tweets
+            hashed: calculate_simhash_batch output for the rows' texts
+            changed_ids: Every tweet id whose verification changed
             
-            # Convert ProcessedTweet objects to dictionaries
-            for tweet_id, processed_tweet in self.processed_tweets.items():
-                data_to_save['processed_tweets'][tweet_id] = asdict(processed_tweet)
-                # Convert datetime objects to strings
-                data_to_save['processed_tweets'][tweet_id]['verification_date'] = \
-                    processed_tweet.verification_date.isoformat() if processed_tweet.verification_date else None
-                data_to_save['processed_tweets'][tweet_id]['tweet_date'] = \
-                    processed_tweet.tweet_date.isoformat() if processed_tweet.tweet_date else None
+        Returns:
+            (upserted, removed) counts
+        """
+        upserted = removed = 0
+        still_verified = set()
+        
+        for row, row_hash in zip(rows, hashed):
+            tweet_id = row[0]
+            still_verified.add(tweet_id)
             
-            # Save simhash index
-            data_to_save['simhash_index'] = {k: list(v) for k, v in self.simhash_index.items()}
+            existing = self.processed_tweets.get(tweet_id)
+            processed_tweet = self.build_processed_tweet(row, row_hash)
+            if (existing is not None
+                    and existing.simhash == processed_tweet.simhash
+                    and existing.verdict == processed_tweet.verdict
+                    and existing.votes_in_favor_percentage == processed_tweet.votes_in_favor_percentage
+                    and existing.confidence == processed_tweet.confidence):
+                continue
             
-            # Save to JSON file
-            with open(self.helper_file, 'w', encoding='utf-8') as f:
-                json.dump(data_to_save, f, ensure_ascii=False, indent=2)
+            self.add_tweet(processed_tweet)
+            upserted += 1
+        
+        for tweet_id in changed_ids - still_verified:
+            if self.remove_tweet(tweet_id):
+                removed += 1
+        
+        return upserted, removed
+    
+    def remove_missing(self, verified_ids: Set[int]) -> int:
+        """Drop indexed tweets that are no longer verified in the database."""
+        stale = [tweet_id for tweet_id in self.processed_tweets if tweet_id not in verified_ids]
+        for tweet_id in stale:
+            self.remove_tweet(tweet_id)
+        return len(stale)
+    
+    def save_to_helper_file(self, tweets: Optional[List[ProcessedTweet]] = None,
+                            config: Optional[Dict] = None):
+        """
+        Save processed tweets to the binary snapshot file.
+        
+        Args:
+            tweets: Records to write (defaults to everything in memory); pass a
+                copied list when the index may change while writing
+            config: Snapshot settings taken together with the copied list, so
+                the stored watermark matches the records written
+        """
+        try:
+            count = write_snapshot(
+                self.helper_file,
+                self.processed_tweets.values() if tweets is None else tweets,
+                hash_bits=self.hash_bits,
+                config=self._snapshot_config() if config is None else config
+            )
+            print(f"Saved {count} processed tweets to {self.helper_file}")
             
-            # Also save backup using pickle for faster loading
-            with open(self.backup_file, 'wb') as f:
-                pickle.dump(self.processed_tweets, f)
+        except Exception as e:
+            print(f"Error saving to helper file: {e}")
+    
+    def _attach_snapshot(self, verify_checksum: bool = True, lock=None):
+        """
+        Point in-memory records at the snapshot just written.
+        
+        Rows are matched by tweet id and hash; records still holding their
+        own text are only attached if it matches the file, so anything that
+        changed since the file was written keeps its newer values. The file
+        is checksummed first: records must never be pointed at a torn file.
+        
+        Args:
+            verify_checksum: Check the file's CRC32 before using it
+            lock: Lock guarding the index. Opening, checksumming and
+                comparing the file happen without it; it is only held while
+                the records are re-pointed.
+        """
+        try:
+            snapshot = SimHashSnapshot(self.helper_file, verify_checksum=verify_checksum)
+        except (OSError, SnapshotError) as e:
+            print(f"Error reopening helper file: {e}")
+            return
+        
+        attachments = []
+        tweet_ids = snapshot.tweet_ids
+        simhashes = snapshot.simhashes
+        for row in range(len(snapshot)):
+            processed_tweet = self.processed_tweets.get(int(tweet_ids[row]))
+            if processed_tweet is None or processed_tweet.simhash != int(simhashes[row]):
+                continue
+            if processed_tweet._snapshot is None and (
+                    processed_tweet.tweet_text != snapshot.string('text', row)
+                    or processed_tweet.reason != snapshot.string('reason', row)):
+                continue
+            attachments.append((processed_tweet, row))
+        
+        with lock or nullcontext():
+            for processed_tweet, row in attachments:
+                # Records are replaced, never edited: skip any replaced meanwhile
+                if self.processed_tweets.get(processed_tweet.tweet_id) is processed_tweet:
+                    processed_tweet.attach(snapshot, row)
+            self.snapshot = snapshot
+    
+    def _snapshot_config(self) -> Dict:
+        """Matcher settings stored alongside the snapshot."""
+        return {
+            'hash_bits': self.hash_bits,
+            'similarity_threshold': self.similarity_threshold,
+            'lsh_probe_radius': self.lsh_probe_radius,
+            'lsh_bands': self.lsh_bands,
+            'sync_watermark': self.sync_watermark.isoformat() if self.sync_watermark else None
+        }
+    
+    def _apply_snapshot_config(self, config: Dict):
+        """Adopt settings from a loaded snapshot and reset the index."""
+        self.hash_bits = config.get('hash_bits', 64)
+        self.similarity_threshold = config.get('similarity_threshold', 0.85)
+        self.lsh_probe_radius = config.get('lsh_probe_radius', self.lsh_probe_radius)
+        self.lsh_bands = config.get('lsh_bands', self.lsh_bands)
+        self.simhash_index = self._build_index()
+        self.hash_array.clear()
+        
+        watermark = config.get('sync_watermark')
+        self.sync_watermark = datetime.fromisoformat(watermark) if watermark else None
+    
+    def load_from_helper_file(self, verify_checksum: bool = True) -> bool:
+        """
+        Load processed tweets from the binary snapshot file.
+        
+        Falls back to the legacy helper.txt JSON if no snapshot exists yet.
+        """
+        if not os.path.exists(self.helper_file):
+            print(f"Helper file {self.helper_file} not found")
+            return self.load_from_legacy_helper_file()
+        
+        try:
+            snapshot = SimHashSnapshot(self.helper_file, verify_checksum=verify_checksum)
+        except (OSError, SnapshotError) as e:
+            print(f"Error loading from helper file: {e}")
+            return False
+        
+        try:
+            self.processed_tweets.clear()
+            self._apply_snapshot_config(snapshot.config)
             
-            print(f"Saved {len(self.processed_tweets)} processed tweets to {self.helper_file}")
+            # Records keep a reference to the map; it stays open while they live
+            for row in range(len(snapshot)):
+                self.add_tweet(ProcessedTweet.from_snapshot(snapshot, row))
             
+            self.snapshot = snapshot
+            print(f"Loaded {len(self.processed_tweets)} processed tweets from {self.helper_file}")
+            return True
+        
         except Exception as e:
-            print(f"Error saving to helper file: {e}")
+            print(f"Error loading from helper file: {e}")
+            return False
     
-    def load_from_helper_file(self) -> bool:
-        """Load processed tweets from helper file."""
+    def load_from_legacy_helper_file(self) -> bool:
+        """Load processed tweets from the old helper.txt JSON format."""
         try:
-            if not os.path.exists(self.helper_file):
-                print(f"Helper file {self.helper_file} not found")
+            if not os.path.exists(self.legacy_helper_file):
                 return False
             
-            with open(self.helper_file, 'r', encoding='utf-8') as f:
+            with open(self.legacy_helper_file, 'r', encoding='utf-8') as f:
                 data = json.load(f)
             
             # Clear existing data
             self.processed_tweets.clear()
-            self.simhash_index.clear()
             
-            # Load configuration
-            config = data.get('config', {})
-            self.hash_bits = config.get('hash_bits', 64)
-            self.similarity_threshold = config.get('similarity_threshold', 0.85)
-            self.bucket_size = config.get('bucket_size', 4)
+            # Load configuration (the LSH index is rebuilt from the hashes)
+            self._apply_snapshot_config(data.get('config', {}))
             
             # Load processed tweets
             for tweet_id_str, tweet_data in data.get('processed_tweets', {}).items():
@@ -435,61 +1058,35 @@ class SimHashMatcher:
                         verification_date=verification_date,
                         tweet_date=tweet_date,
                         simhash=tweet_data['simhash'],
-                        tokens=tweet_data['tokens'],
                         language=tweet_data['language']
                     )
                     
-                    self.processed_tweets[tweet_id] = processed_tweet
+                    self.add_tweet(processed_tweet)
                     
                 except Exception as e:
                     print(f"Error loading tweet {tweet_id_str}: {e}")
                     continue
             
-            # Load simhash index
-            simhash_index_data = data.get('simhash_index', {})
-            for bucket_key_str, tweet_ids in simhash_index_data.items():
-                bucket_key = int(bucket_key_str)
-                self.simhash_index[bucket_key] = set(tweet_ids)
-            
-            print(f"Loaded {len(self.processed_tweets)} processed tweets from {self.helper_file}")
-            return True
-            
-        except Exception as e:
-            print(f"Error loading from helper file: {e}")
-            # Try loading from pickle backup
-            return self.load_from_backup()
-    
-    def load_from_backup(self) -> bool:
-        """Load processed tweets from pickle backup."""
-        try:
-            if not os.path.exists(self.backup_file):
-                return False
-            
-            with open(self.backup_file, 'rb') as f:
-                self.processed_tweets = pickle.load(f)
-            
-            # Rebuild simhash index
-            self.simhash_index.clear()
-            for tweet_id, processed_tweet in self.processed_tweets.items():
-                bucket_key = self.get_bucket_key(processed_tweet.simhash)
-                if bucket_key not in self.simhash_index:
-                    self.simhash_index[bucket_key] = set()
-                self.simhash_index[bucket_key].add(tweet_id)
-            
-            print(f"Loaded {len(self.processed_tweets)} processed tweets from backup")
+            print(f"Loaded {len(self.processed_tweets)} processed tweets from {self.legacy_helper_file}")
             return True
             
         except Exception as e:
-            print(f"Error loading from backup: {e}")
+            print(f"Error loading from legacy helper file: {e}")
             return False
     
-    def find_matches(self, new_tweet_text: str, max_results: int = 10) -> List[MatchResult]:
+    def find_matches(self, new_tweet_text: str, max_results: int = 10,
+                     lsh_bands: Optional[int] = None,
+                     lsh_probe_radius: Optional[int] = None,
+                     use_scan: bool = False) -> List[MatchResult]:
         """
         Find matching tweets for new incoming tweet.
         
         Args:
             new_tweet_text: Text of the new tweet
             max_results: Maximum number of results to return
+            lsh_bands: Probe only this many LSH bands (cheaper, lower recall)
+            lsh_probe_radius: Override the per-band probe radius
+            use_scan: Brute-force scan the packed hash array instead of the index
             
         Returns:
             List of MatchResult objects for tweets with similarity >= threshold
@@ -503,16 +1100,17 @@ class SimHashMatcher:
         try:
             # Calculate SimHash for new tweet
             new_simhash, _, _ = self.calculate_simhash(new_tweet_text)
-            query_bucket = self.get_bucket_key(new_simhash)
             
-            # Get candidate tweets from same and nearby buckets
-            candidates = set()
-            
-            # Check current bucket and nearby buckets (for fuzzy matching)
-            for offset in range(-1, 2):  # Check -1, 0, +1 buckets
-                bucket_key = query_bucket + offset
-                if bucket_key in self.simhash_index:
-                    candidates.update(self.simhash_index[bucket_key])
+            # Every tweet within the threshold's Hamming radius, closest first
+            if use_scan:
+                candidates = self.hash_array.radius(new_simhash, self.max_hamming_distance())
+            else:
+                candidates = self.simhash_index.query(
+                    new_simhash,
+                    max_distance=self.max_hamming_distance(),
+                    bands=lsh_bands,
+                    probe_radius=lsh_probe_radius
+                )
             
             if not candidates:
                 print("No candidates found for matching")
@@ -521,9 +1119,9 @@ class SimHashMatcher:
             # Calculate similarity for each candidate
             matches = []
             
-            for tweet_id in candidates:
+            for tweet_id, distance in candidates[:max_results]:
                 processed_tweet = self.processed_tweets[tweet_id]
-                similarity = self.similarity_score(new_simhash, processed_tweet.simhash)
+                similarity = 1.0 - (distance / self.hash_bits)
                 
                 if similarity >= self.similarity_threshold:
                     match_result = MatchResult(
@@ -547,7 +1145,7 @@ class SimHashMatcher:
             processing_time = end_time - start_time
             
             print(f"Found {len(matches)} matches in {processing_time:.3f} seconds")
-            print(f"Processed {len(candidates)} candidates from {len(set([self.get_bucket_key(self.processed_tweets[tid].simhash) for tid in candidates]))} buckets")
+            print(f"Checked {len(candidates)} candidates within Hamming distance {self.max_hamming_distance()}")
             
             return matches[:max_results]
             
@@ -555,6 +1153,65 @@ class SimHashMatcher:
             print(f"Error finding matches: {e}")
             return []
     
+    def scan_matches(self, simhash: int, top_k: Optional[int] = None,
+                     max_distance: Optional[int] = None) -> List[Tuple[int, int]]:
+        """
+        Exact brute-force search over every indexed hash.
+        
+        Args:
+            simhash: Query hash
+            top_k: Return only the k closest tweets
+            max_distance: Return only tweets within this Hamming distance
+                (defaults to the similarity threshold's radius when top_k is None)
+            
+        Returns:
+            List of (tweet_id, hamming_distance), closest first
+        """
+        if top_k is None:
+            if max_distance is None:
+                max_distance = self.max_hamming_distance()
+            return self.hash_array.radius(simhash, max_distance)
+        
+        results = self.hash_array.top_k(simhash, top_k)
+        if max_distance is not None:
+            results = [(tweet_id, distance) for tweet_id, distance in results if distance <= max_distance]
+        return results
+    
+    def scan_matches_batch(self, simhashes: List[int], top_k: Optional[int] = None,
+                           max_distance: Optional[int] = None) -> List[List[Tuple[int, int]]]:
+        """Batched scan_matches: one result list per query hash."""
+        if top_k is None and max_distance is None:
+            max_distance = self.max_hamming_distance()
+        return self.hash_array.batch_scan(simhashes, k=top_k, max_distance=max_distance)
+    
+    def measure_lsh_recall(self, simhashes: List[int], lsh_bands: Optional[int] = None,
+                           lsh_probe_radius: Optional[int] = None) -> Dict:
+        """
+        Compare LSH lookups against an exact scan for a set of query hashes.
+        
+        Returns:
+            Dictionary with recall, missed pair count and average candidates
+        """
+        max_distance = self.max_hamming_distance()
+        exact = self.scan_matches_batch(simhashes, max_distance=max_distance)
+        
+        expected = found = 0
+        candidates = 0
+        for simhash, truth in zip(simhashes, exact):
+            truth_ids = {tweet_id for tweet_id, _ in truth}
+            lsh_ids = {tweet_id for tweet_id, _ in self.simhash_index.query(
+                simhash, max_distance, bands=lsh_bands, probe_radius=lsh_probe_radius)}
+            candidates += len(self.simhash_index.candidates(simhash, lsh_bands, lsh_probe_radius))
+            expected += len(truth_ids)
+            found += len(truth_ids & lsh_ids)
+        
+        return {
+            'queries': len(simhashes),
+            'recall': found / expected if expected else 1.0,
+            'missed': expected - found,
+            'avg_candidates': candidates / len(simhashes) if simhashes else 0
+        }
+    
     def match_new_tweet(self, new_tweet_text: str) -> Dict:
         """
         Main function to match a new incoming tweet.
@@ -618,17 +1275,13 @@ class SimHashMatcher:
             lang = tweet.language
             languages[lang] = languages.get(lang, 0) + 1
         
-        # Bucket distribution
-        bucket_stats = {}
-        for bucket_key, tweet_ids in self.simhash_index.items():
-            bucket_stats[bucket_key] = len(tweet_ids)
-        
         return {
             'total_tweets': total_tweets,
             'language_distribution': languages,
-            'bucket_distribution': bucket_stats,
-            'total_buckets': len(self.simhash_index),
-            'avg_tweets_per_bucket': total_tweets / len(self.simhash_index) if self.simhash_index else 0,
+            'lsh_index': self.simhash_index.get_statistics(),
+            'max_hamming_distance': self.max_hamming_distance(),
+            'token_cache': token_bit_vector.cache_info()._asdict(),
+            'last_build': self.last_build,
             'hash_bits': self.hash_bits,
             'similarity_threshold': self.similarity_threshold
         }
@@ -639,10 +1292,53 @@ class SimHashMatcher:
 class TweetMatchingSystem:
     """Main application class for tweet matching system"""
     
-    def __init__(self, db_session: Session = None):
+    def __init__(self, db_session: Session = None, session_factory=SessionLocal,
+                 build_workers: int = INDEX_BUILD_WORKERS, semantic_matcher=None):
+        """
+        Args:
+            db_session: Session to use for all database work (optional)
+            session_factory: Used to open a short-lived session when no
+                db_session is given, e.g. for the long-lived app-wide instance
+            build_workers: Hashing processes for full rebuilds (0 = all cores)
+            semantic_matcher: Optional SemanticMatcher (semantic_index.py) used
+                as a paraphrase stage after SimHash
+        """
         self.matcher = SimHashMatcher(hash_bits=64, similarity_threshold=0.85)
+        self.matcher.build_workers = build_workers
+        self.semantic_matcher = semantic_matcher
         self.db_session = db_session
+        self.session_factory = session_factory
         self.initialized = False
+        self.sync_count = 0
+        self.unsaved_changes = 0
+        
+        # Guards the matcher while incremental updates and lookups interleave
+        self._lock = threading.RLock()
+        
+        # Of all processes serving from this directory, only the lease
+        # holder rewrites the snapshot file (see atomic_files.py)
+        self.snapshot_lease = WriterLease(self.matcher.helper_file)
+    
+    def is_snapshot_writer(self) -> bool:
+        """Whether this process writes the snapshot (claims the role if it is free)."""
+        return self.snapshot_lease.acquire()
+    
+    @contextmanager
+    def _session(self):
+        """Yield the bound session, or a fresh one that is closed afterwards."""
+        if self.db_session is not None:
+            yield self.db_session
+            return
+        
+        if self.session_factory is None:
+            yield None
+            return
+        
+        db = self.session_factory()
+        try:
+            yield db
+        finally:
+            db.close()
     
     def initialize(self, force_reload: bool = True) -> bool:
         """
@@ -656,26 +1352,40 @@ class TweetMatchingSystem:
         """
         print("Initializing Tweet Matching System...")
         
-        # Try to load from helper file first (unless force_reload is True)
-        if not force_reload and self.matcher.load_from_helper_file():
-            print("Successfully loaded from helper file")
-            self.initialized = True
-            return True
-        
-        # If helper file doesn't exist or force_reload is True, process from database
-        if self.db_session:
-            print("Processing tweets from database...")
-            count = self.matcher.process_and_index_tweets(self.db_session)
+        with self._lock:
+            # Try to load from helper file first (unless force_reload is True)
+            if not force_reload and self.matcher.load_from_helper_file():
+                print("Successfully loaded from helper file")
+                self.initialized = True
+                
+                # Catch up on whatever changed since the snapshot was written
+                if self.matcher.sync_watermark is not None:
+                    self.sync_changes()
+                    return True
+                
+                print("Snapshot has no sync watermark, rebuilding from database...")
+            
+            # If helper file doesn't exist or force_reload is True, process from database
+            with self._session() as db:
+                if db is None:
+                    print("No database session provided and helper file not found")
+                    return False
+                
+                print("Processing tweets from database...")
+                count = self.matcher.process_and_index_tweets(db, save_snapshot=self.is_snapshot_writer())
             
             if count > 0:
                 self.initialized = True
                 print(f"Successfully initialized with {count} tweets")
                 return True
-            else:
-                print("Failed to process tweets from database")
-                return False
-        else:
-            print("No database session provided and helper file not found")
+            
+            # Database unavailable or empty - fall back to the last snapshot
+            if self.matcher.load_from_helper_file():
+                print("Database returned no tweets, loaded from helper file instead")
+                self.initialized = True
+                return True
+            
+            print("Failed to process tweets from database")
             return False
     
     def match_tweet(self, tweet_text: str) -> Dict:
@@ -696,31 +1406,265 @@ class TweetMatchingSystem:
             return {'error': 'Empty tweet text provided'}
         
         print(f"\nMatching tweet: {tweet_text[:100]}...")
-        return self.matcher.match_new_tweet(tweet_text)
+        with self._lock:
+            return self.matcher.match_new_tweet(tweet_text)
+    
+    def match_tweet_semantic(self, tweet_text: str, top_k: int = 5) -> Dict:
+        """
+        Find verified tweets that paraphrase the incoming one.
+        
+        Second stage for tweets SimHash did not match: cosine similarity of
+        sentence embeddings (see semantic_index.py).
+        
+        Returns:
+            Dictionary in the match_new_tweet format; similarity_score is the
+            cosine similarity
+        """
+        semantic = self.semantic_matcher
+        if semantic is None or not semantic.ready:
+            return {'error': 'Semantic index not available', 'matches_found': 0, 'matches': []}
+        
+        start_time = time.time()
+        hits = semantic.search(tweet_text, k=top_k)
+        
+        matches = []
+        with self._lock:
+            for tweet_id, score in hits:
+                processed_tweet = self.matcher.processed_tweets.get(tweet_id)
+                if processed_tweet is None:
+                    continue
+                matches.append({
+                    'matched_tweet_id': tweet_id,
+                    'similarity_score': round(score, 4),
+                    'verdict': processed_tweet.verdict,
+                    'votes_in_favor_percentage': processed_tweet.votes_in_favor_percentage,
+                    'confidence': processed_tweet.confidence,
+                    'factuality': processed_tweet.factuality,
+                    'matched_tweet_text': processed_tweet.tweet_text
+                })
+        
+        print(f"Found {len(matches)} semantic matches in {time.time() - start_time:.3f} seconds")
+        return {
+            'similarity_threshold': semantic.similarity_threshold,
+            'matches_found': len(matches),
+            'matches': matches,
+            'best_match': matches[0] if matches else None
+        }
     
-    def refresh_index(self) -> bool:
-        """Refresh the index from database."""
-        if not self.db_session:
-            print("No database session available for refresh")
+    def sync_semantic_index(self) -> bool:
+        """Embed tweets added to the SimHash index and drop removed ones."""
+        if self.semantic_matcher is None:
             return False
+        # sync_changes mutates processed_tweets under the lock; hand over a copy
+        with self._lock:
+            processed_tweets = dict(self.matcher.processed_tweets)
+        self.semantic_matcher.sync(processed_tweets)
+        return True
+    
+    def get_tweet_text(self, tweet_id: int) -> Optional[str]:
+        """Full text of an indexed tweet (match results truncate it)."""
+        with self._lock:
+            processed_tweet = self.matcher.processed_tweets.get(tweet_id)
+            return processed_tweet.tweet_text if processed_tweet is not None else None
+    
+    def upsert_tweet(self, row: Tuple) -> ProcessedTweet:
+        """
+        Add a verified tweet to the live index, replacing any previous entry.
+        
+        Args:
+            row: Row tuple in the column order of fetch_tweets_from_db
+            
+        Returns:
+            The ProcessedTweet that was indexed
+        """
+        processed_tweet = self.matcher.build_processed_tweet(row)
+        
+        with self._lock:
+            self.matcher.add_tweet(processed_tweet)
+            self.initialized = True
+            indexed = len(self.matcher.processed_tweets)
+        
+        print(f"Indexed tweet {processed_tweet.tweet_id} ({indexed} in index)")
+        return processed_tweet
+    
+    def remove_tweet(self, tweet_id: int) -> bool:
+        """Remove a tweet from the live index (e.g. it is no longer verified)."""
+        with self._lock:
+            removed = self.matcher.remove_tweet(tweet_id)
+            indexed = len(self.matcher.processed_tweets)
+        
+        if removed:
+            print(f"Removed tweet {tweet_id} from index ({indexed} in index)")
+        return removed
+    
+    def sync_tweet(self, db: Session, tweet_id: int) -> bool:
+        """
+        Re-read one tweet from the database and update the index to match.
+        
+        Tweets with a verified result are upserted from the newest one,
+        anything else is removed.
+        
+        Returns:
+            True if the tweet is in the index afterwards, False otherwise
+        """
+        row = self.matcher.fetch_tweet_from_db(db, tweet_id)
+        
+        if row is None:
+            self.remove_tweet(tweet_id)
+            return False
+        
+        self.upsert_tweet(row)
+        return True
+    
+    def apply_verification_update(self, db: Session, tweet_id: int, status: str,
+                                  verdict: str, votes_in_favor_percentage) -> bool:
+        """
+        Keep the index in step with a verification result that was just written.
+        
+        Skips the database round trip when nothing the index cares about
+        changed. A result that left the verified status only removes the
+        tweet if no other verified result remains (see sync_tweet).
+        
+        Returns:
+            True if the tweet is in the index afterwards, False otherwise
+        """
+        with self._lock:
+            existing = self.matcher.processed_tweets.get(tweet_id)
+            unchanged = (existing is not None
+                         and existing.verdict == verdict
+                         and existing.votes_in_favor_percentage == float(votes_in_favor_percentage or 0))
+        
+        if status != 'verified':
+            if existing is None:
+                return False
+        elif unchanged:
+            return True
         
-        print("Refreshing index from database...")
-        count = self.matcher.process_and_index_tweets(self.db_session)
+        return self.sync_tweet(db, tweet_id)
+    
+    def refresh_index(self, full: bool = False) -> bool:
+        """
+        Bring the index up to date with the database.
+        
+        Args:
+            full: Rebuild from every verified tweet instead of syncing the
+                changes since the last watermark
+        """
+        if not full and self.initialized and self.matcher.sync_watermark is not None:
+            synced = self.sync_changes()
+            self.sync_semantic_index()
+            return synced
+        
+        with self._session() as db:
+            if db is None:
+                print("No database session available for refresh")
+                return False
+            
+            print("Refreshing index from database...")
+            with self._lock:
+                count = self.matcher.process_and_index_tweets(db, save_snapshot=self.is_snapshot_writer())
         
         if count > 0:
             print(f"Index refreshed with {count} tweets")
             self.initialized = True
+            self.sync_semantic_index()
             return True
         else:
             print("Failed to refresh index")
             return False
     
+    def sync_changes(self) -> bool:
+        """
+        Merge verification changes since the last watermark into the index.
+        
+        New verified tweets and verdict changes are upserted, tweets that left
+        the verified status are removed. If this process is the snapshot
+        writer, accumulated changes are written back to the snapshot file on
+        reconcile syncs or once SNAPSHOT_MAX_UNSAVED records changed, rather
+        than on every sync; until then (and in other processes) the changed
+        records' text stays in memory. Database reads and hashing happen
+        outside the lock, so matching is only paused while the changes are
+        applied.
+        
+        Returns:
+            True if the sync succeeded (even with no changes), False otherwise
+        """
+        with self._session() as db:
+            if db is None:
+                print("No database session available for sync")
+                return False
+            
+            try:
+                new_watermark = self.matcher.fetch_db_time(db)
+                since = self.matcher.sync_watermark - timedelta(seconds=SYNC_OVERLAP_SECONDS)
+                rows, changed_ids = self.matcher.fetch_changes_since(db, since)
+                
+                # Occasionally also catch tweets that were deleted outright
+                self.sync_count += 1
+                verified_ids = None
+                if self.sync_count % SYNC_RECONCILE_EVERY == 0:
+                    verified_ids = self.matcher.fetch_verified_ids(db)
+            
+            except SQLAlchemyError as e:
+                print(f"Error syncing index from database: {e}")
+                return False
+        
+        hashed = self.matcher.calculate_simhash_batch([row[1] for row in rows])
+        
+        with self._lock:
+            upserted, removed = self.matcher.apply_changes(rows, hashed, changed_ids)
+            if verified_ids is not None:
+                removed += self.matcher.remove_missing(verified_ids)
+            
+            self.matcher.sync_watermark = new_watermark
+            self.initialized = True
+            
+            changed = upserted or removed
+            self.unsaved_changes += changed
+            rewrite = self.unsaved_changes > 0 and self.is_snapshot_writer() and (
+                verified_ids is not None or self.unsaved_changes >= SNAPSHOT_MAX_UNSAVED)
+            if rewrite:
+                tweets = list(self.matcher.processed_tweets.values())
+                config = self.matcher._snapshot_config()
+                self.unsaved_changes = 0
+        
+        if changed:
+            print(f"Index sync: {upserted} upserted, {removed} removed "
+                  f"({len(self.matcher.processed_tweets)} in index)")
+        
+        if rewrite:
+            self.matcher.save_to_helper_file(tweets, config=config)
+            
+            # Move the synced records' text out of the heap into the new file
+            self.matcher._attach_snapshot(lock=self._lock)
+        
+        return True
+    
     def get_stats(self) -> Dict:
         """Get system statistics."""
         if not self.initialized:
             return {'error': 'System not initialized'}
         
-        return self.matcher.get_statistics()
+        stats = self.matcher.get_statistics()
+        if self.semantic_matcher is not None:
+            stats['semantic_index'] = self.semantic_matcher.get_statistics()
+        return stats
+
+
+# Process-wide matching system, built once on startup (see main.py) and
+# shared with routers that need to push incremental updates into it
+_matching_system: Optional[TweetMatchingSystem] = None
+
+
+def set_matching_system(system: Optional[TweetMatchingSystem]):
+    """Register the shared matching system instance."""
+    global _matching_system
+    _matching_system = system
+
+
+def get_matching_system() -> Optional[TweetMatchingSystem]:
+    """Return the shared matching system, or None before startup."""
+    return _matching_system
 
 
 # ==================== USAGE EXAMPLES ====================
@@ -798,7 +1742,7 @@ def example_usage():
         print("Failed to initialize system")
         print("Please ensure:")
         print("1. Database connection is available, OR")
-        print("2. Helper file (helper.txt) exists from previous processing")
+        print("2. Helper file (helper.simhash) exists from previous processing")
 
 
 def integration_example():
@@ -877,6 +1821,20 @@ def integration_example():
 
 
 if __name__ == "__main__":
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="SimHash tweet matcher")
+    parser.add_argument("--build", action="store_true",
+                        help="rebuild the snapshot from the database and exit")
+    parser.add_argument("--workers", type=int, default=OFFLINE_BUILD_WORKERS,
+                        help="hashing processes for --build (0 = every core)")
+    args = parser.parse_args()
+    
+    if args.build:
+        # Offline full build; servers pick the snapshot up on their next start
+        system = TweetMatchingSystem(build_workers=args.workers)
+        raise SystemExit(0 if system.initialize(force_reload=True) else 1)
+    
     # Run example usage
     example_usage()
     
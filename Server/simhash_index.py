@@ -0,0 +1,422 @@
+"""
+simhash_index.py
+
+Multi-table (banded) index for Hamming-radius SimHash search.
+
+The hash is split into B contiguous bands and every band gets its own
+table mapping the band's bit pattern to the tweets that carry it. By the
+pigeonhole principle, two hashes that differ in at most k bits must agree
+on some band to within r bits whenever B * (r + 1) > k. Probing every band
+value within r bits of the query therefore finds *all* candidates within
+Hamming distance k, not just the ones that happen to share a top-bit prefix.
+
+Query cost is tunable: fewer bands or a smaller probe radius means fewer
+table lookups but a smaller guaranteed radius. Tables hold stable row
+numbers into contiguous hash / id arrays, so the candidates of a query are
+distance-checked with one vectorized XOR + popcount rather than one Python
+bit count each.
+
+PackedHashArray keeps every hash in one contiguous uint64 array and answers
+radius / top-k queries by brute force with a vectorized XOR + popcount. It
+is the exact fallback and the reference for measuring the index's recall.
+"""
+
+from itertools import combinations
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+
+# Set-bit count of every byte value, for numpy builds without bitwise_count
+_POPCOUNT_TABLE = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+# Upper bound on query x corpus cells materialised at once in batch scans
+BATCH_SCAN_CELLS = 1 << 24
+
+
+def popcount64(values: np.ndarray) -> np.ndarray:
+    """Number of set bits in each element of a uint64 array (any shape)."""
+    values = np.ascontiguousarray(values, dtype=np.uint64)
+    if hasattr(np, 'bitwise_count'):
+        return np.bitwise_count(values)
+    counts = _POPCOUNT_TABLE[values.view(np.uint8)]
+    return counts.reshape(values.shape + (8,)).sum(axis=-1, dtype=np.uint8)
+
+
+class SimHashIndex:
+    """Permuted-table index that returns every hash within a Hamming radius"""
+
+    def __init__(self, hash_bits: int = 64, max_distance: int = 9,
+                 probe_radius: int = 1, num_bands: Optional[int] = None):
+        """
+        Initialize the index.
+
+        Args:
+            hash_bits: Number of bits in each SimHash
+            max_distance: Largest Hamming distance the index must never miss
+            probe_radius: Bit flips probed per band at query time (0 = exact
+                band lookup). Larger values mean fewer, wider bands.
+            num_bands: Override the number of bands. Defaults to the smallest
+                count that still guarantees max_distance at probe_radius.
+        """
+        if num_bands is None:
+            num_bands = max_distance // (probe_radius + 1) + 1
+        if not 1 <= num_bands <= hash_bits:
+            raise ValueError(f"num_bands must be between 1 and {hash_bits}, got {num_bands}")
+
+        self.hash_bits = hash_bits
+        self.max_distance = max_distance
+        self.probe_radius = probe_radius
+        self.num_bands = num_bands
+
+        # Contiguous (shift, width) ranges; leftover bits go to the first bands
+        self.bands: List[Tuple[int, int]] = []
+        base, extra = divmod(hash_bits, num_bands)
+        shift = 0
+        for band in range(num_bands):
+            width = base + (1 if band < extra else 0)
+            self.bands.append((shift, width))
+            shift += width
+
+        # band -> band value -> rows; a row keeps its number until removed
+        self.tables: List[Dict[int, Set[int]]] = [{} for _ in self.bands]
+        self._rows: Dict[int, int] = {}  # tweet_id -> row
+        self._free: List[int] = []  # rows of removed tweets, reused first
+        self._size = 0  # rows ever allocated
+
+        # Hashes wider than 64 bits do not fit uint64 and are checked one by one
+        self._wide = hash_bits > 64
+        self._hashes = np.zeros(1024, dtype=object if self._wide else np.uint64)
+        self._ids = np.zeros(1024, dtype=np.int64)
+
+        self._probe_masks: Dict[Tuple[int, int], List[int]] = {}
+
+    def guaranteed_distance(self, bands: Optional[int] = None,
+                            probe_radius: Optional[int] = None) -> int:
+        """Largest Hamming distance a query with these settings cannot miss."""
+        bands = self.num_bands if bands is None else min(bands, self.num_bands)
+        probe_radius = self.probe_radius if probe_radius is None else probe_radius
+        return bands * (probe_radius + 1) - 1
+
+    def _band_value(self, simhash: int, band: int) -> int:
+        shift, width = self.bands[band]
+        return (simhash >> shift) & ((1 << width) - 1)
+
+    def _masks(self, width: int, radius: int) -> List[int]:
+        """All band-local XOR masks with at most `radius` bits set (cached)."""
+        key = (width, radius)
+        masks = self._probe_masks.get(key)
+        if masks is None:
+            masks = [0]
+            for flips in range(1, radius + 1):
+                for bits in combinations(range(width), flips):
+                    mask = 0
+                    for bit in bits:
+                        mask |= 1 << bit
+                    masks.append(mask)
+            self._probe_masks[key] = masks
+        return masks
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def __contains__(self, tweet_id: int) -> bool:
+        return tweet_id in self._rows
+
+    def _allocate_row(self) -> int:
+        if self._free:
+            return self._free.pop()
+        if self._size == len(self._hashes):
+            for name in ('_hashes', '_ids'):
+                old = getattr(self, name)
+                grown = np.zeros(2 * len(old), dtype=old.dtype)
+                grown[:self._size] = old[:self._size]
+                setattr(self, name, grown)
+        self._size += 1
+        return self._size - 1
+
+    def add(self, tweet_id: int, simhash: int):
+        """Insert a tweet, replacing its previous hash if it was indexed."""
+        if tweet_id in self._rows:
+            self.remove(tweet_id)
+
+        row = self._allocate_row()
+        self._rows[tweet_id] = row
+        self._ids[row] = tweet_id
+        self._hashes[row] = simhash
+        for band, table in enumerate(self.tables):
+            value = self._band_value(simhash, band)
+            bucket = table.get(value)
+            if bucket is None:
+                table[value] = {row}
+            else:
+                bucket.add(row)
+
+    def remove(self, tweet_id: int) -> bool:
+        """Remove a tweet. Returns False if it was not indexed."""
+        row = self._rows.pop(tweet_id, None)
+        if row is None:
+            return False
+
+        simhash = int(self._hashes[row])
+        for band, table in enumerate(self.tables):
+            value = self._band_value(simhash, band)
+            bucket = table.get(value)
+            if bucket is not None:
+                bucket.discard(row)
+                if not bucket:
+                    del table[value]
+        self._free.append(row)
+        return True
+
+    def clear(self):
+        """Drop every indexed tweet."""
+        for table in self.tables:
+            table.clear()
+        self._rows.clear()
+        self._free.clear()
+        self._size = 0
+
+    def candidates(self, simhash: int, bands: Optional[int] = None,
+                   probe_radius: Optional[int] = None) -> Set[int]:
+        """
+        Collect tweet ids that share a (near-)identical band with the query.
+
+        Args:
+            simhash: Query hash
+            bands: Probe only the first N bands (cheaper, lower recall)
+            probe_radius: Override the per-band probe radius for this query
+
+        Returns:
+            Set of candidate tweet ids (not yet distance-checked)
+        """
+        rows = self._candidate_rows(simhash, bands, probe_radius)
+        return set(self._ids[np.fromiter(rows, dtype=np.int64, count=len(rows))].tolist())
+
+    def _candidate_rows(self, simhash: int, bands: Optional[int] = None,
+                        probe_radius: Optional[int] = None) -> Set[int]:
+        """candidates() as table rows."""
+        bands = self.num_bands if bands is None else min(bands, self.num_bands)
+        probe_radius = self.probe_radius if probe_radius is None else probe_radius
+
+        found: Set[int] = set()
+        for band in range(bands):
+            table = self.tables[band]
+            value = self._band_value(simhash, band)
+            for mask in self._masks(self.bands[band][1], probe_radius):
+                bucket = table.get(value ^ mask)
+                if bucket:
+                    found.update(bucket)
+        return found
+
+    def query(self, simhash: int, max_distance: Optional[int] = None,
+              bands: Optional[int] = None,
+              probe_radius: Optional[int] = None) -> List[Tuple[int, int]]:
+        """
+        Find indexed tweets within a Hamming radius of the query.
+
+        Args:
+            simhash: Query hash
+            max_distance: Radius to report (defaults to the index's max_distance)
+            bands: Probe only the first N bands
+            probe_radius: Override the per-band probe radius for this query
+
+        Returns:
+            List of (tweet_id, hamming_distance), closest first
+        """
+        max_distance = self.max_distance if max_distance is None else max_distance
+
+        found = self._candidate_rows(simhash, bands, probe_radius)
+        if not found:
+            return []
+
+        rows = np.fromiter(found, dtype=np.int64, count=len(found))
+        if self._wide:
+            distances = np.array([(simhash ^ int(value)).bit_count() for value in self._hashes[rows]],
+                                 dtype=np.int64)
+        else:
+            distances = popcount64(self._hashes[rows] ^ np.uint64(simhash))
+
+        keep = distances <= max_distance
+        ids, distances = self._ids[rows[keep]], distances[keep]
+        order = np.lexsort((ids, distances))
+        return list(zip(ids[order].tolist(), distances[order].tolist()))
+
+    def get_statistics(self) -> Dict:
+        """Table sizes and occupancy for monitoring."""
+        bucket_counts = [len(table) for table in self.tables]
+        largest = [max((len(b) for b in table.values()), default=0) for table in self.tables]
+        return {
+            'indexed_hashes': len(self._rows),
+            'num_bands': self.num_bands,
+            'band_widths': [width for _, width in self.bands],
+            'probe_radius': self.probe_radius,
+            'probes_per_query': sum(len(self._masks(width, self.probe_radius)) for _, width in self.bands),
+            'guaranteed_distance': self.guaranteed_distance(),
+            'buckets_per_band': bucket_counts,
+            'largest_bucket_per_band': largest,
+            'avg_bucket_size': (len(self._rows) / (sum(bucket_counts) / self.num_bands))
+                               if any(bucket_counts) else 0
+        }
+
+
+class PackedHashArray:
+    """Contiguous uint64 SimHash array with vectorized Hamming scans"""
+
+    def __init__(self, capacity: int = 1024):
+        self._hashes = np.zeros(capacity, dtype=np.uint64)
+        self._ids = np.zeros(capacity, dtype=np.int64)
+        self._size = 0
+        self._positions: Dict[int, int] = {}  # tweet_id -> row
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __contains__(self, tweet_id: int) -> bool:
+        return tweet_id in self._positions
+
+    @property
+    def hashes(self) -> np.ndarray:
+        """Live view of the stored hashes (row order is not stable)."""
+        return self._hashes[:self._size]
+
+    @property
+    def ids(self) -> np.ndarray:
+        """Tweet ids aligned with `hashes`."""
+        return self._ids[:self._size]
+
+    def _reserve(self, capacity: int):
+        if capacity <= len(self._hashes):
+            return
+        capacity = max(capacity, 2 * len(self._hashes))
+        for name in ('_hashes', '_ids'):
+            old = getattr(self, name)
+            grown = np.zeros(capacity, dtype=old.dtype)
+            grown[:self._size] = old[:self._size]
+            setattr(self, name, grown)
+
+    def add(self, tweet_id: int, simhash: int):
+        """Insert a hash, overwriting the tweet's previous hash in place."""
+        row = self._positions.get(tweet_id)
+        if row is None:
+            self._reserve(self._size + 1)
+            row = self._size
+            self._size += 1
+            self._positions[tweet_id] = row
+            self._ids[row] = tweet_id
+        self._hashes[row] = simhash
+
+    def extend(self, tweet_ids: Iterable[int], simhashes: Iterable[int]):
+        """Bulk-insert tweets that are not yet present."""
+        tweet_ids = np.asarray(tweet_ids, dtype=np.int64)
+        simhashes = np.asarray(simhashes, dtype=np.uint64)
+        if any(int(tweet_id) in self._positions for tweet_id in tweet_ids):
+            for tweet_id, simhash in zip(tweet_ids.tolist(), simhashes.tolist()):
+                self.add(tweet_id, simhash)
+            return
+
+        start = self._size
+        self._reserve(start + len(tweet_ids))
+        self._ids[start:start + len(tweet_ids)] = tweet_ids
+        self._hashes[start:start + len(tweet_ids)] = simhashes
+        self._size += len(tweet_ids)
+        self._positions.update(zip(tweet_ids.tolist(), range(start, self._size)))
+
+    def remove(self, tweet_id: int) -> bool:
+        """Remove a hash by moving the last row into its slot."""
+        row = self._positions.pop(tweet_id, None)
+        if row is None:
+            return False
+
+        last = self._size - 1
+        if row != last:
+            moved_id = int(self._ids[last])
+            self._ids[row] = moved_id
+            self._hashes[row] = self._hashes[last]
+            self._positions[moved_id] = row
+        self._size = last
+        return True
+
+    def clear(self):
+        self._size = 0
+        self._positions.clear()
+
+    def distances(self, simhash: int) -> np.ndarray:
+        """Hamming distance from the query to every stored hash."""
+        return popcount64(self.hashes ^ np.uint64(simhash))
+
+    def radius(self, simhash: int, max_distance: int) -> List[Tuple[int, int]]:
+        """
+        All stored tweets within `max_distance` bits of the query.
+
+        Returns:
+            List of (tweet_id, hamming_distance), closest first
+        """
+        distances = self.distances(simhash)
+        rows = np.flatnonzero(distances <= max_distance)
+        return self._sorted_pairs(rows, distances[rows])
+
+    def top_k(self, simhash: int, k: int) -> List[Tuple[int, int]]:
+        """The k closest stored tweets as (tweet_id, hamming_distance)."""
+        if self._size == 0 or k <= 0:
+            return []
+        distances = self.distances(simhash)
+        rows = self._top_k_rows(distances, k)
+        return self._sorted_pairs(rows, distances[rows])
+
+    def batch_scan(self, simhashes: Iterable[int], k: Optional[int] = None,
+                   max_distance: Optional[int] = None) -> List[List[Tuple[int, int]]]:
+        """
+        Answer many queries at once.
+
+        Queries are processed in blocks so that at most BATCH_SCAN_CELLS
+        distances are held in memory.
+
+        Args:
+            simhashes: Query hashes
+            k: Keep only the k closest per query (None = no limit)
+            max_distance: Keep only matches within this radius (None = no limit)
+
+        Returns:
+            One list of (tweet_id, hamming_distance) per query, closest first
+        """
+        queries = np.asarray(list(simhashes), dtype=np.uint64)
+        results: List[List[Tuple[int, int]]] = []
+        if self._size == 0:
+            return [[] for _ in queries]
+
+        block = max(1, BATCH_SCAN_CELLS // self._size)
+        hashes = self.hashes
+        for start in range(0, len(queries), block):
+            distances = popcount64(queries[start:start + block, None] ^ hashes[None, :])
+            for row_distances in distances:
+                if max_distance is not None:
+                    rows = np.flatnonzero(row_distances <= max_distance)
+                    if k is not None and k < len(rows):
+                        rows = rows[self._top_k_rows(row_distances[rows], k)]
+                elif k is not None:
+                    rows = self._top_k_rows(row_distances, k)
+                else:
+                    rows = np.arange(self._size)
+                results.append(self._sorted_pairs(rows, row_distances[rows]))
+        return results
+
+    @staticmethod
+    def _top_k_rows(distances: np.ndarray, k: int) -> np.ndarray:
+        """
+        Positions of the k smallest distances.
+
+        Distances only take 65 values, so a histogram finds the cut-off
+        distance in one pass and only the rows at or below it are partitioned.
+        """
+        if k >= len(distances):
+            return np.arange(len(distances))
+        cumulative = np.cumsum(np.bincount(distances, minlength=65))
+        cutoff = int(np.searchsorted(cumulative, k))
+        rows = np.flatnonzero(distances <= cutoff)
+        if len(rows) > k:
+            rows = rows[np.argpartition(distances[rows], k - 1)[:k]]
+        return rows
+
+    def _sorted_pairs(self, rows: np.ndarray, distances: np.ndarray) -> List[Tuple[int, int]]:
+        order = np.lexsort((self._ids[rows], distances))
+        return list(zip(self._ids[rows][order].tolist(), distances[order].tolist()))
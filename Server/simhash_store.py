@@ -0,0 +1,334 @@
+"""
+simhash_store.py
+
+Compact, memory-mapped on-disk format for the SimHash index snapshot.
+
+Replaces the indented helper.txt JSON and the pickle backup. The file is a
+fixed header, a section table and a set of 8-byte aligned column sections:
+
+    simhash      uint64[n]      the 64-bit SimHashes
+    tweet_id     int64[n]
+    votes        float64[n]     votes_in_favor_percentage
+    confidence   float64[n]
+    verified_at  int64[n]       microseconds since epoch (NULL_TIMESTAMP = None)
+    tweet_date   int64[n]
+    <col>.off    uint64[n + 1]  offsets into <col>.blob, one pair per row
+    <col>.blob   utf-8 bytes    for text, status, verdict, factuality,
+                                reason and language
+    config       utf-8 JSON     matcher settings
+
+Loading maps the file read-only, so the arrays are views onto the OS page
+cache and every uvicorn worker reading the same file shares those pages.
+The header carries a format version and a CRC32 of all section data.
+
+Writers assemble the file under a unique temporary name and swap it in
+with atomic_replace (atomic_files.py), so concurrent writers cannot tear
+it; TweetMatchingSystem additionally lets only one process write it.
+"""
+
+import json
+import mmap
+import os
+import shutil
+import struct
+import tempfile
+import zlib
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+from atomic_files import atomic_replace
+
+MAGIC = b"CFSIMHX\0"
+FORMAT_VERSION = 1
+
+# magic, version, hash_bits, row count, section count, crc32 of section data
+HEADER = struct.Struct("<8sIIQII")
+# section name, offset from start of file, length in bytes
+SECTION = struct.Struct("<16sQQ")
+
+NULL_TIMESTAMP = np.iinfo(np.int64).min
+_EPOCH = datetime(1970, 1, 1)
+_ALIGN = 8
+
+NUMERIC_COLUMNS = {
+    'simhash': np.uint64,
+    'tweet_id': np.int64,
+    'votes': np.float64,
+    'confidence': np.float64,
+    'verified_at': np.int64,
+    'tweet_date': np.int64,
+}
+STRING_COLUMNS = ('text', 'status', 'verdict', 'factuality', 'reason', 'language')
+
+
+class SnapshotError(Exception):
+    """Raised when a snapshot file is missing, corrupt or of another version."""
+
+
+def to_timestamp(value: Optional[datetime]) -> int:
+    """Datetime -> microseconds since epoch (naive values are taken as-is)."""
+    if value is None:
+        return NULL_TIMESTAMP
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return (value - _EPOCH) // timedelta(microseconds=1)
+
+
+def from_timestamp(value: int) -> Optional[datetime]:
+    """Inverse of to_timestamp."""
+    if value == NULL_TIMESTAMP:
+        return None
+    return _EPOCH + timedelta(microseconds=int(value))
+
+
+def _padding(size: int) -> int:
+    return (-size) % _ALIGN
+
+
+class SnapshotWriter:
+    """
+    Write a snapshot in chunks with bounded memory.
+
+    Each column is spooled to its own temporary file as rows are appended;
+    close() stitches the spools into a unique temporary file and atomically
+    replaces the previous snapshot under its file lock, so readers never see
+    a half-written file and concurrent writers never share a temp file.
+    """
+
+    def __init__(self, path: str, hash_bits: int = 64, config: Optional[Dict] = None):
+        self.path = path
+        self.hash_bits = hash_bits
+        self.config = config or {}
+        self.count = 0
+
+        directory = os.path.dirname(os.path.abspath(path))
+        self._spool_dir = tempfile.mkdtemp(prefix=".simhash-", dir=directory)
+        self._spools = {}
+        for name in list(NUMERIC_COLUMNS) + [f"{c}.off" for c in STRING_COLUMNS] + \
+                [f"{c}.blob" for c in STRING_COLUMNS]:
+            self._spools[name] = open(os.path.join(self._spool_dir, name), "wb")
+
+        self._blob_sizes = {column: 0 for column in STRING_COLUMNS}
+        for column in STRING_COLUMNS:
+            self._spools[f"{column}.off"].write(np.zeros(1, dtype=np.uint64).tobytes())
+
+    def append(self, tweets: Iterable) -> int:
+        """
+        Append a chunk of ProcessedTweet-like records.
+
+        Returns:
+            Number of rows written in this chunk
+        """
+        tweets = list(tweets)
+        if not tweets:
+            return 0
+
+        columns = {
+            'simhash': [t.simhash for t in tweets],
+            'tweet_id': [t.tweet_id for t in tweets],
+            'votes': [t.votes_in_favor_percentage or 0.0 for t in tweets],
+            'confidence': [t.confidence or 0.0 for t in tweets],
+            'verified_at': [to_timestamp(t.verification_date) for t in tweets],
+            'tweet_date': [to_timestamp(t.tweet_date) for t in tweets],
+        }
+        for name, dtype in NUMERIC_COLUMNS.items():
+            self._spools[name].write(np.asarray(columns[name], dtype=dtype).tobytes())
+
+        for column in STRING_COLUMNS:
+            encoded = [str(getattr(t, column if column != 'text' else 'tweet_text') or "").encode("utf-8")
+                       for t in tweets]
+            ends = np.cumsum([len(e) for e in encoded], dtype=np.uint64) + np.uint64(self._blob_sizes[column])
+            self._spools[f"{column}.off"].write(ends.tobytes())
+            self._spools[f"{column}.blob"].write(b"".join(encoded))
+            if len(ends):
+                self._blob_sizes[column] = int(ends[-1])
+
+        self.count += len(tweets)
+        return len(tweets)
+
+    def close(self) -> int:
+        """
+        Assemble the final file and swap it into place.
+
+        Returns:
+            Total number of rows written
+        """
+        try:
+            for spool in self._spools.values():
+                spool.close()
+
+            config_path = os.path.join(self._spool_dir, "config")
+            with open(config_path, "wb") as f:
+                f.write(json.dumps(self.config, ensure_ascii=False).encode("utf-8"))
+
+            sections = [(name, os.path.join(self._spool_dir, name)) for name in self._spools]
+            sections.append(("config", config_path))
+
+            # Lay out sections after the header and section table
+            offset = HEADER.size + SECTION.size * len(sections)
+            offset += _padding(offset)
+            table = []
+            for name, spool_path in sections:
+                size = os.path.getsize(spool_path)
+                table.append((name, spool_path, offset, size))
+                offset += size + _padding(size)
+
+            crc = 0
+            with atomic_replace(self.path) as tmp_path, open(tmp_path, "wb") as out:
+                out.write(b"\0" * table[0][2])
+                for name, spool_path, section_offset, size in table:
+                    out.seek(section_offset)
+                    with open(spool_path, "rb") as src:
+                        while True:
+                            block = src.read(1 << 20)
+                            if not block:
+                                break
+                            crc = zlib.crc32(block, crc)
+                            out.write(block)
+                    out.write(b"\0" * _padding(size))
+
+                out.seek(0)
+                out.write(HEADER.pack(MAGIC, FORMAT_VERSION, self.hash_bits,
+                                      self.count, len(table), crc))
+                for name, _, section_offset, size in table:
+                    out.write(SECTION.pack(name.encode("ascii"), section_offset, size))
+
+                out.flush()
+                os.fsync(out.fileno())
+
+            return self.count
+        finally:
+            shutil.rmtree(self._spool_dir, ignore_errors=True)
+
+    def abort(self):
+        """Discard everything written so far."""
+        for spool in self._spools.values():
+            spool.close()
+        shutil.rmtree(self._spool_dir, ignore_errors=True)
+
+
+def write_snapshot(path: str, tweets: Iterable, hash_bits: int = 64,
+                   config: Optional[Dict] = None, chunk_size: int = 10000) -> int:
+    """Write every record in `tweets` to a snapshot file. Returns the row count."""
+    writer = SnapshotWriter(path, hash_bits, config)
+    try:
+        chunk: List = []
+        for tweet in tweets:
+            chunk.append(tweet)
+            if len(chunk) >= chunk_size:
+                writer.append(chunk)
+                chunk = []
+        writer.append(chunk)
+    except Exception:
+        writer.abort()
+        raise
+    return writer.close()
+
+
+class SimHashSnapshot:
+    """Read-only, memory-mapped view of a snapshot file"""
+
+    def __init__(self, path: str, verify_checksum: bool = True):
+        """
+        Map a snapshot file.
+
+        Args:
+            path: Snapshot file written by SnapshotWriter
+            verify_checksum: Check the CRC32 of all section data (reads the
+                whole file once; skip it for the fastest possible startup)
+        """
+        self.path = path
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        try:
+            if len(self._mmap) < HEADER.size:
+                raise SnapshotError(f"{path} is too small to be a snapshot")
+
+            magic, version, hash_bits, count, n_sections, crc = HEADER.unpack_from(self._mmap, 0)
+            if magic != MAGIC:
+                raise SnapshotError(f"{path} is not a SimHash snapshot")
+            if version != FORMAT_VERSION:
+                raise SnapshotError(f"{path} has format version {version}, expected {FORMAT_VERSION}")
+
+            self.hash_bits = hash_bits
+            self.count = count
+
+            self._sections = {}
+            for i in range(n_sections):
+                raw_name, offset, size = SECTION.unpack_from(self._mmap, HEADER.size + i * SECTION.size)
+                self._sections[raw_name.rstrip(b"\0").decode("ascii")] = (offset, size)
+
+            if verify_checksum:
+                actual = 0
+                for offset, size in sorted(self._sections.values()):
+                    view = memoryview(self._mmap)[offset:offset + size]
+                    actual = zlib.crc32(view, actual)
+                    view.release()
+                if actual != crc:
+                    raise SnapshotError(f"{path} failed checksum verification")
+
+            self.columns: Dict[str, np.ndarray] = {
+                name: self._array(name, dtype) for name, dtype in NUMERIC_COLUMNS.items()
+            }
+            self._offsets = {c: self._array(f"{c}.off", np.uint64) for c in STRING_COLUMNS}
+            self._blobs = {c: self._sections[f"{c}.blob"] for c in STRING_COLUMNS}
+
+            offset, size = self._sections["config"]
+            self.config = json.loads(bytes(self._mmap[offset:offset + size]).decode("utf-8") or "{}")
+        except KeyError as e:
+            self.close()
+            raise SnapshotError(f"{path} is missing section {e}")
+        except Exception:
+            self.close()
+            raise
+
+    def _array(self, name: str, dtype) -> np.ndarray:
+        offset, size = self._sections[name]
+        return np.frombuffer(self._mmap, dtype=dtype, count=size // np.dtype(dtype).itemsize, offset=offset)
+
+    def __len__(self) -> int:
+        return self.count
+
+    @property
+    def simhashes(self) -> np.ndarray:
+        return self.columns['simhash']
+
+    @property
+    def tweet_ids(self) -> np.ndarray:
+        return self.columns['tweet_id']
+
+    def string(self, column: str, row: int) -> str:
+        """Decode one string cell without touching the rest of the blob."""
+        offsets = self._offsets[column]
+        start, end = int(offsets[row]), int(offsets[row + 1])
+        blob_offset = self._blobs[column][0]
+        return self._mmap[blob_offset + start:blob_offset + end].decode("utf-8")
+
+    def row(self, row: int) -> Dict:
+        """All fields of one row as a dictionary."""
+        record = {
+            'tweet_id': int(self.columns['tweet_id'][row]),
+            'simhash': int(self.columns['simhash'][row]),
+            'votes_in_favor_percentage': float(self.columns['votes'][row]),
+            'confidence': float(self.columns['confidence'][row]),
+            'verification_date': from_timestamp(self.columns['verified_at'][row]),
+            'tweet_date': from_timestamp(self.columns['tweet_date'][row]),
+        }
+        for column in STRING_COLUMNS:
+            record['tweet_text' if column == 'text' else column] = self.string(column, row)
+        return record
+
+    def close(self):
+        """Unmap the file (arrays handed out earlier become invalid)."""
+        self.columns = {}
+        self._offsets = {}
+        try:
+            self._mmap.close()
+        except BufferError:
+            # numpy views are still alive; the map is released with them
+            pass
@@ -0,0 +1,103 @@
+import os
+import subprocess
+import sys
+from multiprocessing import get_context
+
+import pytest
+
+import atomic_files
+from atomic_files import WriterLease, atomic_replace
+from simhash_store import SimHashSnapshot, write_snapshot
+from test_simhash_store import record
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+needs_flock = pytest.mark.skipif(atomic_files.fcntl is None, reason="needs fcntl.flock")
+
+
+def leftovers(directory):
+    return [name for name in os.listdir(directory) if ".tmp" in name]
+
+
+def test_atomic_replace_swaps_in_complete_file(tmp_path):
+    path = str(tmp_path / "data.bin")
+    with atomic_replace(path) as tmp_path_:
+        assert tmp_path_ != path
+        with open(tmp_path_, "wb") as f:
+            f.write(b"new")
+        assert not os.path.exists(path)
+    with open(path, "rb") as f:
+        assert f.read() == b"new"
+    assert leftovers(tmp_path) == []
+
+
+def test_atomic_replace_keeps_old_file_on_error(tmp_path):
+    path = tmp_path / "data.bin"
+    path.write_bytes(b"old")
+    with pytest.raises(RuntimeError):
+        with atomic_replace(str(path)) as tmp_path_:
+            with open(tmp_path_, "wb") as f:
+                f.write(b"partial")
+            raise RuntimeError("writer died")
+    assert path.read_bytes() == b"old"
+    assert leftovers(tmp_path) == []
+
+
+def _write_many(path: str, worker: int):
+    for round_ in range(5):
+        write_snapshot(path, [record(worker * 1000 + round_ * 10 + i) for i in range(50 + worker)])
+
+
+def test_concurrent_snapshot_writers_never_tear_the_file(tmp_path):
+    path = str(tmp_path / "helper.simhash")
+    ctx = get_context("spawn")
+    processes = [ctx.Process(target=_write_many, args=(path, worker)) for worker in range(4)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join(60)
+        assert process.exitcode == 0
+
+    snapshot = SimHashSnapshot(path)
+    assert len(snapshot) in (50, 51, 52, 53)
+    snapshot.close()
+    assert leftovers(tmp_path) == []
+
+
+def _try_lease(path: str) -> bool:
+    code = (f"import sys; sys.path.insert(0, {SERVER_DIR!r}); from atomic_files import WriterLease; "
+            f"sys.exit(0 if WriterLease({path!r}).acquire() else 1)")
+    return subprocess.run([sys.executable, "-c", code]).returncode == 0
+
+
+@needs_flock
+def test_writer_lease_has_one_holder(tmp_path):
+    path = str(tmp_path / "helper.simhash")
+    lease = WriterLease(path)
+    assert lease.acquire()
+    assert lease.acquire()
+    assert not _try_lease(path)
+
+    lease.release()
+    assert not lease.held
+    assert _try_lease(path)
+
+
+@needs_flock
+def test_forked_child_does_not_inherit_the_lease(tmp_path):
+    if not hasattr(os, "fork"):
+        pytest.skip("needs fork")
+    path = str(tmp_path / "helper.simhash")
+    lease = WriterLease(path)
+    assert lease.acquire()
+
+    pid = os.fork()
+    if pid == 0:
+        os._exit(0 if not lease.held and not lease.acquire() else 1)
+    _, status = os.waitpid(pid, 0)
+    assert os.waitstatus_to_exitcode(status) == 0
+
+    # The child closing its copy did not unlock the parent's
+    assert lease.held
+    assert not _try_lease(path)
+    lease.release()
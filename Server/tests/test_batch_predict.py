@@ -0,0 +1,38 @@
+import pytest
+
+torch = pytest.importorskip("torch")
+pytest.importorskip("transformers")
+
+from factualmodel import FactualityClassifier
+from xlmmodel import ModelManager
+from tiny_xlmr import TEXTS, load_tiny
+
+
+def test_batch_predict_returns_one_labelled_row_per_text():
+    model = load_tiny(ModelManager(), num_labels=5, seed=4)
+
+    results = model.batch_predict(TEXTS, batch_size=3)
+
+    assert [result['text'] for result in results] == TEXTS
+    probs = model.predict_proba(TEXTS, batch_size=3)
+    for result, row in zip(results, probs.tolist()):
+        assert set(result) == {'text', 'prediction', 'class_id', 'probability', 'probabilities'}
+        assert list(result['probabilities']) == list(model.label_map.values())
+        assert result['prediction'] == model.label_map[result['class_id']]
+        assert result['probability'] == max(row)
+        assert sum(result['probabilities'].values()) == pytest.approx(1.0, abs=1e-5)
+
+
+def test_factuality_batch_predict_matches_predict_proba():
+    model = load_tiny(FactualityClassifier(), num_labels=2, seed=4)
+
+    results = model.batch_predict(TEXTS, batch_size=3)
+    probs = model.predict_proba(TEXTS, batch_size=3)
+
+    assert len(results) == len(TEXTS)
+    assert [result['class_id'] for result in results] == probs.argmax(dim=1).tolist()
+    assert [result['prediction'] for result in results] == [model.label_map[row['class_id']] for row in results]
+
+
+def test_batch_predict_on_no_texts():
+    assert load_tiny(ModelManager(), num_labels=5, seed=4).batch_predict([]) == []
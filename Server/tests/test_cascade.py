@@ -0,0 +1,142 @@
+import json
+
+import numpy as np
+import pytest
+
+from cascade import (
+    CascadeClassifier,
+    HashedLinearModel,
+    PredictionLog,
+    hashed_features,
+    load_prediction_log,
+    log_files,
+    train_from_log
+)
+
+DIM = 1 << 12
+
+CRICKET = ["pakistan won the cricket match", "babar azam century in the test match",
+           "cricket team announced for the world cup", "shaheen takes five wickets"]
+ECONOMY = ["rupee falls against the dollar", "inflation hits a record high",
+           "imf approves the loan tranche", "state bank raises the interest rate"]
+
+
+def confident_model(num_classes: int, winner: int, margin: float = 10.0) -> HashedLinearModel:
+    model = HashedLinearModel(num_classes, dim=DIM)
+    model.bias[winner] = margin
+    return model
+
+
+def test_hashed_features_are_stable_and_normalised():
+    indices, values = hashed_features("Flood relief in Karachi", DIM)
+    again, again_values = hashed_features("flood  relief in karachi", DIM)
+
+    assert np.array_equal(indices, again) and np.array_equal(values, again_values)
+    assert indices.max() < DIM
+    assert np.linalg.norm(values) == pytest.approx(1.0)
+
+
+def test_cascade_gates_on_thresholds_and_audits():
+    cascade = CascadeClassifier(confident_model(5, winner=3), confident_model(2, winner=1, margin=0.1),
+                                audit_rate=0.0)
+
+    result, = cascade.predict(["some tweet"])
+
+    assert result['category'] == 3 and result['category_confident']
+    assert result['factuality'] == 1 and not result['factuality_confident']
+    assert not result['audit']
+
+    cascade.audit_rate = 1.0
+    assert all(row['audit'] for row in cascade.predict(["a", "b", "c"]))
+
+
+def test_statistics_report_coverage_and_agreement():
+    cascade = CascadeClassifier(confident_model(5, 0), confident_model(2, 0))
+    cascade.record('category', answered=3, escalated=1)
+    cascade.record_agreement('category', 2, 2)
+    cascade.record_agreement('category', 2, 4)
+
+    stats = cascade.get_statistics()
+
+    assert stats['category'] == {'answered': 3, 'escalated': 1, 'coverage': 0.75, 'audited': 2, 'agreement': 0.5}
+    assert stats['factuality']['coverage'] == 0.0 and stats['factuality']['agreement'] is None
+
+
+def test_fit_separates_topics():
+    model = HashedLinearModel(2, dim=DIM)
+    targets = np.eye(2, dtype=np.float32)[[0] * len(CRICKET) + [1] * len(ECONOMY)]
+
+    model.fit(CRICKET + ECONOMY, targets, epochs=20)
+
+    assert model.predict_proba(CRICKET + ECONOMY).argmax(axis=1).tolist() == targets.argmax(axis=1).tolist()
+
+
+def test_save_and_load_round_trip(tmp_path):
+    path = str(tmp_path / "cascade.npz")
+    cascade = CascadeClassifier(confident_model(5, 4), confident_model(2, 1),
+                                category_threshold=0.9, factuality_threshold=0.8)
+    cascade.save(path)
+
+    loaded = CascadeClassifier.load(path)
+
+    assert loaded.category_threshold == 0.9 and loaded.factuality_threshold == 0.8
+    assert np.array_equal(loaded.category_model.bias, cascade.category_model.bias)
+    assert loaded.factuality_model.dim == DIM
+    assert CascadeClassifier.load(str(tmp_path / "missing.npz")) is None
+
+
+def test_prediction_log_rotates_and_keeps_backups(tmp_path):
+    path = str(tmp_path / "predictions.jsonl")
+    log = PredictionLog(path, str(tmp_path / "sample.jsonl"), max_bytes=100, backups=2)
+
+    for i in range(6):
+        log.write([{'text': f"tweet {i}", 'category': i % 5, 'category_probs': [0.2] * 5, 'padding': 'x' * 80}])
+
+    assert log_files(path, backups=2) == [f"{path}.2", f"{path}.1", path]
+    assert not (tmp_path / "predictions.jsonl.3").exists()
+
+    # Oldest first: the newest two records rotated once, the newest is current
+    with open(f"{path}.2", encoding="utf-8") as f:
+        assert json.loads(f.readline())['text'] == "tweet 3"
+    with open(path, encoding="utf-8") as f:
+        assert json.loads(f.readline())['text'] == "tweet 5"
+
+
+def test_sample_records_go_to_the_sample_log(tmp_path):
+    path, sample_path = str(tmp_path / "predictions.jsonl"), str(tmp_path / "sample.jsonl")
+    log = PredictionLog(path, sample_path)
+
+    log.write([{'text': "escalated", 'category_probs': [0.1, 0.9]}],
+              sample=[{'text': "audited", 'category_probs': [0.8, 0.2]}])
+
+    assert load_prediction_log(path)['category'][0] == ["escalated"]
+    assert load_prediction_log(sample_path)['category'][0] == ["audited"]
+
+
+def test_load_prediction_log_reads_rotated_files_and_latest_wins(tmp_path):
+    path = str(tmp_path / "predictions.jsonl")
+    log = PredictionLog(path, str(tmp_path / "sample.jsonl"), max_bytes=1, backups=3)
+    log.write([{'text': "same tweet", 'category_probs': [0.9, 0.1]}])
+    log.write([{'text': "other tweet", 'factuality_probs': [0.3, 0.7]}])
+    log.write([{'text': "same tweet", 'category_probs': [0.2, 0.8]}])
+
+    data = load_prediction_log(path)
+
+    texts, targets = data['category']
+    assert texts == ["same tweet"]
+    assert targets.tolist() == [[0.0, 1.0]]
+    assert data['factuality'][0] == ["other tweet"]
+    assert load_prediction_log(path, soft_targets=True)['category'][1].tolist() == [[pytest.approx(0.2), pytest.approx(0.8)]]
+
+
+def test_train_from_log_holds_out_the_uniform_sample(tmp_path, capsys):
+    path, sample_path = str(tmp_path / "predictions.jsonl"), str(tmp_path / "sample.jsonl")
+    log = PredictionLog(path, sample_path)
+    records = [{'text': text, 'category_probs': [0.9, 0.1], 'factuality_probs': [0.9, 0.1]} for text in CRICKET] + \
+              [{'text': text, 'category_probs': [0.1, 0.9], 'factuality_probs': [0.1, 0.9]} for text in ECONOMY]
+    log.write(records[:6], sample=records[6:])
+
+    cascade = train_from_log(path, holdout=0.5, epochs=2, sample_path=sample_path)
+
+    assert "(uniform sample)" in capsys.readouterr().out
+    assert cascade.category_model.num_classes == 2
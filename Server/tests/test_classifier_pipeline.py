@@ -0,0 +1,65 @@
+import pytest
+
+torch = pytest.importorskip("torch")
+pytest.importorskip("transformers")
+
+from classifier_pipeline import TweetClassifierPipeline
+from factualmodel import FactualityClassifier
+from xlmmodel import ModelManager
+from tiny_xlmr import TEXTS, load_tiny
+
+OTHERS = 3
+
+
+def pipeline(share_encoder: bool = False) -> TweetClassifierPipeline:
+    model_manager = load_tiny(ModelManager(), num_labels=5, seed=0)
+    factuality_model = load_tiny(FactualityClassifier(), num_labels=2, seed=1)
+    if share_encoder:
+        factuality_model.model.roberta.load_state_dict(model_manager.model.roberta.state_dict())
+
+    classifier = TweetClassifierPipeline(model_manager, factuality_model, skip_factuality_for=[OTHERS])
+    classifier.setup()
+    return classifier
+
+
+@pytest.mark.parametrize("share_encoder", [False, True])
+def test_shared_tokenization_matches_separate_models(share_encoder):
+    classifier = pipeline(share_encoder)
+    assert classifier.shared_tokenizer
+    assert classifier.shared_encoder == share_encoder
+
+    results = classifier.classify_batch(TEXTS)
+
+    categories = classifier.model_manager.predict_batch(TEXTS)
+    factuality = classifier.factuality_model.predict_batch(TEXTS, return_probs=True)
+    assert len(results) == len(TEXTS)
+    for result, class_id, expected in zip(results, categories, factuality):
+        assert result['class_id'] == class_id
+        assert result['source']['category'] == 'transformer'
+        if class_id == OTHERS:
+            assert result['factuality'] is None
+            continue
+        # Rows are re-padded per subset, so compare probabilities, not argmaxes
+        for label, probability in expected['probabilities'].items():
+            assert result['factuality']['probabilities'][label] == pytest.approx(probability, abs=1e-5)
+
+
+def test_factuality_is_skipped_for_the_others_category():
+    classifier = pipeline()
+    classifier.skip_factuality_for = set(range(5))
+
+    results = classifier.classify_batch(TEXTS)
+
+    assert all(result['factuality'] is None for result in results)
+    assert all('factuality' not in result['source'] for result in results)
+
+
+def test_select_rows_trims_padding_to_the_subset():
+    classifier = pipeline()
+    encoded = classifier.model_manager.tokenize(TEXTS)
+    short = [TEXTS.index("breaking news"), TEXTS.index("flood relief")]
+
+    subset = TweetClassifierPipeline._select_rows(encoded, short)
+
+    assert subset['input_ids'].shape == (2, 2)
+    assert torch.equal(subset['input_ids'], classifier.model_manager.tokenize([TEXTS[i] for i in short])['input_ids'])
@@ -0,0 +1,79 @@
+import asyncio
+
+import pytest
+
+httpx = pytest.importorskip("httpx")
+
+from http_client import DEFAULT_TIMEOUT, ENDPOINT_TIMEOUTS, HTTPClients
+
+
+def clients_with(handler) -> HTTPClients:
+    """HTTPClients whose hosts are served by an in-process handler."""
+    clients = HTTPClients()
+    for host in ("nlp", "search"):
+        clients._clients[host] = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    return clients
+
+
+def timeouts(timeout: httpx.Timeout) -> dict:
+    return {'connect': timeout.connect, 'read': timeout.read, 'write': timeout.write, 'pool': timeout.pool}
+
+
+def test_requests_carry_their_endpoint_timeout():
+    seen = {}
+
+    def handler(request):
+        seen[request.url.path] = request.extensions["timeout"]
+        return httpx.Response(200, json={"ok": True})
+
+    async def run(clients):
+        await clients.request("nlp", "nli", "POST", "http://nlp.test/nli", json={})
+        await clients.request("search", "search", "GET", "http://search.test/search")
+        await clients.request("nlp", "summary", "POST", "http://nlp.test/summary", json={})
+        await clients.aclose()
+
+    asyncio.run(run(clients_with(handler)))
+
+    assert seen["/nli"] == timeouts(ENDPOINT_TIMEOUTS["nli"])
+    assert seen["/search"] == timeouts(ENDPOINT_TIMEOUTS["search"])
+    assert seen["/summary"] == timeouts(DEFAULT_TIMEOUT)
+
+
+def test_transport_errors_are_counted_and_raised():
+    def handler(request):
+        if request.url.path == "/slow":
+            raise httpx.ReadTimeout("timed out", request=request)
+        if request.url.path == "/down":
+            raise httpx.ConnectError("refused", request=request)
+        return httpx.Response(500)
+
+    async def run(clients):
+        for path in ("/slow", "/down"):
+            with pytest.raises(httpx.HTTPError):
+                await clients.request("nlp", "ner", "POST", f"http://nlp.test{path}", json={})
+        # An HTTP error status is a response, not a transport error
+        response = await clients.request("nlp", "ner", "POST", "http://nlp.test/error", json={})
+        assert response.status_code == 500
+        await clients.aclose()
+
+    clients = clients_with(handler)
+    asyncio.run(run(clients))
+
+    ner = clients.metrics()['endpoints']['ner']
+    assert ner['requests'] == 3
+    assert ner['errors'] == 2
+    assert ner['avg_ms'] >= 0.0
+
+
+def test_closed_clients_are_recreated():
+    clients = HTTPClients()
+
+    async def run():
+        first = clients.client("search")
+        await clients.aclose()
+        second = clients.client("search")
+        assert second is not first and not second.is_closed
+        assert clients.client("search") is second
+        await clients.aclose()
+
+    asyncio.run(run())
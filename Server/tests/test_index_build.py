@@ -0,0 +1,85 @@
+from datetime import datetime
+
+import pytest
+
+pytest.importorskip("psycopg2")
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+
+from simhash import SimHashMatcher
+
+
+TWEETS = 30
+
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://")
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE tweets (tweet_id INTEGER PRIMARY KEY, tweet_text TEXT, submit_date TIMESTAMP)"))
+        conn.execute(text("""
+            CREATE TABLE verification_results (
+                id INTEGER PRIMARY KEY, tweet_id INTEGER, status TEXT, verdict TEXT,
+                votes_in_favor_percentage REAL, confidence REAL, factuality TEXT,
+                reason TEXT, created_at TIMESTAMP
+            )
+        """))
+        for tweet_id in range(1, TWEETS + 1):
+            conn.execute(text("INSERT INTO tweets VALUES (:id, :text, '2024-01-01')"),
+                         {"id": tweet_id, "text": f"tweet {tweet_id} about flood relief in karachi number {tweet_id}"})
+            conn.execute(text("""
+                INSERT INTO verification_results (tweet_id, status, verdict, created_at)
+                VALUES (:id, 'verified', 'False', '2024-01-02')
+            """), {"id": tweet_id})
+        # A later verdict for one tweet, and a result that is not verified
+        conn.execute(text("""
+            INSERT INTO verification_results (tweet_id, status, verdict, created_at)
+            VALUES (3, 'verified', 'True', '2024-02-01'), (4, 'pending', 'True', '2024-02-01')
+        """))
+
+    session = sessionmaker(bind=engine)()
+    yield session
+    session.close()
+
+
+def test_iter_tweets_streams_bounded_partitions(db):
+    matcher = SimHashMatcher()
+    chunks = list(matcher.iter_tweets_from_db(db, chunk_size=7))
+
+    assert all(len(chunk) <= 7 for chunk in chunks)
+    rows = [row for chunk in chunks for row in chunk]
+    assert len(rows) == TWEETS + 1
+    assert [row[0] for row in rows] == sorted(row[0] for row in rows)
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_hash_chunks_keeps_chunk_order(db, workers):
+    matcher = SimHashMatcher()
+    chunks = list(matcher.iter_tweets_from_db(db, chunk_size=4))
+
+    hashed = list(matcher._hash_chunks(iter(chunks), workers))
+
+    assert [chunk for chunk, _ in hashed] == chunks
+    for chunk, result in hashed:
+        expected = matcher.calculate_simhash_batch([row[1] for row in chunk])
+        # Pool workers do not send the token lists back
+        assert [(simhash, language) for simhash, _, language in result] == \
+            [(simhash, language) for simhash, _, language in expected]
+
+
+def test_streamed_build_indexes_newest_verdict(db):
+    matcher = SimHashMatcher()
+    matcher.fetch_db_time = lambda session: datetime(2024, 3, 1)
+
+    count = matcher.process_and_index_tweets(db, chunk_size=7, workers=1, save_snapshot=False)
+
+    # Tweet 3 is streamed twice and its newer row replaces the older one
+    assert count == TWEETS + 1
+    assert len(matcher.processed_tweets) == TWEETS
+    assert matcher.processed_tweets[3].verdict == 'True'
+    assert matcher.sync_watermark == datetime(2024, 3, 1)
+
+    simhash = matcher.processed_tweets[5].simhash
+    assert matcher.processed_tweets[5].tweet_text.startswith("tweet 5 ")
+    assert simhash == matcher.calculate_simhash(matcher.processed_tweets[5].tweet_text)[0]
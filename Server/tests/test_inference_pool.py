@@ -0,0 +1,136 @@
+import threading
+import time
+from multiprocessing import Pipe
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+import pytest
+
+pytest.importorskip("torch")
+
+import inference_pool
+from executors import ExecutorSaturated
+from inference_pool import _REQUEST, _RESPONSE, SlotRing, _WorkerHandle
+
+RING_SHAPE = (2, 4, 16, 3)  # slots, max batch, max sequence, max labels
+
+
+class ThreadWorkerContext:
+    """Stands in for a multiprocessing context: the "worker" is a thread
+    speaking the ring protocol. Logits are the row lengths; model key 9 is
+    slow, to provoke timeouts."""
+
+    def Pipe(self, duplex=True):
+        parent, self.child = Pipe(duplex=True)
+
+        class Unclosable:
+            def close(self):
+                pass
+        return parent, Unclosable()
+
+    def Process(self, target, args, name, daemon):
+        conn, shm = self.child, SharedMemory(name=args[1])
+        ring = SlotRing(shm.buf, *RING_SHAPE)
+
+        class Worker:
+            pid = None
+            exitcode = None
+
+            def start(self):
+                threading.Thread(target=self.serve, daemon=True).start()
+
+            def serve(self):
+                while True:
+                    try:
+                        message = conn.recv_bytes()
+                    except (EOFError, OSError):
+                        break
+                    kind, slot, key, batch, seq_len = _REQUEST.unpack_from(message)
+                    if kind == b"Q":
+                        break
+                    if key == 9:
+                        time.sleep(0.5)
+                    ring.logits[slot, :batch, :2] = ring.lengths[slot, :batch, None]
+                    conn.send_bytes(_RESPONSE.pack(b"F", slot, 0, 2))
+                conn.close()
+                ring.release()
+                shm.close()
+
+            def join(self, timeout=None):
+                pass
+
+            def is_alive(self):
+                return False
+        return Worker()
+
+
+@pytest.fixture
+def handle(monkeypatch):
+    monkeypatch.setattr(inference_pool, "FORWARD_TIMEOUT", 0.2)
+    monkeypatch.setattr(inference_pool, "SLOT_WAIT_TIMEOUT", 0.2)
+    handle = _WorkerHandle(0, [], RING_SHAPE)
+    handle.start(ThreadWorkerContext(), {}, RING_SHAPE)
+    yield handle
+    handle.stop()
+
+
+def test_slot_ring_sections_do_not_overlap():
+    size = SlotRing.nbytes(*RING_SHAPE)
+    buffer = bytearray(size)
+    ring = SlotRing(buffer, *RING_SHAPE)
+    ring.input_ids[:] = 1
+    ring.lengths[:] = 2
+    ring.logits[:] = 3.0
+    assert ring.input_ids.nbytes + ring.lengths.nbytes + ring.logits.nbytes == size
+    assert (ring.input_ids == 1).all() and (ring.lengths == 2).all() and (ring.logits == 3.0).all()
+
+
+def test_forward_round_trip(handle):
+    input_ids = np.ones((3, 5), dtype=np.int32)
+    logits = handle.forward(1, input_ids, np.array([5, 3, 1], dtype=np.int32))
+    assert logits.tolist() == [[5, 5], [3, 3], [1, 1]]
+    assert handle.free_slots.qsize() == RING_SHAPE[0]
+
+
+def test_timed_out_slot_is_quarantined_until_the_late_answer(handle):
+    input_ids = np.ones((1, 4), dtype=np.int32)
+    with pytest.raises(TimeoutError):
+        handle.forward(9, input_ids, np.array([4], dtype=np.int32))
+    assert len(handle.quarantined) == 1
+    assert handle.free_slots.qsize() == RING_SHAPE[0] - 1
+
+    time.sleep(0.5)
+    assert not handle.quarantined
+    assert handle.free_slots.qsize() == RING_SHAPE[0]
+    assert handle.metrics()['timeouts'] == 1
+
+
+def test_full_ring_is_rejected_after_the_wait(handle):
+    taken = [handle.free_slots.get() for _ in range(RING_SHAPE[0])]
+    with pytest.raises(ExecutorSaturated):
+        handle.forward(1, np.ones((1, 4), dtype=np.int32), np.array([4], dtype=np.int32))
+    for slot in taken:
+        handle.free_slots.put(slot)
+
+
+def test_worker_exit_fails_waiters_and_reports(handle):
+    exited = threading.Event()
+    handle.on_exit = lambda exited_handle: exited.set()
+    handle.ready = True
+    with handle._send_lock:
+        handle.conn.send_bytes(_REQUEST.pack(b"Q", 0, 0, 0, 0))
+    assert exited.wait(2)
+    assert not handle.alive and not handle.ready
+
+
+def test_restart_frees_every_slot(handle):
+    handle.quarantined.add(0)
+    handle.free_slots.get()
+    generation = handle.generation
+    handle.start(ThreadWorkerContext(), {}, RING_SHAPE)
+    assert handle.generation == generation + 1
+    assert not handle.quarantined
+    assert handle.free_slots.qsize() == RING_SHAPE[0]
+    # A slot of the replaced worker is not handed back twice
+    handle._release_slot(0, generation)
+    assert handle.free_slots.qsize() == RING_SHAPE[0]
@@ -0,0 +1,59 @@
+import pytest
+
+torch = pytest.importorskip("torch")
+pytest.importorskip("transformers")
+
+from factualmodel import FactualityClassifier
+from length_bucketing import TWEET_MAX_LENGTH, bucketed_probabilities, length_buckets
+from xlmmodel import ModelManager
+from tiny_xlmr import TEXTS, WORDS, load_tiny, unpadded_probs
+
+
+def test_length_buckets_group_similar_lengths():
+    lengths = [5, 1, 9, 3, 7, 2, 8]
+
+    buckets = length_buckets(lengths, batch_size=3)
+
+    assert buckets == [[1, 5, 3], [0, 4, 6], [2]]
+    assert sorted(i for bucket in buckets for i in bucket) == list(range(len(lengths)))
+
+
+@pytest.mark.parametrize("classifier,num_labels", [(ModelManager, 5), (FactualityClassifier, 2)])
+def test_bucketed_probabilities_match_unbucketed(classifier, num_labels):
+    model = load_tiny(classifier(), num_labels=num_labels, seed=2)
+    stats = {}
+
+    probs = model.predict_proba(TEXTS, batch_size=3, stats=stats)
+
+    assert probs.shape == (len(TEXTS), num_labels)
+    assert torch.allclose(probs, unpadded_probs(model, TEXTS), atol=1e-5)
+
+    # Bucketing pads less than one batch padded to the longest text
+    longest = max(len(model.tokenizer(text)['input_ids']) for text in TEXTS)
+    assert stats['texts'] == len(TEXTS)
+    assert stats['tokens'] <= stats['padded_tokens'] < longest * len(TEXTS)
+    assert stats['truncated'] == 0
+
+
+def test_offline_runs_truncate_but_live_tokenization_does_not():
+    model = load_tiny(ModelManager(), num_labels=5, seed=2)
+    long_text = " ".join(WORDS * 6)
+    assert len(WORDS) * 6 > TWEET_MAX_LENGTH
+
+    seen = []
+
+    def forward_logits(inputs):
+        seen.append(inputs['input_ids'].shape[1])
+        return torch.zeros((inputs['input_ids'].shape[0], 5))
+
+    stats = {}
+    bucketed_probabilities(model.tokenizer, forward_logits, [long_text, "flood relief"], stats=stats)
+
+    assert max(seen) == TWEET_MAX_LENGTH
+    assert stats['truncated'] == 1
+    assert model.tokenize([long_text])['input_ids'].shape[1] == len(WORDS) * 6
+
+
+def test_empty_input():
+    model = load_tiny(FactualityClassifier(), num_labels=2, seed=2)
+    assert model.predict_proba([]).shape == (0, 0)
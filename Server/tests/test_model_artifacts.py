@@ -0,0 +1,31 @@
+import os
+
+from model_artifacts import CLASSIFIER_FILES, SENTENCE_MODEL_FILES, artifact_path, resolve_model_source
+
+
+def test_artifact_path_is_one_directory_per_revision(tmp_path):
+    root = str(tmp_path)
+
+    assert artifact_path("rain12ali/tweet-classifier", artifact_dir=root) == \
+        os.path.join(root, "rain12ali__tweet-classifier")
+    assert artifact_path("rain12ali/tweet-classifier", "abc123", artifact_dir=root) == \
+        os.path.join(root, "rain12ali__tweet-classifier@abc123")
+
+
+def test_resolve_uses_only_complete_local_snapshots(tmp_path):
+    root = str(tmp_path)
+    path = artifact_path("org/model", "v2", artifact_dir=root)
+    os.makedirs(path)
+
+    # Missing weights: fall back to the hub
+    open(os.path.join(path, "config.json"), "w").close()
+    assert resolve_model_source("org/model", "v2", artifact_dir=root) == ("org/model", False)
+
+    for name in CLASSIFIER_FILES:
+        open(os.path.join(path, name), "w").close()
+    assert resolve_model_source("org/model", "v2", artifact_dir=root) == (path, True)
+
+    # Other revisions and other kinds of model are not matched
+    assert resolve_model_source("org/model", artifact_dir=root) == ("org/model", False)
+    assert resolve_model_source("org/model", "v2", artifact_dir=root,
+                                required_files=SENTENCE_MODEL_FILES) == ("org/model", False)
@@ -0,0 +1,117 @@
+import json
+import threading
+import time
+
+import pytest
+
+pytest.importorskip("torch")
+
+from model_registry import ModelRegistry
+
+
+class FakeModel:
+    def __init__(self, model_name, revision=None):
+        self.model_name = model_name
+        self.revision = revision
+        self.loaded = False
+        self.released = False
+
+    def load_model(self):
+        self.loaded = True
+
+    def release(self):
+        self.released = True
+
+
+class FakePipeline:
+    def __init__(self, models):
+        self.models = models
+
+    def classify_batch(self, texts):
+        return [(self.models['category'].revision, text) for text in texts]
+
+
+def registry(tmp_path, drain_timeout=5.0):
+    return ModelRegistry(
+        factories={'category': FakeModel, 'factuality': FakeModel},
+        build_pipeline=FakePipeline,
+        manifest_path=str(tmp_path / "model_versions.json"),
+        warmup_texts=[],
+        drain_timeout=drain_timeout
+    )
+
+
+def loaded(tmp_path, **kwargs):
+    reg = registry(tmp_path, **kwargs)
+    reg.load({'category': FakeModel("category-model", "v1"), 'factuality': FakeModel("factuality-model", "v1")})
+    return reg
+
+
+def test_lease_before_load_raises(tmp_path):
+    with pytest.raises(RuntimeError):
+        with registry(tmp_path).lease():
+            pass
+
+
+def test_deploy_swaps_and_releases_the_idle_old_version(tmp_path):
+    reg = loaded(tmp_path)
+    old = reg.model('category')
+
+    described = reg.deploy('category', "category-model", "v2")
+
+    assert described['state'] == 'active' and described['revision'] == "v2"
+    assert reg.classify_batch(["tweet"]) == [("v2", "tweet")]
+    assert old.released
+    assert reg.status()['category']['history'][0]['state'] == 'retired'
+
+    # Same source again is a no-op
+    assert reg.deploy('category', "category-model", "v2")['activated_at'] == described['activated_at']
+
+
+def test_leased_version_drains_before_release(tmp_path):
+    reg = loaded(tmp_path)
+    old = reg.model('category')
+
+    with reg.lease() as pipeline:
+        deployer = threading.Thread(target=reg.deploy, args=('category', "category-model", "v2"))
+        deployer.start()
+        while reg.status()['category']['active']['revision'] != "v2":
+            time.sleep(0.01)
+
+        # New leases already get the new version; the held one keeps the old
+        assert reg.classify_batch(["new"]) == [("v2", "new")]
+        assert pipeline.classify_batch(["old"]) == [("v1", "old")]
+        assert reg.status()['category']['draining'][0]['in_flight'] == 1
+        assert not old.released
+
+    deployer.join(5)
+    assert old.released
+    assert reg.status()['category']['draining'] == []
+
+
+def test_drain_timeout_defers_release_to_the_last_lease(tmp_path):
+    reg = loaded(tmp_path, drain_timeout=0.05)
+    old = reg.model('category')
+
+    with reg.lease():
+        reg.deploy('category', "category-model", "v2")
+        assert reg.status()['category']['history'][0]['state'] == 'retired'
+        assert not old.released
+
+    assert old.released
+
+
+def test_apply_manifest_deploys_changed_slots_once(tmp_path):
+    reg = loaded(tmp_path)
+    with open(reg.manifest_path, "w", encoding="utf-8") as f:
+        json.dump({
+            'category': {'model_name': "category-model", 'revision': "v3", 'version': "three"},
+            'factuality': {'model_name': "factuality-model", 'revision': "v1"},
+            'unknown': {'model_name': "x"}
+        }, f)
+
+    deployed = reg.apply_manifest()
+
+    assert [entry['version'] for entry in deployed] == ["three"]
+    assert reg.model('category').loaded
+    assert reg.apply_manifest() == []
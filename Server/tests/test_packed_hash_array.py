@@ -0,0 +1,73 @@
+import random
+
+import numpy as np
+
+import simhash_index
+from simhash_index import PackedHashArray, SimHashIndex, popcount64
+
+
+def reference(hashes, query):
+    return sorted(((tweet_id, (query ^ simhash).bit_count()) for tweet_id, simhash in hashes.items()),
+                  key=lambda pair: (pair[1], pair[0]))
+
+
+def build(count: int, seed: int = 0):
+    rng = random.Random(seed)
+    hashes = {tweet_id: rng.getrandbits(64) for tweet_id in range(count)}
+    packed = PackedHashArray(capacity=4)
+    packed.extend(list(hashes), list(hashes.values()))
+    return rng, hashes, packed
+
+
+def test_popcount_matches_python():
+    rng = random.Random(1)
+    values = [rng.getrandbits(64) for _ in range(1000)] + [0, (1 << 64) - 1]
+    counts = popcount64(np.array(values, dtype=np.uint64))
+    assert counts.tolist() == [value.bit_count() for value in values]
+
+
+def test_radius_and_top_k_match_reference():
+    rng, hashes, packed = build(500)
+    for _ in range(20):
+        query = rng.getrandbits(64)
+        expected = reference(hashes, query)
+        assert packed.radius(query, 28) == [pair for pair in expected if pair[1] <= 28]
+        assert [distance for _, distance in packed.top_k(query, 7)] == [distance for _, distance in expected[:7]]
+
+
+def test_batch_scan_matches_single_queries(monkeypatch):
+    rng, hashes, packed = build(300)
+    # Force several query blocks
+    monkeypatch.setattr(simhash_index, "BATCH_SCAN_CELLS", 1000)
+    queries = [rng.getrandbits(64) for _ in range(25)]
+
+    batched = packed.batch_scan(queries, max_distance=26)
+    assert batched == [packed.radius(query, 26) for query in queries]
+
+    nearest = packed.batch_scan(queries, k=3)
+    assert [[distance for _, distance in pairs] for pairs in nearest] == \
+        [[distance for _, distance in packed.top_k(query, 3)] for query in queries]
+
+
+def test_add_overwrites_and_remove_swaps_last_row():
+    rng, hashes, packed = build(50)
+    packed.add(10, 0)
+    hashes[10] = 0
+    for tweet_id in (0, 49, 25):
+        assert packed.remove(tweet_id)
+        del hashes[tweet_id]
+    assert not packed.remove(0)
+
+    assert len(packed) == len(hashes)
+    assert dict(zip(packed.ids.tolist(), packed.hashes.tolist())) == hashes
+    assert packed.radius(0, 0) == [(10, 0)]
+
+
+def test_agrees_with_banded_index():
+    rng, hashes, packed = build(400, seed=3)
+    index = SimHashIndex(max_distance=9, probe_radius=1)
+    for tweet_id, simhash in hashes.items():
+        index.add(tweet_id, simhash)
+    for tweet_id in rng.sample(list(hashes), 20):
+        query = hashes[tweet_id] ^ (1 << rng.randrange(64)) ^ (1 << rng.randrange(64))
+        assert index.query(query) == packed.radius(query, 9)
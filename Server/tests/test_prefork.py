@@ -0,0 +1,87 @@
+import gc
+import os
+import signal
+import socket
+import time
+
+import pytest
+
+if not hasattr(os, "fork"):
+    pytest.skip("prefork needs fork()", allow_module_level=True)
+
+import prefork
+
+
+class FakeRegistry:
+    def __init__(self):
+        self.calls = 0
+
+    def apply_manifest(self):
+        self.calls += 1
+        return [{'version': "v2"}] if self.calls == 1 else []
+
+
+class FakeMain:
+    def __init__(self):
+        self.model_registry = FakeRegistry()
+
+
+def idle_worker(main, sock, threads):
+    time.sleep(30)
+
+
+class RecordingServer(prefork.PreforkServer):
+    """Stops itself once `stop_after` workers have been started."""
+
+    def __init__(self, *args, stop_after, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.stop_after = stop_after
+        self.started = []
+
+    def spawn(self, number):
+        super().spawn(number)
+        self.started.append(number)
+        if len(self.started) == self.stop_after:
+            self.stop()
+
+
+@pytest.fixture
+def listen_socket():
+    sock = prefork.bind_socket("127.0.0.1", 0)
+    yield sock
+    sock.close()
+
+
+@pytest.fixture
+def fast_loop(monkeypatch):
+    monkeypatch.setattr(prefork, "run_worker", idle_worker)
+    monkeypatch.setattr(prefork, "MANIFEST_INTERVAL", 0)
+    monkeypatch.setattr(prefork, "ROLLING_RESTART_INTERVAL", 0)
+    monkeypatch.setattr(prefork, "RESTART_BACKOFF", 0)
+    handlers = signal.getsignal(signal.SIGTERM), signal.getsignal(signal.SIGINT)
+    yield
+    signal.signal(signal.SIGTERM, handlers[0])
+    signal.signal(signal.SIGINT, handlers[1])
+    gc.unfreeze()
+
+
+def test_bind_socket_is_inheritable(listen_socket):
+    assert listen_socket.get_inheritable()
+    assert listen_socket.type == socket.SOCK_STREAM
+    assert listen_socket.getsockname()[1] > 0
+
+
+def test_deploy_in_master_restarts_workers_one_at_a_time(listen_socket, fast_loop):
+    main = FakeMain()
+    server = RecordingServer(main, listen_socket, workers=2, threads=1, stop_after=4)
+
+    start_time = time.time()
+    server.run()
+
+    # Both workers started, then each replaced once after the master deployed;
+    # the last one is stopped right after fork() without waiting out its sleep
+    assert server.started == [0, 1, 0, 1]
+    assert time.time() - start_time < prefork.SHUTDOWN_TIMEOUT
+    assert main.model_registry.calls >= 1
+    assert server.children == {}
+    assert server.restart_queue == []
@@ -0,0 +1,33 @@
+import pytest
+
+torch = pytest.importorskip("torch")
+pytest.importorskip("transformers")
+
+from quantization import check_parity, quantize_dynamic_int8
+from xlmmodel import ModelManager
+from tiny_xlmr import TEXTS, load_tiny
+
+
+def test_dynamic_int8_replaces_linear_layers_and_keeps_the_original():
+    model = load_tiny(ModelManager(), num_labels=5, seed=5).model
+
+    quantized, report = quantize_dynamic_int8(model)
+
+    assert not any(type(module) is torch.nn.Linear for module in quantized.modules())
+    assert any(type(module) is torch.nn.Linear for module in model.modules())
+    assert set(report) == {'fp32_mb', 'int8_mb', 'saved_mb', 'ratio'}
+
+
+def test_parity_of_a_model_with_itself_and_its_int8_copy():
+    reference = load_tiny(ModelManager(), num_labels=5, seed=5)
+    candidate = load_tiny(ModelManager(), num_labels=5, seed=5)
+    candidate.model, _ = quantize_dynamic_int8(candidate.model)
+
+    same = check_parity(reference, reference, TEXTS, batch_size=3)
+    assert same['texts'] == len(TEXTS)
+    assert same['label_agreement'] == 1.0
+    assert same['max_logit_diff'] == 0.0
+
+    report = check_parity(reference, candidate, TEXTS, batch_size=3)
+    assert 0.0 <= report['label_agreement'] <= 1.0
+    assert report['max_logit_diff'] < 0.5
@@ -0,0 +1,81 @@
+import time
+
+import pytest
+
+import search_cache
+from search_cache import SearchCache, cache_key, canonical_query
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = SearchCache(str(tmp_path / "search_cache.sqlite3"), ttl=60, empty_ttl=5)
+    yield cache
+    cache.close()
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1_000_000.0]
+    monkeypatch.setattr(search_cache.time, "time", lambda: now[0])
+    return now
+
+
+def params(q: str, **extra):
+    return {"key": "k", "cx": "c", "q": q, "num": 10, "lr": "lang_en", **extra}
+
+
+def test_canonical_query_ignores_case_spacing_and_site_exclusions():
+    assert canonical_query("  Petrol  PRICE -site:a.com  hike -site:b.pk") == "petrol price hike"
+    assert cache_key(params("Petrol price")) == cache_key(params("petrol  price -site:x.com", key="other"))
+    assert cache_key(params("petrol price")) != cache_key(params("petrol price", dateRestrict="d7"))
+
+
+def test_hit_and_miss_counters(cache):
+    items = [{"title": "t", "link": "https://example.com/a", "snippet": "s"}]
+    assert cache.get(params("budget")) is None
+    cache.put(params("budget"), items)
+    assert cache.get(params("Budget")) == items
+
+    stats = cache.get_statistics()
+    assert (stats['hits'], stats['misses'], stats['stores'], stats['entries']) == (1, 1, 1, 1)
+
+
+def test_entries_expire_after_ttl(cache, clock):
+    cache.put(params("full"), [{"link": "x"}])
+    cache.put(params("empty"), [])
+
+    clock[0] += 10
+    assert cache.get(params("empty")) is None
+    assert cache.get(params("full")) == [{"link": "x"}]
+
+    clock[0] += 60
+    assert not cache.contains(params("full"))
+    assert cache.get(params("full")) is None
+    assert cache.expired == 2
+
+
+def test_contains_does_not_count_or_refresh(cache, clock):
+    cache.put(params("a"), [])
+    assert cache.contains(params("A"))
+    assert not cache.contains(params("b"))
+    assert (cache.hits, cache.misses) == (0, 0)
+
+
+def test_evicts_least_recently_used(tmp_path, clock):
+    cache = SearchCache(str(tmp_path / "search_cache.sqlite3"), ttl=60, max_bytes=1000)
+    item = [{"snippet": "x" * 180}]
+    for name in ("a", "b", "c", "d"):
+        cache.put(params(name), item)
+        clock[0] += 1
+    # "a" is now the most recently used entry
+    assert cache.get(params("a")) == item
+    clock[0] += 1
+
+    cache.put(params("e"), item)
+    cache.put(params("f"), item)
+
+    assert cache.evictions >= 1
+    assert cache.contains(params("a"))
+    assert not cache.contains(params("b"))
+    assert cache.get_statistics()['size_bytes'] <= 1000
+    cache.close()
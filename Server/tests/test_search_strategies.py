@@ -0,0 +1,99 @@
+import asyncio
+from datetime import date, timedelta
+
+import pytest
+
+crossverify = pytest.importorskip("crossverify")
+
+from crossverify import SearchQuota, run_search_strategies
+
+
+@pytest.fixture
+def quota(monkeypatch):
+    quota = SearchQuota(daily_limit=100, reserve=10)
+    monkeypatch.setattr(crossverify, "search_quota", quota)
+    return quota
+
+
+def fake_search(results, delays=None, calls=None):
+    """search_fn returning results[q] after delays[q] seconds, recording calls."""
+    async def search(params):
+        if calls is not None:
+            calls.append(params["q"])
+        await asyncio.sleep((delays or {}).get(params["q"], 0))
+        return results.get(params["q"], [])
+    return search
+
+
+def strategies(*queries):
+    return [(f"strategy {q}", {"q": q}) for q in queries]
+
+
+def test_speculative_calls_respect_reserve(quota):
+    assert quota.speculative_calls(2) == 2
+    quota.consume(89)
+    assert quota.speculative_calls(2) == 1
+    quota.consume(5)
+    assert quota.speculative_calls(2) == 0
+    assert SearchQuota(daily_limit=None).speculative_calls(3) == 3
+
+
+def test_quota_resets_each_day(quota):
+    quota.consume(50)
+    quota.day = date.today() - timedelta(days=2)
+    assert quota.remaining() == 100
+
+
+def test_primary_wins_even_when_a_fallback_answers_first(quota):
+    calls = []
+    search = fake_search({"a": ["primary"], "b": ["fallback"]}, delays={"a": 0.05}, calls=calls)
+    result = asyncio.run(run_search_strategies(strategies("a", "b", "c"), search, speculative_calls=2))
+
+    assert result == ["primary"]
+    assert calls == ["a", "b", "c"]
+    assert (quota.speculative, quota.wasted) == (2, 2)
+
+
+def test_falls_back_in_priority_order(quota):
+    search = fake_search({"b": ["second"], "c": ["third"]}, delays={"b": 0.05})
+    result = asyncio.run(run_search_strategies(strategies("a", "b", "c"), search, speculative_calls=2))
+    assert result == ["second"]
+    assert quota.wasted == 1
+
+
+def test_no_speculation_without_quota_to_spare(quota):
+    quota.consume(95)
+    calls = []
+    search = fake_search({"b": ["fallback"]}, calls=calls)
+    result = asyncio.run(run_search_strategies(strategies("a", "b"), search, speculative_calls=1))
+    assert result == ["fallback"]
+    assert calls == ["a", "b"]
+    assert quota.speculative == 0
+
+
+def test_cached_primary_runs_alone(quota):
+    calls = []
+    search = fake_search({"a": ["cached"]}, calls=calls)
+
+    async def is_cached(params):
+        return params["q"] == "a"
+
+    result = asyncio.run(run_search_strategies(strategies("a", "b", "c"), search, speculative_calls=2,
+                                               is_cached=is_cached))
+    assert result == ["cached"]
+    assert calls == ["a"]
+    assert (quota.speculative, quota.wasted) == (0, 0)
+
+
+def test_empty_cached_primary_still_falls_back(quota):
+    calls = []
+    search = fake_search({"c": ["third"]}, calls=calls)
+
+    async def is_cached(params):
+        return params["q"] == "a"
+
+    result = asyncio.run(run_search_strategies(strategies("a", "b", "c"), search, speculative_calls=1,
+                                               is_cached=is_cached))
+    assert result == ["third"]
+    assert calls == ["a", "b", "c"]
+    assert quota.speculative == 1
@@ -0,0 +1,91 @@
+import numpy as np
+import pytest
+
+from semantic_index import IVFIndex
+
+
+def clustered_vectors(count: int, dim: int = 32, clusters: int = 40, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dim))
+    vectors = centers[rng.integers(0, clusters, count)] + 0.3 * rng.normal(size=(count, dim))
+    return rng, vectors.astype(np.float32)
+
+
+def exact_top_k(vectors, query, k):
+    unit = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    scores = unit @ (query / np.linalg.norm(query))
+    return np.argsort(-scores)[:k].tolist(), scores
+
+
+@pytest.mark.parametrize("dtype", ["int8", "float16"])
+def test_flat_scan_below_training_size_is_exact(dtype):
+    rng, vectors = clustered_vectors(300)
+    index = IVFIndex(32, dtype=dtype)
+    index.add(range(300), vectors)
+    assert index.centroids is None
+
+    for query in vectors[:10] + 0.05 * rng.normal(size=(10, 32)):
+        expected, scores = exact_top_k(vectors, query, 1)
+        (best, score), = index.search(query, k=1)
+        assert best == expected[0]
+        assert score == pytest.approx(scores[best], abs=0.02)
+
+
+def test_ivf_recall_against_exact_search():
+    rng, vectors = clustered_vectors(4000)
+    index = IVFIndex(32, min_train_size=1000, nprobe=8)
+    index.add(range(4000), vectors)
+    assert index.centroids is not None
+
+    hits = 0
+    queries = vectors[rng.choice(4000, 50, replace=False)] + 0.1 * rng.normal(size=(50, 32))
+    for query in queries:
+        expected, _ = exact_top_k(vectors, query, 10)
+        found = [item_id for item_id, _ in index.search(query, k=10)]
+        hits += len(set(found) & set(expected))
+    assert hits / (10 * len(queries)) >= 0.9
+
+
+def test_replace_remove_and_retrain():
+    _, vectors = clustered_vectors(1500)
+    index = IVFIndex(32, min_train_size=1000)
+    index.add(range(1500), vectors)
+
+    index.add([7], -vectors[7:8])
+    assert index.search(-vectors[7], k=1)[0][0] == 7
+    assert index.remove(8)
+    assert not index.remove(8)
+    assert 8 not in index
+    assert all(item_id != 8 for item_id, _ in index.search(vectors[8], k=20))
+
+    index.train()
+    assert len(index) == 1499
+    assert index.get_statistics()['pending_rows'] == 0
+    assert index.search(-vectors[7], k=1)[0][0] == 7
+
+
+def test_save_load_round_trip(tmp_path):
+    rng, vectors = clustered_vectors(1500)
+    index = IVFIndex(32, min_train_size=1000)
+    index.add(range(100, 1600), vectors)
+    index.remove(100)
+    path = str(tmp_path / "helper.semantic.npz")
+    index.save(path, metadata={'hashes': np.arange(3)})
+
+    loaded = IVFIndex(32, min_train_size=1000)
+    arrays = loaded.load(path)
+    assert arrays['hashes'].tolist() == [0, 1, 2]
+    assert sorted(loaded.ids.tolist()) == list(range(101, 1600))
+    for query in vectors[rng.choice(1500, 10)]:
+        assert loaded.search(query, k=5) == index.search(query, k=5)
+    assert [p.name for p in tmp_path.iterdir() if ".tmp" in p.name] == []
+
+
+def test_load_rejects_other_dimensions(tmp_path):
+    _, vectors = clustered_vectors(10)
+    index = IVFIndex(32)
+    index.add(range(10), vectors)
+    path = str(tmp_path / "index.npz")
+    index.save(path)
+    with pytest.raises(ValueError):
+        IVFIndex(16).load(path)
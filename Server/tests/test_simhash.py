@@ -0,0 +1,97 @@
+import hashlib
+import random
+
+import numpy as np
+import pytest
+
+pytest.importorskip("psycopg2")
+
+from simhash import SimHashMatcher, SIMHASH_TIE_EPSILON
+
+
+VOCABULARY = (
+    "breaking news pakistan government minister election cricket match "
+    "economy inflation rupee dollar imf loan flood relief karachi lahore "
+    "islamabad court verdict protest police report claim fake video viral "
+    "پاکستان حکومت وزیر انتخابات کرکٹ میچ معیشت مہنگائی روپیہ سیلاب عدالت"
+).split()
+
+SENTENCES = [
+    "BREAKING: Chinese scientists developing a drug to extend human life to 150 years",
+    "The State Bank of Pakistan raised the policy rate by 100 basis points today",
+    "وزیر اعظم نے سیلاب متاثرین کے لیے امدادی پیکج کا اعلان کر دیا",
+    "Pakistan beat India by 5 wickets in the Asia Cup final at Dubai",
+    "news news news news flood flood relief relief",
+    "",
+    "!!! ??? ...",
+]
+
+
+def corpus(size: int = 300, seed: int = 3):
+    rng = random.Random(seed)
+    texts = list(SENTENCES)
+    for _ in range(size):
+        # Short texts with repeated tokens produce the exact ties SIMHASH_TIE_EPSILON covers
+        texts.append(" ".join(rng.choice(VOCABULARY) for _ in range(rng.randint(1, 12))))
+    return texts
+
+
+def reference_vector(matcher: SimHashMatcher, tokens):
+    """The original per-token, per-bit loop from before vectorization."""
+    tf_weights = matcher.calculate_tf_weight(tokens)
+    vector = np.zeros(matcher.hash_bits, dtype=np.float64)
+    for token in tokens:
+        weight = tf_weights.get(token, 1.0)
+        hash_bytes = hashlib.md5(token.encode('utf-8')).digest()
+        if matcher.hash_bits <= 64:
+            hash_int = int.from_bytes(hash_bytes[:8], 'big')
+        else:
+            hash_int = int.from_bytes(hash_bytes[:16], 'big')
+        for i in range(matcher.hash_bits):
+            if hash_int & (1 << (i % 64)):
+                vector[i] += weight
+            else:
+                vector[i] -= weight
+    return vector
+
+
+@pytest.mark.parametrize("hash_bits", [64, 128])
+def test_vectorized_simhash_matches_per_bit_loop_except_on_ties(hash_bits):
+    matcher = SimHashMatcher(hash_bits=hash_bits)
+    texts = corpus()
+
+    batch = matcher.calculate_simhash_batch(texts)
+    assert len(batch) == len(texts)
+
+    tie_bits = 0
+    for text, batched in zip(texts, batch):
+        single = matcher.calculate_simhash(text)
+        assert batched == single
+
+        simhash, tokens, _ = single
+        if not tokens:
+            assert simhash == 0
+            continue
+
+        vector = reference_vector(matcher, tokens)
+        for i in range(hash_bits):
+            bit = (simhash >> i) & 1
+            if abs(vector[i]) <= SIMHASH_TIE_EPSILON:
+                # Ties are always unset now; the loop set them on rounding noise
+                assert bit == 0
+                tie_bits += 1
+            else:
+                assert bit == int(vector[i] > 0), (text, i)
+
+    # The corpus must actually exercise the tie rule
+    assert tie_bits > 0
+
+
+def test_token_bit_vector_matches_md5_bits():
+    from simhash import token_bit_vector
+
+    for token in ["pakistan", "سیلاب", "x"]:
+        hash_int = int.from_bytes(hashlib.md5(token.encode('utf-8')).digest()[:8], 'big')
+        expected = [1 if hash_int & (1 << i) else -1 for i in range(64)]
+        assert token_bit_vector(token, 64).tolist() == expected
+        assert not token_bit_vector(token, 64).flags.writeable
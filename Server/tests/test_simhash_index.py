@@ -0,0 +1,85 @@
+import random
+
+import pytest
+
+from simhash_index import SimHashIndex
+
+
+def flip_bits(value: int, count: int, rng: random.Random, hash_bits: int = 64) -> int:
+    for bit in rng.sample(range(hash_bits), count):
+        value ^= 1 << bit
+    return value
+
+
+def brute_force(hashes, query, max_distance):
+    pairs = [(tweet_id, (query ^ simhash).bit_count()) for tweet_id, simhash in hashes.items()]
+    return sorted((pair for pair in pairs if pair[1] <= max_distance), key=lambda pair: (pair[1], pair[0]))
+
+
+@pytest.mark.parametrize("max_distance,probe_radius", [(3, 0), (9, 1), (11, 2)])
+def test_query_matches_brute_force_within_guaranteed_radius(max_distance, probe_radius):
+    rng = random.Random(max_distance)
+    index = SimHashIndex(max_distance=max_distance, probe_radius=probe_radius)
+    assert index.guaranteed_distance() >= max_distance
+
+    hashes = {}
+    centers = [rng.getrandbits(64) for _ in range(20)]
+    for tweet_id in range(600):
+        # Clusters of near-duplicates plus unrelated noise
+        if tweet_id % 3:
+            simhash = flip_bits(rng.choice(centers), rng.randint(0, max_distance + 3), rng)
+        else:
+            simhash = rng.getrandbits(64)
+        hashes[tweet_id] = simhash
+        index.add(tweet_id, simhash)
+
+    for center in centers:
+        query = flip_bits(center, rng.randint(0, 2), rng)
+        assert index.query(query) == brute_force(hashes, query, max_distance)
+
+
+def test_replace_and_remove_keep_tables_consistent():
+    index = SimHashIndex(max_distance=5, probe_radius=1)
+    index.add(1, 0)
+    index.add(2, 0b111)
+    index.add(1, (1 << 64) - 1)
+
+    assert index.query(0) == [(2, 3)]
+    assert index.remove(2)
+    assert not index.remove(2)
+    assert index.query(0) == []
+    assert len(index) == 1
+    assert [len(table) for table in index.tables] == [1] * index.num_bands
+    assert index.candidates((1 << 64) - 1) == {1}
+
+
+@pytest.mark.parametrize("hash_bits", [64, 128])
+def test_rows_freed_by_removals_are_reused(hash_bits):
+    rng = random.Random(hash_bits)
+    index = SimHashIndex(hash_bits=hash_bits, max_distance=9)
+    hashes = {}
+    for tweet_id in range(2000):
+        hashes[tweet_id] = rng.getrandbits(hash_bits)
+        index.add(tweet_id, hashes[tweet_id])
+    for tweet_id in range(0, 2000, 2):
+        index.remove(tweet_id)
+        del hashes[tweet_id]
+    for tweet_id in range(2000, 3000):
+        hashes[tweet_id] = flip_bits(rng.choice(list(hashes.values())), rng.randint(0, 9), rng, hash_bits)
+        index.add(tweet_id, hashes[tweet_id])
+
+    assert len(index) == len(hashes)
+    assert index.get_statistics()['indexed_hashes'] == len(hashes)
+    for query in rng.sample(sorted(hashes.values()), 100):
+        assert index.query(query) == brute_force(hashes, query, 9)
+
+
+def test_fewer_bands_lower_the_guarantee():
+    index = SimHashIndex(max_distance=9, probe_radius=1)
+    assert index.guaranteed_distance(bands=2) == 3
+    assert index.guaranteed_distance(probe_radius=0) == index.num_bands - 1
+
+
+def test_invalid_band_count():
+    with pytest.raises(ValueError):
+        SimHashIndex(num_bands=65)
@@ -0,0 +1,83 @@
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+
+from simhash_store import HEADER, SimHashSnapshot, SnapshotError, write_snapshot
+
+
+def record(tweet_id: int, **fields):
+    values = {
+        'tweet_id': tweet_id,
+        'simhash': (tweet_id * 0x9E3779B97F4A7C15) % (1 << 64),
+        'tweet_text': f"tweet {tweet_id}",
+        'status': 'verified',
+        'verdict': 'true',
+        'factuality': 'factual',
+        'reason': '',
+        'language': 'english',
+        'votes_in_favor_percentage': 50.0 + tweet_id % 50,
+        'confidence': 0.5,
+        'verification_date': datetime(2024, 1, 1, 12, 0, tweet_id % 60),
+        'tweet_date': None,
+    }
+    values.update(fields)
+    return SimpleNamespace(**values)
+
+
+def test_round_trip(tmp_path):
+    path = str(tmp_path / "helper.simhash")
+    tweets = [record(i) for i in range(25)]
+    tweets.append(record(99, tweet_text="وزیر اعظم نے بجٹ کا اعلان کر دیا", language='urdu',
+                         simhash=(1 << 64) - 1, reason="ماخذ: ریڈیو پاکستان"))
+
+    assert write_snapshot(path, tweets, config={'lsh_bands': 5}, chunk_size=7) == len(tweets)
+
+    snapshot = SimHashSnapshot(path)
+    try:
+        assert len(snapshot) == len(tweets)
+        assert snapshot.config == {'lsh_bands': 5}
+        for row, tweet in enumerate(tweets):
+            assert snapshot.row(row) == vars(tweet)
+    finally:
+        snapshot.close()
+
+
+def test_empty_snapshot(tmp_path):
+    path = str(tmp_path / "helper.simhash")
+    assert write_snapshot(path, []) == 0
+    snapshot = SimHashSnapshot(path)
+    assert len(snapshot) == 0
+    assert len(snapshot.simhashes) == 0
+    snapshot.close()
+
+
+def test_corruption_fails_checksum(tmp_path):
+    path = tmp_path / "helper.simhash"
+    write_snapshot(str(path), [record(i) for i in range(10)])
+
+    data = bytearray(path.read_bytes())
+    data[data.index(b"tweet 5")] ^= 0xFF
+    path.write_bytes(bytes(data))
+
+    with pytest.raises(SnapshotError):
+        SimHashSnapshot(str(path))
+    SimHashSnapshot(str(path), verify_checksum=False).close()
+
+
+def test_rejects_other_files(tmp_path):
+    path = tmp_path / "helper.simhash"
+    path.write_bytes(b"{}" + b"\0" * HEADER.size)
+    with pytest.raises(SnapshotError):
+        SimHashSnapshot(str(path))
+
+
+def test_rewrite_leaves_no_temporary_files(tmp_path):
+    path = str(tmp_path / "helper.simhash")
+    write_snapshot(path, [record(1)])
+    write_snapshot(path, [record(2), record(3)])
+
+    snapshot = SimHashSnapshot(path)
+    assert snapshot.tweet_ids.tolist() == [2, 3]
+    snapshot.close()
+    assert sorted(p.name for p in tmp_path.iterdir()) in (["helper.simhash"], ["helper.simhash", "helper.simhash.lock"])
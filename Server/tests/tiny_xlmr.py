@@ -0,0 +1,65 @@
+"""Randomly initialised, tiny XLM-R classifiers and a word-level fast tokenizer,
+so classifier code can be exercised without downloading the real models."""
+
+import torch
+from tokenizers import Tokenizer, models, pre_tokenizers
+from transformers import PreTrainedTokenizerFast, XLMRobertaConfig, XLMRobertaForSequenceClassification
+
+WORDS = (
+    "breaking news pakistan government minister election cricket match economy "
+    "inflation rupee dollar loan flood relief karachi lahore court verdict protest "
+    "police report claim video viral team won lost today says"
+).split()
+
+TEXTS = [
+    "breaking news",
+    "pakistan cricket team won the match today",
+    "government says inflation and the rupee dollar rate are under control",
+    "flood relief",
+    "viral video claim police report karachi lahore protest court verdict minister says",
+    "economy",
+    "election today",
+]
+
+
+def make_tokenizer() -> PreTrainedTokenizerFast:
+    # XLM-R's special token ids; pad must be 1 (the model's padding_idx)
+    vocab = {"<s>": 0, "<pad>": 1, "</s>": 2, "<unk>": 3}
+    for word in WORDS:
+        vocab[word] = len(vocab)
+
+    tokenizer = Tokenizer(models.WordLevel(vocab, unk_token="<unk>"))
+    tokenizer.pre_tokenizer = pre_tokenizers.Whitespace()
+    return PreTrainedTokenizerFast(tokenizer_object=tokenizer, pad_token="<pad>", unk_token="<unk>",
+                                   bos_token="<s>", eos_token="</s>", model_max_length=512)
+
+
+def make_model(num_labels: int, seed: int) -> XLMRobertaForSequenceClassification:
+    torch.manual_seed(seed)
+    config = XLMRobertaConfig(
+        vocab_size=len(WORDS) + 4,
+        hidden_size=16,
+        num_hidden_layers=1,
+        num_attention_heads=2,
+        intermediate_size=32,
+        max_position_embeddings=130,
+        pad_token_id=1,
+        num_labels=num_labels
+    )
+    return XLMRobertaForSequenceClassification(config).eval()
+
+
+def load_tiny(classifier, num_labels: int, seed: int):
+    """Put a tiny model and tokenizer into a ModelManager / FactualityClassifier."""
+    classifier.model = make_model(num_labels, seed)
+    classifier.tokenizer = make_tokenizer()
+    return classifier
+
+
+def unpadded_probs(classifier, texts):
+    """Reference probabilities: every text on its own, no padding at all."""
+    rows = []
+    for text in texts:
+        logits = classifier.forward_logits(classifier.tokenize([text]))
+        rows.append(torch.softmax(logits.float(), dim=1)[0])
+    return torch.stack(rows)
@@ -1,33 +1,174 @@
 #xlmmodel.py
 
-from transformers import XLMRobertaForSequenceClassification, XLMRobertaTokenizer, BitsAndBytesConfig
+from transformers import XLMRobertaForSequenceClassification, XLMRobertaTokenizerFast, BitsAndBytesConfig
 import torch
 
+from quantization import configure_torch_threads, quantize_dynamic_int8
+from length_bucketing import BUCKET_BATCH_SIZE, MODEL_MAX_LENGTH, bucketed_probabilities
+from model_artifacts import resolve_model_source
+
 class ModelManager:
-    def __init__(self, model_name="rain12ali/tweet-classifier-xlm-roberta"):
+    def __init__(self, model_name="rain12ali/tweet-classifier-xlm-roberta", backend="torch",
+                 quantize=False, num_threads=None, num_interop_threads=None, revision=None,
+                 inference_pool=None):
+        """
+        backend: "torch", "onnx" for ONNX Runtime on CPU (see onnx_backend.py),
+            or "pool" for forward passes in worker processes (inference_pool.py)
+        quantize: int8 weights on CPU - the quantized ONNX model, or torch
+            dynamic quantization of the Linear layers (see quantization.py)
+        num_threads / num_interop_threads: torch CPU thread settings
+        revision: Hub branch, tag or commit to load (None = default branch;
+            see model_registry.py for hot swaps)
+        inference_pool: InferencePool serving backend="pool"
+        """
+        if backend not in ("torch", "onnx", "pool"):
+            raise ValueError(f"Unknown backend: {backend}")
+        if backend == "pool" and inference_pool is None:
+            raise ValueError("backend='pool' needs an inference_pool")
         self.model_name = model_name
+        self.revision = revision
+        self.backend = backend
+        self.quantize = quantize
+        self.num_threads = num_threads
+        self.num_interop_threads = num_interop_threads
+        self.quantization_report = None
         self.model = None
+        self.onnx_model = None
+        self.inference_pool = inference_pool
+        self.pooled_model = None
         self.tokenizer = None
 
+        self.label_map = {
+            0: 'cricket',
+            1: 'economy',
+            2: 'international_relations',
+            3: 'others',
+            4: 'politics'
+        }
+
     def load_model(self):
+        if self.backend == "onnx":
+            return self._load_onnx_model()
+        if self.backend == "pool":
+            return self._load_pooled_model()
+
         print("🔄 Loading model and tokenizer...")
+        configure_torch_threads(self.num_threads, self.num_interop_threads)
 
         quantization_config = BitsAndBytesConfig(load_in_8bit=True) if torch.cuda.is_available() else None
+        source, options = self._source()
 
+        # Safetensors weights are memory-mapped rather than copied
         self.model = XLMRobertaForSequenceClassification.from_pretrained(
-            self.model_name,
+            source,
+            **options,
+            low_cpu_mem_usage=True,
             device_map="auto" if torch.cuda.is_available() else None,
             quantization_config=quantization_config
         )
 
-        self.tokenizer = XLMRobertaTokenizer.from_pretrained(self.model_name)
+        self.tokenizer = XLMRobertaTokenizerFast.from_pretrained(source, **options)
+
+        # bitsandbytes already quantizes on GPU; on CPU use torch dynamic int8
+        if self.quantize and not torch.cuda.is_available():
+            self.model, self.quantization_report = quantize_dynamic_int8(self.model)
 
         print("✅ Model loaded successfully.")
 
+    def _load_onnx_model(self):
+        from onnx_backend import OnnxClassifier, ensure_onnx_model
+
+        print("🔄 Loading ONNX model and tokenizer...")
+        source, options = self._source()
+        self.tokenizer = XLMRobertaTokenizerFast.from_pretrained(source, **options)
+        path = ensure_onnx_model(
+            self.model_name,
+            lambda: XLMRobertaForSequenceClassification.from_pretrained(source, **options),
+            self.tokenizer,
+            quantize=self.quantize,
+            revision=self.revision
+        )
+        self.onnx_model = OnnxClassifier(path)
+        print(f"✅ ONNX model loaded successfully ({path}).")
+
+    def _load_pooled_model(self):
+        """Tokenizer here, weights in every inference pool worker."""
+        print("🔄 Loading model in the inference pool workers...")
+        source, options = self._source()
+        self.tokenizer = XLMRobertaTokenizerFast.from_pretrained(source, **options)
+        self.pooled_model = self.inference_pool.load_model("category", self.model_name, self.revision)
+        print(f"✅ Model loaded in {len(self.inference_pool.core_sets)} inference workers.")
+
+    def release(self):
+        """Free model copies held by inference pool workers."""
+        if self.pooled_model is not None:
+            self.pooled_model.release()
+            self.pooled_model = None
+
+    def _source(self):
+        """from_pretrained() path and options: the local artifact when there is one."""
+        source, local = resolve_model_source(self.model_name, self.revision)
+        if local:
+            print(f"Loading {self.model_name} from local artifact {source}")
+            return source, {"local_files_only": True}
+        return source, {"revision": self.revision}
+
     def predict(self, text):
-        inputs = self.tokenizer(text, return_tensors="pt", truncation=True, padding=True)
+        return self.predict_batch([text])[0]
+
+    def tokenize(self, texts):
+        """Padded input_ids / attention_mask tensors for a list of texts."""
+        return self.tokenizer(texts, return_tensors="pt", truncation=True, padding=True,
+                              max_length=MODEL_MAX_LENGTH)
+
+    def predict_batch(self, texts):
+        """Class ids for a list of texts, from one padded forward pass."""
+        return self.predict_encoded(self.tokenize(texts))
+
+    def predict_proba(self, texts, batch_size=BUCKET_BATCH_SIZE, stats=None):
+        """Class probabilities (n x num_labels) in input order, length-bucketed."""
+        return bucketed_probabilities(self.tokenizer, self.forward_logits, texts,
+                                      batch_size=batch_size, stats=stats)
+
+    def batch_predict(self, texts, batch_size=BUCKET_BATCH_SIZE):
+        """
+        Classify many texts in length-bucketed batches.
+
+        Returns one dict per text, in input order: text, class_id, label
+        name ("prediction"), its probability and all label probabilities.
+        """
+        results = []
+        if not texts:
+            return results
+
+        probs = self.predict_proba(texts, batch_size=batch_size)
+        preds = torch.argmax(probs, dim=1).tolist()
+        rows = probs.tolist()
+
+        for text, pred, row in zip(texts, preds, rows):
+            results.append({
+                "text": text,
+                "prediction": self.label_map.get(pred, "unknown"),
+                "class_id": pred,
+                "probability": row[pred],
+                "probabilities": {self.label_map.get(i, str(i)): p for i, p in enumerate(row)}
+            })
+
+        return results
+
+    def predict_encoded(self, inputs):
+        """Class ids for already tokenized inputs (see classifier_pipeline.py)."""
+        logits = self.forward_logits(inputs)
+        return torch.argmax(logits, dim=1).tolist()
+
+    def forward_logits(self, inputs):
+        """Raw logits from whichever backend is loaded."""
+        if self.onnx_model is not None:
+            return self.onnx_model.logits(inputs)
+        if self.pooled_model is not None:
+            return self.pooled_model.logits(inputs)
+
+        inputs = {k: v.to(self.model.device) for k, v in inputs.items()}
         with torch.no_grad():
             outputs = self.model(**inputs)
-        logits = outputs.logits
-        predicted_class_id = torch.argmax(logits, dim=1).item()
-        return predicted_class_id
+        return outputs.logits